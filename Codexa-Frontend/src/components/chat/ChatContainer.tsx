@@ -9,7 +9,7 @@ import {
   MessageSquare,
 } from "lucide-react";
 import { cn } from "@/lib/utils";
-import { useAuth } from "@/context/AuthContext";
+import { useAuth, authHeaders } from "@/context/AuthContext";
 import { useParams, useNavigate } from "react-router-dom";
 
 interface Message {
@@ -80,7 +80,9 @@ export function ChatContainer({ onCodeGenerated }: Props) {
 
     const loadChat = async () => {
       try {
-        const res = await fetch(`http://localhost:8000/chat/${chatId}`);
+        const res = await fetch(`http://localhost:8000/chat/${chatId}`, {
+          headers: authHeaders(),
+        });
         const data = await res.json();
 
         if (data.ok && Array.isArray(data.messages)) {
@@ -114,10 +116,13 @@ export function ChatContainer({ onCodeGenerated }: Props) {
     setMessages((prev) => [...prev, userMessage]);
     setIsLoading(true);
 
+    const assistantId = `${Date.now()}-reply`;
+
     try {
-      const res = await fetch("http://localhost:8000/chat/", {
+      // Streamed: tokens show up as they are generated (Server-Sent Events)
+      const res = await fetch("http://localhost:8000/chat/stream", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: { "Content-Type": "application/json", ...authHeaders() },
         body: JSON.stringify({
           user_id: userId,
           chat_id: chatId || null,
@@ -125,21 +130,59 @@ export function ChatContainer({ onCodeGenerated }: Props) {
         }),
       });
 
-      const data = await res.json();
+      if (!res.ok || !res.body) throw new Error(`Chat stream failed: ${res.status}`);
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let data: any = null;
+
+      const handleEvent = (event: string, payload: any) => {
+        if (event === "chat" && payload.type === "conversation") {
+          setMessages((prev) => [
+            ...prev,
+            { id: assistantId, role: "assistant", content: "", agent: "chat" },
+          ]);
+        } else if (event === "token") {
+          setMessages((prev) =>
+            prev.map((m) =>
+              m.id === assistantId ? { ...m, content: m.content + payload.text } : m
+            )
+          );
+        } else if (event === "done") {
+          data = payload;
+        } else if (event === "error") {
+          throw new Error(payload.detail);
+        }
+      };
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+          const frame = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+
+          let event = "message";
+          let payload = "";
+          for (const line of frame.split("\n")) {
+            if (line.startsWith("event: ")) event = line.slice(7);
+            else if (line.startsWith("data: ")) payload += line.slice(6);
+          }
+          if (payload) handleEvent(event, JSON.parse(payload));
+        }
+      }
+
       console.log("Chat response data:", data);
-      
-      if (data.ok && data.chat_id) {
+      if (!data) return;
+
+      // New chats get their URL once the reply is stored
+      if (data.ok && data.chat_id && data.chat_id !== chatId) {
         navigate(`/c/${data.chat_id}`);
       }
-      const mappedMessages = data.messages?.map((msg: any) => ({
-        id: msg._id,
-        role: msg.role,
-        content: msg.content,
-        agent: msg.agent,
-        code: msg.code,
-      })) ?? [];
-
-      setMessages(mappedMessages);
 
       // Trigger code update
       if (data.code) {
@@ -152,6 +195,10 @@ export function ChatContainer({ onCodeGenerated }: Props) {
 
       // Auto-open when a project is generated
       if (data.type === "project") {
+        setMessages((prev) => [
+          ...prev,
+          { id: assistantId, role: "assistant", content: data.reply, agent: "pipeline" },
+        ]);
         setGeneratedCode(data.code || "");
         setGeneratedLanguage(data.language || "html");
 
@@ -160,9 +207,9 @@ export function ChatContainer({ onCodeGenerated }: Props) {
       }
     } catch (error) {
       console.error("Chat error:", error);
+    } finally {
+      setIsLoading(false);
     }
-
-    setIsLoading(false);
   };
 
   const hasMessages = messages.length > 0;
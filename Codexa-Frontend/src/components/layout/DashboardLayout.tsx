@@ -13,6 +13,7 @@ import {
   ResizableHandle,
 } from "@/components/ui/resizable";
 import { useAppData } from "@/context/useAppData";
+import { authHeaders } from "@/context/AuthContext";
 import { FileTree } from "../project/FileTree";
 
 export function DashboardLayout() {
@@ -56,7 +57,8 @@ export function DashboardLayout() {
 
     const res = await fetch(
       `http://localhost:8000/preview/full/${project_Id}`,
-      { method: "POST" }
+      // credentials: the response sets the cookie the preview iframe uses
+      { method: "POST", headers: authHeaders(), credentials: "include" }
     );
 
     const data = await res.json();
@@ -79,6 +81,7 @@ export function DashboardLayout() {
       `http://localhost:8000/preview/stop/${project_Id}`,
       {
         method: "POST",
+        headers: authHeaders(),
       }
     );
     const data = await res.json();
@@ -1,12 +1,15 @@
 export function buildFileTree(files: any[]) {
   const root: any[] = [];
+  // children array -> (name -> node), so each path segment is an O(1) lookup
+  const lookup = new Map<any[], Map<string, any>>([[root, new Map()]]);
 
   for (const file of files) {
     const parts = file.path.split("/");
     let current = root;
 
     parts.forEach((part, index) => {
-      let node = current.find((n) => n.name === part);
+      const siblings = lookup.get(current)!;
+      let node = siblings.get(part);
 
       if (!node) {
         node = {
@@ -16,6 +19,8 @@ export function buildFileTree(files: any[]) {
           children: [],
         };
         current.push(node);
+        siblings.set(part, node);
+        lookup.set(node.children, new Map());
       }
 
       if (index === parts.length - 1) {
@@ -69,6 +69,12 @@ export const AuthProvider = ({ children }: { children: React.ReactNode }) => {
   );
 };
 
+// -------- Bearer header for API calls (the backend checks ownership) --------
+export const authHeaders = (): Record<string, string> => {
+  const token = localStorage.getItem("token");
+  return token ? { Authorization: `Bearer ${token}` } : {};
+};
+
 export const useAuth = () => {
   return useContext(AuthContext) as AuthContextType;
 };
@@ -1,5 +1,5 @@
 import { createContext, useContext, useEffect, useState } from "react";
-import { useAuth } from "./AuthContext";
+import { useAuth, authHeaders } from "./AuthContext";
 import { detectLanguage } from "@/lib/detectLanguage";
 
 /* ----------------------------------------
@@ -9,6 +9,9 @@ export interface ProjectFile {
   _id: string;
   path: string;
   content: string;
+  hash?: string;
+  size?: number;
+  loaded?: boolean; // content fetched from /files/:id/content
   language: string; // derived
   name: string;     // derived
 }
@@ -64,7 +67,8 @@ export const AppDataProvider = ({
 
     try {
       const res = await fetch(
-        `http://localhost:8000/chat/get-chats/${userId}`
+        `http://localhost:8000/chat/get-chats/${userId}`,
+        { headers: authHeaders() }
       );
       const data = await res.json();
 
@@ -85,7 +89,8 @@ export const AppDataProvider = ({
 
     try {
       const res = await fetch(
-        `http://localhost:8000/projects/${userId}`
+        `http://localhost:8000/projects/${userId}`,
+        { headers: authHeaders() }
       );
       const data = await res.json();
 
@@ -99,26 +104,66 @@ export const AppDataProvider = ({
   };
 
   /* ----------------------------------------
-     Load project files
+     Load project files (manifest only)
      → Default select App.tsx
   ---------------------------------------- */
+  const [filesProjectId, setFilesProjectId] = useState<string>("");
+
+  const fetchFileContent = async (
+    projectId: string,
+    file: ProjectFile
+  ): Promise<ProjectFile> => {
+    if (file.loaded) return file;
+
+    const res = await fetch(
+      `http://localhost:8000/files/${projectId}/content?path=${encodeURIComponent(file.path)}`,
+      { headers: authHeaders() }
+    );
+    const data = await res.json();
+
+    const loaded = { ...file, content: data.content ?? "", loaded: true };
+    setProjectFiles((files) =>
+      files.map((f) => (f.path === file.path ? loaded : f))
+    );
+    return loaded;
+  };
+
+  const selectFile = async (file: ProjectFile | null) => {
+    if (!file || file.loaded || !filesProjectId) {
+      setSelectedFile(file);
+      return;
+    }
+
+    try {
+      setSelectedFile(await fetchFileContent(filesProjectId, file));
+    } catch (err) {
+      console.error("Failed to load file content:", err);
+    }
+  };
+
   const loadProjectfiles = async (projectId: string) => {
     if (!projectId) return;
 
     try {
-      const res = await fetch(`http://localhost:8000/files/${projectId}`);
+      const res = await fetch(`http://localhost:8000/files/${projectId}/manifest`, {
+        headers: authHeaders(),
+      });
       const data = await res.json();
 
       if (data.ok) {
         const enrichedFiles: ProjectFile[] = data.files.map((file: any) => ({
-          _id: file._id,
+          _id: file.path,
           path: file.path,
-          content: file.content,
+          content: "",
+          hash: file.hash,
+          size: file.size,
+          loaded: false,
           language: detectLanguage(file.path),
           name: file.path.split("/").pop(),
         }));
 
         setProjectFiles(enrichedFiles);
+        setFilesProjectId(projectId);
 
         // ✅ Default file selection logic
         const defaultFile =
@@ -127,7 +172,9 @@ export const AppDataProvider = ({
               f.name?.toLowerCase() === "app.tsx"
           ) || enrichedFiles[0] || null;
 
-        setSelectedFile(defaultFile);
+        setSelectedFile(
+          defaultFile ? await fetchFileContent(projectId, defaultFile) : null
+        );
       }
     } catch (err) {
       console.error("Failed to load project files:", err);
@@ -153,7 +200,7 @@ export const AppDataProvider = ({
         projectIds,
         projectFiles,
         selectedFile,
-        setSelectedFile,
+        setSelectedFile: selectFile,
         fetchUserChats,
         fetchUserProjects,
         loadProjectfiles,
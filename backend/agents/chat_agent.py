@@ -1,10 +1,11 @@
-from google import genai
 from utils.database_models_util import (
     get_chat_messages,
     format_for_gemini,
     save_message
 )
-from utils.ai_client_util import gemini
+from utils.ai_client_util import generate, generate_stream
+from utils.database_util import projects_col
+from utils.retrieval_util import retrieve_context
 
 
 
@@ -19,9 +20,23 @@ class ChatAgent:
             role = "User" if m["role"] == "user" else "Assistant"
             lines.append(f"{role}: {m['content']}")
         return "\n".join(lines)
+
+    def project_context(self, chat_id: str, user_message: str) -> str:
+        """
+        Relevant chunks of the project generated in this chat, if any.
+        """
+        project = projects_col.find_one(
+            {"chat_id": chat_id},
+            {"_id": 1},
+            sort=[("created_at", -1)]
+        )
+        if not project:
+            return ""
+
+        return retrieve_context(str(project["_id"]), user_message)
     
     
-    def respond(self, project_id: str, user_message: str):
+    def build_prompt(self, project_id: str, user_message: str) -> str:
 
         # 1. Fetch previous project messages
         history = get_chat_messages(project_id)
@@ -32,8 +47,24 @@ class ChatAgent:
         # 3. Append the new user message
         conversation_text = self.convert_messages_to_text(formatted)
         print("Conversation so far:\n", conversation_text)
+
+        # 4. Ground the answer in the project code (top-k chunks only)
+        context = self.project_context(project_id, user_message)
+        if context:
+            conversation_text = (
+                "Relevant files from the user's project:\n"
+                f"{context}\n\n"
+                "Use them when the user asks about their project.\n\n"
+                f"{conversation_text}"
+            )
+
+        return conversation_text
+
+    def respond(self, project_id: str, user_message: str):
+        conversation_text = self.build_prompt(project_id, user_message)
+
         # 5. Call Gemini
-        resp = gemini.models.generate_content(
+        resp = generate(
             model="gemini-2.5-flash-lite",
             contents=conversation_text
         )
@@ -44,3 +75,24 @@ class ChatAgent:
         save_message(project_id, "assistant", reply, "chat")
 
         return reply
+
+    def respond_stream(self, project_id: str, user_message: str):
+        """
+        Like respond(), but yields the reply as it is generated.
+        The message is saved once, when the stream ends (also if the
+        client goes away mid-stream: the partial reply is kept).
+        """
+        conversation_text = self.build_prompt(project_id, user_message)
+
+        parts = []
+        try:
+            for text in generate_stream(
+                model="gemini-2.5-flash-lite",
+                contents=conversation_text
+            ):
+                parts.append(text)
+                yield text
+        finally:
+            reply = "".join(parts).strip()
+            if reply:
+                save_message(project_id, "assistant", reply, "chat")
@@ -1,5 +1,5 @@
-import json
-from utils.ai_client_util import gemini
+from utils.structured_util import generate_structured, dump_model
+from models.schemas import Intent
 
 
 class ClassifierAgent:
@@ -19,19 +19,7 @@ Valid types:
 - "project"       → user wants to build, generate, or create a new software project
 - "conversation"  → user is chatting, asking questions, or modifying an existing project
 
-Your response MUST be ONLY valid JSON.
-NO markdown.
-NO comments.
-NO text outside JSON.
-NO explanations.
-
-If your response is not strictly valid JSON, the system will break.
-
-JSON FORMAT:
-{{
-  "type": "",
-  "reason": ""
-}}
+Answer with the type and a one-sentence reason.
 
 Now classify the message below:
 
@@ -42,11 +30,11 @@ User message: "{message}"
         prompt = self.CLASSIFIER_PROMPT.format(message=message)
 
         try:
-            response = gemini.models.generate_content(
+            intent = generate_structured(
                 model="gemini-2.5-flash-lite",
-                contents=prompt
+                contents=prompt,
+                schema=Intent
             )
-            print("Classifier response:", response.text.strip())
         except Exception as e:
             print("❌ Classifier error:", e)
             return {
@@ -54,24 +42,8 @@ User message: "{message}"
                 "reason": "Model call failed"
             }
 
-        raw = response.text.strip()
-
-        # CLEANUP: remove ```json ``` wrappers
-        clean = (
-            raw.replace("```json", "")
-            .replace("```", "")
-            .strip()
-        )
-
-        # Try to parse
-        try:
-            return json.loads(clean)
-        except Exception as e:
-            print("❌ JSON decode failed:", clean)
-            return {
-                "type": "conversation",
-                "reason": "Invalid JSON from model"
-            }
+        print("Classifier response:", intent)
+        return dump_model(intent)
 
 
     def classify_for_project(self, message: str, project_id: str | None):
@@ -1,7 +1,12 @@
+from utils.validation_util import validate_files
+from utils.project_tree import ProjectTree
+
+
 class DebuggerAgent:
     """
     Validates multi-folder full-stack projects generated by DeveloperAgent.
-    Performs STRUCTURAL validation only.
+    Performs structural and static validation (syntax, imports,
+    dependency pins) without installing or running anything.
     """
 
     REQUIRED_FRONTEND_FILES = {
@@ -15,62 +20,55 @@ class DebuggerAgent:
 
     def __init__(self, verbose: bool = True):
         self.verbose = verbose
+        self.last_report = None
 
-    def _collect_files(self, structure, base_path=""):
-        """
-        Recursively collect file paths from project structure JSON.
-        """
-        files = set()
-
-        for node in structure:
-            current_path = f"{base_path}/{node['name']}".lstrip("/")
-
-            if node["type"] == "file":
-                files.add(current_path)
-
-            elif node["type"] == "folder":
-                files |= self._collect_files(
-                    node.get("children", []),
-                    current_path
-                )
-
-        return files
-
-    def validate(self, project_json: dict) -> bool:
+    def diagnose(self, project_json: dict = None, tree: ProjectTree = None) -> dict:
         """
-        Validate the generated project structure.
+        Full validation report: {"ok", "errors", "warnings", "diagnostics", ...}.
+        Pass the pipeline's ProjectTree to avoid rebuilding it.
         """
-
-        if not project_json or "structure" not in project_json:
+        if tree is None and (not project_json or "structure" not in project_json):
             print("❌ Invalid project JSON: missing 'structure'")
-            return False
-
-        all_files = self._collect_files(project_json["structure"])
+            self.last_report = {
+                "ok": False, "errors": 1, "warnings": 0, "files": 0, "checked": 0, "elapsed_ms": 0.0,
+                "diagnostics": [{
+                    "path": None, "line": None, "severity": "error",
+                    "code": "invalid-project", "message": "Missing 'structure'"
+                }]
+            }
+            return self.last_report
+
+        if tree is None:
+            tree = ProjectTree.from_structure(project_json["structure"])
+        all_files = tree.files()
 
         if self.verbose:
             print("📁 Files detected:")
             for f in sorted(all_files):
                 print("  -", f)
 
-        # ----------------------------
-        # Frontend validation
-        # ----------------------------
-        missing_frontend = self.REQUIRED_FRONTEND_FILES - all_files
-        if missing_frontend:
-            print("❌ Missing frontend files:", missing_frontend)
-            return False
-
-        # ----------------------------
-        # Backend validation
-        # ----------------------------
-        missing_backend = self.REQUIRED_BACKEND_FILES - all_files
-        if missing_backend:
-            print("❌ Missing backend files:", missing_backend)
-            return False
+        report = validate_files(
+            all_files,
+            required=self.REQUIRED_FRONTEND_FILES | self.REQUIRED_BACKEND_FILES,
+            hashes=tree.hashes()
+        )
+        self.last_report = report
 
         if self.verbose:
-            print("✅ Frontend structure valid (React + TSX)")
-            print("✅ Backend structure valid (FastAPI)")
-            print("✅ Project validation passed")
+            for d in report["diagnostics"]:
+                icon = "❌" if d["severity"] == "error" else "⚠️"
+                line = f":{d['line']}" if d["line"] else ""
+                print(f"{icon} {d['path']}{line} [{d['code']}] {d['message']}")
+
+            if report["ok"]:
+                print(f"✅ Project validation passed ({report['files']} files, {report['elapsed_ms']} ms)")
+            else:
+                print(f"❌ Project validation failed: {report['errors']} errors, {report['warnings']} warnings")
 
-        return True
+        return report
+
+    def validate(self, project_json: dict = None, tree: ProjectTree = None) -> bool:
+        """
+        Validate the generated project structure.
+        """
+        return self.diagnose(project_json, tree)["ok"]
@@ -1,7 +1,7 @@
-import json
-from google.genai import types
 from dotenv import load_dotenv
-from utils.ai_client_util import gemini as client
+from utils.ai_client_util import BULK
+from utils.structured_util import generate_structured, dump_model
+from models.schemas import ProjectStructure
 
 load_dotenv()
 
@@ -16,88 +16,23 @@ class DeveloperAgent:
     """
 
     def __init__(self, model_name="gemini-3-pro-preview"):
-        self.client = client
         self.model_name = model_name
 
-    def _parse_llm_output(self, raw):
-       
-
-        import re
-
-        # ✅ Already parsed
-        if isinstance(raw, dict):
-            return raw
-
-        # ❌ Unexpected type
-        if not isinstance(raw, str):
-            raise TypeError(f"Unexpected LLM output type: {type(raw)}")
-
-        raw = raw.strip()
-        raw = raw.replace("```json", "").replace("```", "").strip()
-
-        # Check for balanced curly braces before parsing
-        def braces_balanced(s):
-            return s.count('{') == s.count('}')
-
-        # Try direct parse first
-        if braces_balanced(raw):
-            try:
-                return json.loads(raw)
-            except json.JSONDecodeError:
-                pass
-        else:
-            print("❌ LLM output has unbalanced curly braces. Likely incomplete JSON.")
-            raise ValueError("LLM output is incomplete or truncated. Please try again or reduce output size.")
-
-        # Try to extract first JSON object using regex
-        json_match = re.search(r'\{[\s\S]*\}', raw)
-        if json_match:
-            json_str = json_match.group(0)
-            if not braces_balanced(json_str):
-                print("❌ Extracted JSON string has unbalanced braces. Likely incomplete JSON.")
-                raise ValueError("Extracted JSON is incomplete or truncated. Please try again or reduce output size.")
-            try:
-                return json.loads(json_str)
-            except json.JSONDecodeError as e:
-                print("❌ Regex-extracted JSON still invalid:", e)
-                print("Extracted JSON string:\n", json_str)
-
-        # 🔥 Fix common LLM escape issues (\' etc.)
-        cleaned = raw.replace("\\'", "'")
-        if braces_balanced(cleaned):
-            try:
-                return json.loads(cleaned)
-            except json.JSONDecodeError as e:
-                print("❌ All attempts to parse LLM output as JSON failed:", e)
-                print("Raw output:\n", raw)
-                raise e
-        else:
-            print("❌ Cleaned LLM output has unbalanced curly braces. Likely incomplete JSON.")
-            raise ValueError("LLM output is incomplete or truncated after cleaning. Please try again or reduce output size.")
-
     def _generate_json(self, prompt: str) -> dict:
-        config = types.GenerateContentConfig(
-            temperature=0.2,
-            max_output_tokens=100000,
-        )
-
-        response = self.client.models.generate_content(
+        # JSON mime type + local validation against ProjectStructure: the
+        # recursive tree does not fit Gemini's response-schema subset.
+        # Parse failures get a bounded repair pass instead of a regeneration.
+        result = generate_structured(
             model=self.model_name,
             contents=prompt,
-            config=config,
+            schema=ProjectStructure,
+            send_schema=False,
+            lane=BULK,
+            cost=10,  # long generation, weighted as ~10 interactive calls
+            temperature=0.2,
+            max_output_tokens=100000,
         )
-
-        raw = getattr(response, "text", None)
-
-        if raw is None:
-            raise RuntimeError("LLM returned no text output")
-
-        try:
-            return self._parse_llm_output(raw)
-        except Exception as e:
-            print("❌ Failed to parse JSON from DeveloperAgent")
-            print("Raw output:\n", raw)
-            raise e
+        return dump_model(result)
 
     def generate_project(self, project_name: str, steps: list, user_message: str):
         print("🧑‍💻 DeveloperAgent generating full-stack project...")
@@ -164,6 +99,7 @@ FRONTEND REQUIREMENTS (VERY STRICT):
 - Framework: React 18 + Vite
 - Language: TypeScript (TSX)
 - Backend Port: 7979
+- Backend base URL: import.meta.env.VITE_API_URL, falling back to "http://localhost:7979"
 - Styling: Plain external CSS files ONLY
 - Entry file: src/main.tsx (Vite standard)
 - Functional components only
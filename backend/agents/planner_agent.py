@@ -1,37 +1,25 @@
 import re
-import os
-import time
-from google import genai
 from google.genai import types
-from dotenv import load_dotenv
-
-load_dotenv()
-
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("❌ GEMINI_API_KEY not found in .env")
-
-client = genai.Client(api_key=api_key)
+from utils.ai_client_util import generate, BULK
 
 
 class PlannerAgent:
     """
     Generates step-by-step project plans using Gemini API.
-    Includes retry + backoff for model overload (503) and safe fallbacks.
+    Slow or overloaded (503) calls are hedged / failed over to the
+    alternate model by the client wrapper; safe fallback plan last.
     """
 
     def __init__(
         self,
         model_name="gemini-2.5-flash-lite",
         max_output_tokens=2000,
-        max_retries=3,
-        retry_delays=(2, 5, 10),  # seconds
+        max_retries=2,
     ):
         self.model_name = model_name
-        self.client = client
         self.max_output_tokens = max_output_tokens
         self.max_retries = max_retries
-        self.retry_delays = retry_delays
+        self.last_token_count = 0
 
     # --------------------------------------------------
     # TITLE EXTRACTION
@@ -108,7 +96,7 @@ class PlannerAgent:
         return steps
 
     # --------------------------------------------------
-    # MAIN PLANNING FUNCTION (WITH RETRY + BACKOFF)
+    # MAIN PLANNING FUNCTION (WITH RETRY)
     # --------------------------------------------------
     def plan(self, request: str):
         print(f"🤔 Creating plan for: '{request}'")
@@ -131,12 +119,17 @@ class PlannerAgent:
 
         for attempt in range(self.max_retries):
             try:
-                response = self.client.models.generate_content(
+                response = generate(
                     model=self.model_name,
                     contents=prompt,
                     config=config,
+                    lane=BULK,
+                    hedge=True,
                 )
 
+                usage = getattr(response, "usage_metadata", None)
+                self.last_token_count += getattr(usage, "total_token_count", 0) or 0
+
                 raw_text = self._extract_text_from_response(response)
                 if not raw_text:
                     raise RuntimeError("Empty response from model")
@@ -164,7 +157,6 @@ class PlannerAgent:
                         "Retrying..."
                     )
                     if attempt < self.max_retries - 1:
-                        time.sleep(self.retry_delays[attempt])
                         continue
                     else:
                         break
@@ -3,18 +3,21 @@ from utils.database_models_util import save_message
 from agents.developer_agent import DeveloperAgent
 from agents.planner_agent import PlannerAgent
 from agents.debugger_agent import DebuggerAgent
+from agents.repair_agent import RepairAgent
+from utils.project_tree import ProjectTree
 
 
 class ProjectPipeline:
   
 
-    def run(self, chat_id: str, user_message: str):
+    def run(self, chat_id: str, user_message: str, plan: dict = None):
 
         # -------------------------
-        # 1️⃣ PLANNER
+        # 1️⃣ PLANNER (skipped when a speculative plan is passed in)
         # -------------------------
-        planner = PlannerAgent()
-        plan = planner.plan(user_message)
+        if plan is None:
+            planner = PlannerAgent()
+            plan = planner.plan(user_message)
 
         if not plan or "steps" not in plan:
             raise RuntimeError("Planner failed")
@@ -23,7 +26,8 @@ class ProjectPipeline:
             chat_id,
             role="assistant",
             content=json.dumps(plan, indent=2),
-            agent="planner"
+            agent="planner",
+            deferred=True
         )
 
         print(f"🧠 Planner generated title: {plan['title']}")
@@ -45,7 +49,8 @@ class ProjectPipeline:
             chat_id,
             role="assistant",
             content="Generated multi-folder full-stack project",
-            agent="developer"
+            agent="developer",
+            deferred=True
         )
 
       
@@ -53,19 +58,43 @@ class ProjectPipeline:
         # -------------------------
         # 3️⃣ DEBUGGER
         # -------------------------
+        # Built once, shared by debugger, repair and the file saver
+        tree = ProjectTree.from_structure(project_json["structure"])
+
         debugger = DebuggerAgent(verbose=True)
-        is_valid = debugger.validate(project_json)
+        report = debugger.diagnose(tree=tree)
+
+        # -------------------------
+        # 4️⃣ REPAIR (only the failing files)
+        # -------------------------
+        repaired = []
+        if not report["ok"]:
+            repairer = RepairAgent(debugger)
+            tree, report = repairer.repair(tree, report, user_message)
+            repaired = sorted(repairer.repaired)
+            if repaired:
+                project_json = {**project_json, "structure": tree.to_structure()}
+                save_message(
+                    chat_id,
+                    role="assistant",
+                    content=f"Repaired {len(repaired)} file(s) in {repairer.rounds} round(s): " + ", ".join(repaired),
+                    agent="repair",
+                    deferred=True
+                )
+
+        is_valid = report["ok"]
 
         save_message(
             chat_id,
             role="assistant",
-            content=f"Debugger validation result: {is_valid}",
-            agent="debugger"
+            content=f"Debugger validation result: {is_valid} ({report['errors']} errors, {report['warnings']} warnings)",
+            agent="debugger",
+            deferred=True
         )
 
 
         # -------------------------
-        # 4️⃣ RETURN RESULT
+        # 5️⃣ RETURN RESULT
         # -------------------------
         return {
             "ok": is_valid,
@@ -73,5 +102,8 @@ class ProjectPipeline:
             "chat_id": chat_id,
             "title": plan["title"],
             "plan": plan["steps"],
-            "project": project_json
+            "project": project_json,
+            "tree": tree,
+            "diagnostics": report["diagnostics"],
+            "repaired": repaired
         }
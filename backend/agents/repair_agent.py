@@ -0,0 +1,172 @@
+from utils.ai_client_util import BULK
+from utils.structured_util import generate_structured
+from utils.validation_util import import_graph
+from utils.project_tree import ProjectTree
+from models.schemas import FileFixes
+
+
+class RepairAgent:
+    """
+    Fixes a generated project from DebuggerAgent diagnostics.
+    Only files with errors (plus their direct imports, as read-only
+    context) are sent to the model; the corrected files are written
+    into a copy of the ProjectTree and the project is validated again,
+    up to max_rounds times.
+    """
+
+    # Diagnostics that are fixed by editing the manifest, not the importing file
+    MANIFEST_CODES = {
+        "js-package": "package.json",
+        "npm-unpinned": "package.json",
+        "python-requirement": "requirements.txt",
+    }
+
+    def __init__(
+        self,
+        debugger,
+        model_name="gemini-2.5-flash",
+        max_rounds=2,
+        max_files=12,
+        max_output_tokens=60000,
+    ):
+        self.debugger = debugger
+        self.model_name = model_name
+        self.max_rounds = max_rounds
+        self.max_files = max_files
+        self.max_output_tokens = max_output_tokens
+        self.rounds = 0
+        self.repaired = set()
+
+    # --------------------------------------------------
+    # TARGETS
+    # --------------------------------------------------
+    def _manifest_for(self, path: str, manifest: str, files: dict) -> str | None:
+        directory = path.rsplit("/", 1)[0] if "/" in path else ""
+        while True:
+            candidate = f"{directory}/{manifest}" if directory else manifest
+            if candidate in files:
+                return candidate
+            if not directory:
+                return None
+            directory = directory.rsplit("/", 1)[0] if "/" in directory else ""
+
+    def _targets(self, report: dict, files: dict) -> dict:
+        """
+        {path: [error diagnostics]} of the files the model may rewrite.
+        """
+        targets = {}
+        for d in report["diagnostics"]:
+            if d["severity"] != "error" or not d["path"]:
+                continue
+
+            path = d["path"]
+            if d["code"] in self.MANIFEST_CODES:
+                path = self._manifest_for(path, self.MANIFEST_CODES[d["code"]], files) or path
+
+            targets.setdefault(path, []).append(d)
+
+        # Most broken files first when over the per-round cap
+        ranked = sorted(targets, key=lambda p: -len(targets[p]))
+        return {p: targets[p] for p in ranked[:self.max_files]}
+
+    # --------------------------------------------------
+    # PROMPT
+    # --------------------------------------------------
+    def _build_prompt(self, targets: dict, files: dict, user_message: str) -> str:
+        graph = import_graph(files)
+        context = sorted({
+            dep
+            for path in targets
+            for dep in graph.get(path, [])
+            if dep not in targets
+        })
+
+        prompt = (
+            "You are fixing a generated full-stack project (React + Vite + TSX frontend, FastAPI backend).\n"
+            "A static validator reported the errors below. Fix ONLY these files.\n"
+            "Rules:\n"
+            "- Return every file listed under FILES TO FIX, with its FULL corrected content\n"
+            "- Keep the existing behaviour, names and exports; change as little as possible\n"
+            "- Do not rely on files that do not exist in the project\n"
+            "- Dependencies must be pinned to exact versions\n"
+            "- Return JSON: {\"files\": [{\"path\": ..., \"content\": ...}]}\n\n"
+        )
+        if user_message:
+            prompt += f"USER IDEA:\n{user_message}\n\n"
+
+        prompt += "PROJECT FILES:\n" + "\n".join(f"- {p}" for p in sorted(files)) + "\n\n"
+
+        prompt += "FILES TO FIX:\n"
+        for path, diagnostics in targets.items():
+            prompt += f"\n### {path}\nErrors:\n"
+            for d in diagnostics:
+                line = f" (line {d['line']})" if d["line"] else ""
+                prompt += f"- [{d['code']}]{line} {d['message']}\n"
+            if path in files:
+                prompt += f"Current content:\n{files[path]}\n"
+            else:
+                prompt += "This file does not exist yet; create it.\n"
+
+        if context:
+            prompt += "\nREAD-ONLY CONTEXT (imported by the files above, do not return these):\n"
+            for path in context:
+                prompt += f"\n### {path}\n{files[path]}\n"
+
+        return prompt
+
+    # --------------------------------------------------
+    # MAIN REPAIR LOOP
+    # --------------------------------------------------
+    def repair(self, tree: ProjectTree, report: dict, user_message: str = ""):
+        """
+        Returns (tree, report) after at most max_rounds repair rounds.
+        Stops early once valid or when a round makes no progress.
+        """
+        for round_no in range(1, self.max_rounds + 1):
+            if report["ok"]:
+                break
+
+            files = tree.files()
+            targets = self._targets(report, files)
+            if not targets:
+                break
+
+            print(f"🔧 Repair round {round_no}/{self.max_rounds}: {len(targets)} file(s), {report['errors']} error(s)")
+
+            try:
+                result = generate_structured(
+                    model=self.model_name,
+                    contents=self._build_prompt(targets, files, user_message),
+                    schema=FileFixes,
+                    lane=BULK,
+                    cost=max(1, len(targets)),
+                    temperature=0.2,
+                    max_output_tokens=self.max_output_tokens,
+                )
+            except Exception as e:
+                print("❌ Repair generation failed:", e)
+                break
+
+            # Never let the model touch files it was not asked to fix
+            fixes = {f.path.strip("/"): f.content for f in result.files if f.path.strip("/") in targets}
+            if not fixes:
+                print("⚠️ Repair returned no usable files")
+                break
+
+            candidate = tree.copy()
+            for path, content in fixes.items():
+                candidate.set_file(path, content)
+            new_report = self.debugger.diagnose(tree=candidate)
+            self.rounds = round_no
+
+            if new_report["errors"] >= report["errors"]:
+                print(f"⚠️ Repair made no progress ({new_report['errors']} errors), keeping previous version")
+                break
+
+            print(f"✅ Repair round {round_no}: {report['errors']} → {new_report['errors']} errors")
+            self.repaired |= set(fixes)
+            tree, report = candidate, new_report
+
+        # diagnose() of a rejected candidate must not leak out as the final report
+        self.debugger.last_report = report
+        return tree, report
@@ -3,11 +3,36 @@ from routers.auth_router import router as auth_router
 from routers.chat_router import router as chat_router
 from routers.projects_router import router as projects_router
 from routers.project_files_router import router as files_router
+from routers.search_router import router as search_router
 from fastapi.middleware.cors import CORSMiddleware
+from routers.preview_proxy import router as preview_proxy_router
 from routers.preview import router as preview_router
+from utils.database_util import ensure_indexes
+from utils.database_models_util import message_writes
+from utils.cache_util import cache_stats, start_cache_sync
+from utils.auth_util import bcrypt_rounds, shutdown_bcrypt_pool
+from utils.search_util import shutdown_search_pool
+from utils.scheduler_util import scheduler
+from utils.hedging_util import hedging_stats
+from routers.chat_router import speculative_planner
+from utils.state_util import state
 app = FastAPI()
 
 
+@app.on_event("startup")
+def create_indexes():
+    ensure_indexes()
+    start_cache_sync()
+    bcrypt_rounds()      # calibrate once, before the first signup
+
+
+@app.on_event("shutdown")
+def flush_pending_writes():
+    message_writes.close()
+    shutdown_bcrypt_pool()
+    shutdown_search_pool()
+
+
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,5 +46,39 @@ app.include_router(auth_router)
 app.include_router(chat_router)
 app.include_router(projects_router)
 app.include_router(files_router)
+app.include_router(search_router)
+app.include_router(preview_proxy_router)   # before preview: its catch-all static route
 app.include_router(preview_router)
 
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """
+    Hit rate and size of the in-process read caches (per worker).
+    """
+    return {"ok": True, "caches": cache_stats()}
+
+
+@app.get("/scheduler/stats")
+def get_scheduler_stats():
+    """
+    LLM queue depth, running calls and recent queue waits per lane,
+    plus hedging counters and per-model latency percentiles.
+    """
+    return {"ok": True, "scheduler": scheduler.stats(), "hedging": hedging_stats()}
+
+
+@app.get("/speculation/stats")
+def get_speculation_stats():
+    """
+    Speculative planner hit rate and wasted tokens (SPECULATIVE_PLANNER=1).
+    """
+    return {"ok": True, "speculation": speculative_planner.stats()}
+
+
+@app.get("/state/stats")
+def get_state_stats():
+    """
+    This worker's id and the shared-state leases it currently holds.
+    """
+    return {"ok": True, "state": state.stats()}
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Optional, Literal
 
 
 class Signup(BaseModel):
@@ -45,3 +45,83 @@ class GeneratePayload(BaseModel):
     user_id: str
     project_name: str
     description: Optional[str] = None
+
+
+class FilePayload(BaseModel):
+    """
+    Payload for editing a single project file.
+    """
+    path: str
+    content: str
+
+
+class SyncPayload(BaseModel):
+    """
+    Payload for pushing changed files into a running preview.
+    paths is Optional: None = compare every project file.
+    """
+    paths: Optional[list[str]] = None
+
+
+class FileBatchPayload(BaseModel):
+    """
+    Payload for fetching the content of several project files at once.
+    """
+    paths: list[str]
+
+
+# ---------------------------------------
+# STRUCTURED LLM OUTPUT
+# ---------------------------------------
+class Intent(BaseModel):
+    """
+    ClassifierAgent output.
+    """
+    type: Literal["project", "conversation"]
+    reason: str = ""
+
+
+class Title(BaseModel):
+    """
+    Short chat title generated from the first message.
+    """
+    # No max_length: the caller truncates, a long title is not worth a repair call
+    title: str = Field(..., min_length=1)
+
+
+class ProjectNode(BaseModel):
+    """
+    A file (with content) or a folder (with children) of a generated project.
+    """
+    type: Literal["file", "folder"]
+    name: str = Field(..., min_length=1)
+    content: Optional[str] = None
+    children: Optional[list["ProjectNode"]] = None
+
+
+class ProjectStructure(BaseModel):
+    """
+    DeveloperAgent output.
+    """
+    project_type: str = "fullstack"
+    structure: list[ProjectNode]
+
+class FileFix(BaseModel):
+    """
+    One corrected file returned by RepairAgent.
+    """
+    path: str = Field(..., min_length=1)
+    content: str
+
+class FileFixes(BaseModel):
+    """
+    RepairAgent output.
+    """
+    files: list[FileFix]
+
+
+# Resolve the self-reference (pydantic v2 / v1)
+if hasattr(ProjectNode, "model_rebuild"):
+    ProjectNode.model_rebuild()
+else:
+    ProjectNode.update_forward_refs()
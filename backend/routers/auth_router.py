@@ -1,21 +1,29 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
+from starlette.concurrency import run_in_threadpool
 from utils.database_util import users_col
-from utils.auth_util import hash_password, verify_password, create_token
+from utils.auth_util import (
+    hash_password_async,
+    verify_password_async,
+    needs_rehash,
+    create_token,
+    get_current_user
+)
 from models.schemas import Signup, Login
 
 router = APIRouter(prefix="/auth")
 
 @router.post("/signup")
-def signup(payload: Signup):
+async def signup(payload: Signup):
     if payload.password != payload.confirm_password:
         raise HTTPException(400, "Passwords do not match")
 
-    if users_col.find_one({"email": payload.email}):
+    if await run_in_threadpool(users_col.find_one, {"email": payload.email}):
         raise HTTPException(400, "Email already exists")
 
-    hashed = hash_password(payload.password)
+    # bcrypt runs in the process pool, not in request threads
+    hashed = await hash_password_async(payload.password)
 
-    res = users_col.insert_one({
+    res = await run_in_threadpool(users_col.insert_one, {
         "name": payload.name,
         "email": payload.email,
         "password": hashed
@@ -24,14 +32,30 @@ def signup(payload: Signup):
     return {"ok": True, "token": token}
 
 @router.post("/login")
-def login(payload: Login):
-    user = users_col.find_one({"email": payload.email})
+async def login(payload: Login):
+    user = await run_in_threadpool(users_col.find_one, {"email": payload.email})
     if not user:
         raise HTTPException(400, "Invalid credentials")
 
-    if not verify_password(payload.password, user["password"]):
+    if not await verify_password_async(payload.password, user["password"]):
         raise HTTPException(400, "Invalid credentials")
 
+    # Upgrade hashes made with an older, cheaper cost factor
+    if needs_rehash(user["password"]):
+        hashed = await hash_password_async(payload.password)
+        await run_in_threadpool(
+            users_col.update_one,
+            {"_id": user["_id"]},
+            {"$set": {"password": hashed}}
+        )
+
     token = create_token(str(user["_id"]), str(user["name"]), str(user["email"]))
 
     return {"ok": True, "token": token}
+
+
+@router.get("/me")
+def me(user: dict = Depends(get_current_user)):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return {"ok": True, "user": user}
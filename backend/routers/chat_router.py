@@ -1,27 +1,52 @@
-from fastapi import APIRouter, HTTPException
-from models.schemas import ChatPayload
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from utils.auth_util import (
+    get_current_user,
+    authorize,
+    authorize_chat,
+    require_user,
+    require_chat_owner
+)
+from models.schemas import ChatPayload, Title
 from agents.chat_agent import ChatAgent
 from agents.classifier_agent import ClassifierAgent
 from agents.project_pipeline_agent import ProjectPipeline
+from agents.planner_agent import PlannerAgent
 from utils.database_models_util import (
     create_chat,
     save_message,
     get_user_chats,
     get_chat_messages,
-    save_project
+    save_project,
+    message_writes
 )
-from utils.ai_client_util import gemini as client
+from utils.structured_util import generate_structured
+from utils.scheduler_util import user_context, current_user, ANONYMOUS
+from utils.speculation_util import SpeculativePlanner
 import json
+import threading
 from utils.file_utils import save_files   # NEW (flat file saver)
 
 
-router = APIRouter(prefix="/chat")
+router = APIRouter(prefix="/chat", dependencies=[Depends(get_current_user)])
 
-chat_agent = ChatAgent()
-classifier = ClassifierAgent()
-pipeline = ProjectPipeline()
+# Agents are built on first use, not at import: every gunicorn worker
+# (and anything importing the app) starts without clients or threads.
+_AGENTS = {}
+_AGENTS_LOCK = threading.Lock()
+
+
+def get_agent(cls):
+    with _AGENTS_LOCK:
+        agent = _AGENTS.get(cls)
+        if agent is None:
+            agent = _AGENTS[cls] = cls()
+        return agent
+
+
+speculative_planner = SpeculativePlanner(PlannerAgent)
 
-import json
 
 def get_title_from_message(message: str):
     prompt = f"""
@@ -30,39 +55,55 @@ def get_title_from_message(message: str):
 
     "{message}"
 
-    Respond ONLY in valid JSON like this:
-    {{"title": "Your generated title"}}
     """
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash-lite",
-        contents=prompt
-    )
-
-    raw = response.text.strip()
-
-    # Remove code fences if Gemini returns them
-    raw = raw.replace("```json", "").replace("```", "").strip()
-
     try:
-        data = json.loads(raw)
-        title = data.get("title", "").strip()
+        result = generate_structured(
+            model="gemini-2.5-flash-lite",
+            contents=prompt,
+            schema=Title
+        )
+        title = result.title.strip()
         print("Generated title:", title)
         if title:
             return title[:60]   # Limit to 60 chars
     except Exception as e:
-        print("JSON Parse Error:", e, "Raw:", raw)
+        print("Title generation failed:", e)
 
     return "Untitled Project"
 
 
 
+def authorize_payload(payload: ChatPayload, user: dict | None):
+    """
+    The message must come from the token's user, into one of their chats.
+    """
+    authorize(user, payload.user_id)
+    if payload.chat_id:
+        authorize_chat(user, payload.chat_id)
+
+
 @router.post("/")
-def chat(payload: ChatPayload):
+def chat(payload: ChatPayload, user: dict = Depends(get_current_user)):
+    authorize_payload(payload, user)
+
+    # LLM calls made while handling this message are queued under the user
+    with user_context(payload.user_id):
+        return handle_chat(payload)
 
+
+def prepare_chat(payload: ChatPayload):
+    """
+    Shared by / and /stream: create the chat if needed, store the user
+    message and classify it. Returns (chat_id, user_message, intent, plan).
+    """
     user_message = payload.message.strip()
     user_id = payload.user_id
     chat_id = payload.chat_id
+
+    # Likely project request: plan while the title / classifier calls run
+    speculation = speculative_planner.start(user_message)
+
     # print("Received chat payload:", payload)
     # ---------- Create new project if none exists ----------
     if not chat_id:
@@ -76,52 +117,68 @@ def chat(payload: ChatPayload):
     save_message(chat_id, "user", user_message)
 
     # ---------- Classify Intent ----------
-    intent = classifier.classify_for_project(user_message, chat_id)
+    intent = get_agent(ClassifierAgent).classify_for_project(user_message, chat_id)
     print("Classified Intent:", intent)
+    plan = speculative_planner.resolve(speculation, intent["type"] == "project")
+
+    return chat_id, user_message, intent, plan
+
+
+def run_project(user_id: str, chat_id: str, user_message: str, plan: dict = None):
+    pipeline_result = get_agent(ProjectPipeline).run(chat_id, user_message, plan=plan)
+    print("Pipeline Result:", {k: v for k, v in pipeline_result.items() if k not in ("project", "tree")})
+    # Store final message returned to the frontend
+    final_reply = "Project Creation completed successfully."
+
+    save_message(
+        chat_id,
+        role="assistant",
+        content=final_reply,
+        agent="pipeline",
+        deferred=True
+    )
+
+    project_id = save_project(
+        user_id=user_id,
+        title=pipeline_result["title"],
+        description=user_message,
+        chat_id=chat_id,
+        plan = pipeline_result["plan"],
+    )
+    
+    project_json = pipeline_result["project"]
+    
+    # -------------------------
+    # 💾 SAVE GENERATED FILES (NEW)
+    # -------------------------
+    save_files(
+        project_id=project_id,
+        structure=pipeline_result.get("tree") or project_json["structure"]
+    )
+
+    # The write-behind read barrier only covers this worker: write the
+    # deferred pipeline messages before the client can read the chat elsewhere
+    message_writes.flush(chat_id)
+    
+    return {
+        "ok": True,
+        "type": "project",
+        "chat_id": chat_id,
+        "project_id": project_id,
+        "title": pipeline_result["title"],
+        "reply": final_reply,
+    }
+
+
+def handle_chat(payload: ChatPayload):
+    chat_id, user_message, intent, plan = prepare_chat(payload)
+
     # ---------- PROJECT PIPELINE ----------
     if intent["type"] == "project":
-        
-        pipeline_result = pipeline.run(chat_id, user_message)
-        print("Pipeline Result:", pipeline_result)
-        # Store final message returned to the frontend
-        final_reply = "Project Creation completed successfully."
-
-        save_message(
-            chat_id,
-            role="assistant",
-            content=final_reply,
-            agent="pipeline"
-        )
-
-        project_id = save_project(
-            user_id=user_id,
-            title=pipeline_result["title"],
-            description=user_message,
-            chat_id=chat_id,
-            plan = pipeline_result["plan"],
-        )
-        
-        project_json = pipeline_result["project"]
-        
-          # -------------------------
-        # 💾 SAVE GENERATED FILES (NEW)
-        # -------------------------
-        save_files(
-            project_id=project_id,
-            structure=project_json["structure"]
-        )
-        
-        return {
-            "ok": True,
-            "type": "project",
-            "chat_id": chat_id,
-            "project_id": project_id,
-            "title": pipeline_result["title"],
-            "reply": final_reply,
-        }
+        return run_project(payload.user_id, chat_id, user_message, plan)
 
     # ---------- CONVERSATIONAL MODE ----------
-    reply = chat_agent.respond(chat_id, user_message)
+    reply = get_agent(ChatAgent).respond(chat_id, user_message)
 
     return {
         "ok": True,
@@ -133,7 +190,61 @@ def chat(payload: ChatPayload):
 
 
 
-@router.get("/{chat_id}")
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_chat(payload: ChatPayload):
+    """
+    SSE events: chat (chat_id known), token (text delta), status,
+    done (final payload) and error.
+    """
+    try:
+        chat_id, user_message, intent, plan = prepare_chat(payload)
+        yield _sse("chat", {"chat_id": chat_id, "type": intent["type"]})
+
+        if intent["type"] == "project":
+            # Generation is not token-streamed: report progress, then the result
+            yield _sse("status", {"stage": "generating"})
+            yield _sse("done", run_project(payload.user_id, chat_id, user_message, plan))
+            return
+
+        parts = []
+        for text in get_agent(ChatAgent).respond_stream(chat_id, user_message):
+            parts.append(text)
+            yield _sse("token", {"text": text})
+
+        yield _sse("done", {
+            "ok": True,
+            "type": "conversation",
+            "chat_id": chat_id,
+            "reply": "".join(parts).strip()
+        })
+    except Exception as e:
+        print("❌ Chat stream failed:", e)
+        yield _sse("error", {"detail": str(e)})
+
+
+@router.post("/stream")
+async def chat_stream(payload: ChatPayload, user: dict = Depends(get_current_user)):
+    """
+    Same as POST /chat/ but relays the reply token by token as
+    Server-Sent Events; the final message is stored once at the end.
+    """
+    # Checked before the stream starts: errors become a status code, not an event
+    await run_in_threadpool(authorize_payload, payload, user)
+
+    # Set on this request's task: the threads iterating the stream inherit it
+    current_user.set(payload.user_id or ANONYMOUS)
+
+    return StreamingResponse(
+        stream_chat(payload),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/{chat_id}", dependencies=[Depends(require_chat_owner)])
 def get_chat_history(chat_id: str):
     """
     Fetch all chat messages for a specific project.
@@ -150,7 +261,7 @@ def get_chat_history(chat_id: str):
     }
 
 
-@router.get("/get-chats/{user_id}")
+@router.get("/get-chats/{user_id}", dependencies=[Depends(require_user)])
 def get_user_all_chats(user_id: str):
     """
     Fetch all chats for a specific user.
@@ -1,11 +1,35 @@
+import asyncio
+import json
 import os
+import shutil
 import subprocess
-import signal
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, FileResponse, RedirectResponse
 from bson import ObjectId
-from utils.database_util import files_col
-import psutil
+from pymongo.errors import BulkWriteError
+from models.schemas import SyncPayload
+from utils.database_util import files_col, preview_log_lines_col
+from utils.file_utils import (
+    iter_project_files,
+    content_hash,
+    project_content_hash,
+    add_files_listener
+)
+from utils.codec_util import decode_text
+from utils.preview_supervisor import supervisor
+from utils.preview_logs import preview_logs
+from utils.validation_util import validate_files, shutdown_validation_pool
+from utils.project_tree import ProjectTree
+from utils.state_util import state, WORKER_ID, STATE_HEARTBEAT_INTERVAL
+from utils.cache_util import TTLCache
+from utils.write_behind_util import WriteBehindBuffer
+from utils.auth_util import get_current_user, require_project_owner, set_preview_cookie
 
 router = APIRouter()
 
@@ -16,227 +40,865 @@ BASE_PREVIEW_DIR = Path("/tmp/codexa")
 FRONTEND_PORT = 5959
 BACKEND_PORT = 7979
 
+# Address other workers / hosts reach this host's preview servers at,
+# and the interface the servers listen on (0.0.0.0 for multi-host)
+PREVIEW_HOST = os.getenv("PREVIEW_HOST", "127.0.0.1")
+PREVIEW_BIND_HOST = os.getenv("PREVIEW_BIND_HOST", "127.0.0.1")
+
+PREVIEW_STOP_TIMEOUT = float(os.getenv("PREVIEW_STOP_TIMEOUT", 30))      # seconds, other worker's preview
+PREVIEW_BUILD_TIMEOUT = float(os.getenv("PREVIEW_BUILD_TIMEOUT", 600))   # seconds, other worker's static build
+PREVIEW_SHARED_LOGS = os.getenv("PREVIEW_SHARED_LOGS", "1") == "1"
+
+def frontend_base_path(project_id: str) -> str:
+    """
+    Public prefix of a proxied dev server (see preview_proxy).
+    Vite runs with it as --base, so requests are forwarded unchanged.
+    """
+    return f"/preview/{project_id}/app/"
+
+
+def backend_base_path(project_id: str) -> str:
+    return f"/preview/{project_id}/api"
+
+
+NPM = "npm.cmd" if os.name == "nt" else "npm"
+NPX = "npx.cmd" if os.name == "nt" else "npx"
+
+class PreviewBusy(RuntimeError):
+    """
+    The preview ports of this host are held by a preview that did not stop.
+    """
+
+
 # ---------------------------------------
-# GLOBAL PROCESS STATE (SINGLE PROJECT)
+# PREVIEW REGISTRY (SHARED BY ALL WORKERS)
 # ---------------------------------------
-CURRENT_FRONTEND_PROCESS = None
-CURRENT_BACKEND_PROCESS = None
-CURRENT_PROJECT_ID = None
+# The fixed ports allow one running preview per host. Which one, and
+# which worker supervises its processes, lives in the state store:
+#   preview:slot:{host}     lease -> {"project_id"}
+#   preview:project:{id}    lease -> {"host", "worker", "mode", "dist", "ready", "touched_at"}
+# The owning worker's heartbeat keeps both alive; if it dies they expire.
+
+# Preview whose processes this worker supervises (processes are local)
+LOCAL_PROJECT_ID = None
+LOCAL_WATCHER_STOP = None
+
+# Registry reads are repeated on every proxied request: reuse them briefly
+# Not shared: it caches runtime_state itself, briefly
+preview_records = TTLCache("preview_records", maxsize=256, ttl=2, shared=False)
+
+
+def _slot_key(host: str = PREVIEW_HOST) -> str:
+    return f"preview:slot:{host}"
+
+
+def _project_key(project_id: str) -> str:
+    return f"preview:project:{project_id}"
+
+
+def preview_record(project_id: str) -> dict | None:
+    """
+    Registry entry of a running preview, whichever worker runs it.
+    """
+    return preview_records.get_or_load(project_id, lambda: state.data(_project_key(project_id)))
+
+
+def current_project_id(host: str = PREVIEW_HOST) -> str | None:
+    data = state.data(_slot_key(host))
+    return data.get("project_id") if data else None
+
+
+def is_running_here(project_id: str) -> bool:
+    """
+    Running on this host (any worker): its workspace and ports are local.
+    """
+    if project_id == LOCAL_PROJECT_ID:
+        return True
+    record = preview_record(project_id)
+    return bool(record) and record.get("host") == PREVIEW_HOST
+
+
+# project_id -> when this worker last reported activity to the owner
+_TOUCHED = {}
+
+
+def touch_preview(project_id: str):
+    """
+    Keep a preview from being reaped as idle. Activity seen by other
+    workers reaches the owner through the registry (see _on_project_renewed).
+    """
+    if project_id == LOCAL_PROJECT_ID:
+        supervisor.touch(project_id)
+        return
+
+    now = time.monotonic()
+    if now - _TOUCHED.get(project_id, 0) > STATE_HEARTBEAT_INTERVAL / 2:
+        _TOUCHED[project_id] = now
+        state.annotate(_project_key(project_id), touched_at=time.time())
+
+
+def _on_project_renewed(doc: dict):
+    touched_at = (doc.get("data") or {}).get("touched_at")
+    if LOCAL_PROJECT_ID and touched_at and time.time() - touched_at < 2 * STATE_HEARTBEAT_INTERVAL:
+        supervisor.touch(LOCAL_PROJECT_ID)
+
+
+def _on_lease_lost(key: str, reason: str):
+    # Another worker wants the ports, or our lease ran out: stop our processes
+    if LOCAL_PROJECT_ID:
+        print(f"⚠️ Stopping preview {LOCAL_PROJECT_ID} ({key} {reason})")
+        stop_local_project()
+
+
+def _on_ready(project_id: str, name: str):
+    if project_id == LOCAL_PROJECT_ID:
+        state.update(_project_key(project_id), **{f"ready.{name}": True})
+        preview_records.invalidate(project_id)
+
+
+preview_logs.ready_listeners.append(_on_ready)
 
 
 # ---------------------------------------
 # UTIL: STOP ANY RUNNING PROJECT
 # ---------------------------------------
-def stop_current_project():
-    global CURRENT_FRONTEND_PROCESS, CURRENT_BACKEND_PROCESS, CURRENT_PROJECT_ID
-
-    # Kill all Node/Vite processes running in the frontend project directory
-    # and any process listening on the backend port
-    if CURRENT_PROJECT_ID:
-        from pathlib import Path
-        import psutil
-        frontend_path = BASE_PREVIEW_DIR / CURRENT_PROJECT_ID / "frontend"
-        # Kill Node/Vite (frontend)
-        for proc in psutil.process_iter(["pid", "name", "cmdline", "cwd"]):
-            try:
-                if (
-                    proc.info["name"] and "node" in proc.info["name"].lower()
-                    and proc.info["cwd"]
-                    and Path(proc.info["cwd"]).resolve() == frontend_path.resolve()
-                ):
-                    proc.kill()
-            except Exception:
-                continue
-
-        # Kill any process listening on the backend port
-        for conn in psutil.net_connections(kind="inet"):
-            if conn.laddr and conn.laddr.port == BACKEND_PORT:
-                try:
-                    p = psutil.Process(conn.pid)
-                    p.kill()
-                except Exception:
-                    continue
+def stop_local_project():
+    """
+    Stop the preview this worker supervises and give up its leases.
+    """
+    global LOCAL_PROJECT_ID
 
-    if CURRENT_FRONTEND_PROCESS:
-        CURRENT_FRONTEND_PROCESS.terminate()
-        CURRENT_FRONTEND_PROCESS = None
+    project_id = LOCAL_PROJECT_ID
+    LOCAL_PROJECT_ID = None
+    stop_files_watcher()
+
+    if project_id:
+        supervisor.stop(project_id)
+        preview_logs.clear(project_id)
+        WORKSPACE_HASHES.pop(project_id, None)
+        state.release(_project_key(project_id))
+        preview_records.invalidate(project_id)
+
+    state.release(_slot_key())
+
+
+def stop_current_project(timeout: float = PREVIEW_STOP_TIMEOUT) -> bool:
+    """
+    Stop the preview running on this host, whichever worker owns it.
+    Returns False when its owner did not let go within timeout.
+    """
+    stop_local_project()
 
-    if CURRENT_BACKEND_PROCESS:
-        CURRENT_BACKEND_PROCESS.terminate()
-        CURRENT_BACKEND_PROCESS = None
+    if state.get(_slot_key()) is None:
+        return True
 
-    CURRENT_PROJECT_ID = None
+    # The owner stops on its next heartbeat (see _on_lease_lost)
+    state.request_release(_slot_key())
+    return state.wait_free(_slot_key(), timeout)
+
+
+def _on_preview_reaped(project_id: str, reason: str):
+    global LOCAL_PROJECT_ID
+
+    if project_id == LOCAL_PROJECT_ID:
+        WORKSPACE_HASHES.pop(project_id, None)
+        buffer = preview_logs.buffer(project_id)
+        buffer.append("codexa", f"preview stopped ({reason})")
+        buffer.closed = True
+        stop_files_watcher()
+        LOCAL_PROJECT_ID = None
+        state.release(_project_key(project_id))
+        state.release(_slot_key())
+        preview_records.invalidate(project_id)
+
+
+supervisor.on_reaped.append(_on_preview_reaped)
 
 
 # ---------------------------------------
-# REBUILD FRONTEND
+# SHARED LOGS
 # ---------------------------------------
-def rebuild_frontend(project_id: str) -> Path:
-    files = list(files_col.find({"project_id": ObjectId(project_id)}))
-    frontend_path = BASE_PREVIEW_DIR / project_id / "frontend"
-    frontend_path.mkdir(parents=True, exist_ok=True)
+# The owner mirrors log lines to Mongo in batches, so the log stream
+# can be served by any worker, not only the one running the processes.
+_LOG_WRITES = None
+_LOG_WRITES_LOCK = threading.Lock()
+
+
+def _write_log_lines(batch):
+    try:
+        preview_log_lines_col.insert_many([doc for _, doc in batch], ordered=False)
+    except BulkWriteError as e:
+        # Retries and spill replays repeat lines already written
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+
+def _mirror_log_line(project_id: str, entry: dict):
+    global _LOG_WRITES
+
+    if not PREVIEW_SHARED_LOGS or project_id != LOCAL_PROJECT_ID:
+        return
+
+    with _LOG_WRITES_LOCK:
+        if _LOG_WRITES is None:
+            _LOG_WRITES = WriteBehindBuffer(_write_log_lines, "preview_log_lines")
+
+    _LOG_WRITES.add(project_id, {"project_id": project_id, "created_at": datetime.utcnow(), **entry})
+
+
+preview_logs.line_listeners.append(_mirror_log_line)
+
+
+def _shared_log_lines(project_id: str, seq: int) -> list[dict]:
+    cursor = preview_log_lines_col.find(
+        {"project_id": project_id, "seq": {"$gte": seq}},
+        {"_id": 0, "seq": 1, "ts": 1, "source": 1, "line": 1}
+    ).sort("seq", 1).limit(1000)
+    return list(cursor)
+
+
+# ---------------------------------------
+# WORKSPACE WRITES
+# ---------------------------------------
+# project_id -> {path: (content hash, mtime_ns, size)} of what this worker
+# last saw on disk. Other workers of the host write the same workspace, so
+# an entry is only trusted while the file's stat still matches it.
+WORKSPACE_HASHES = {}
+
+
+def _workspace_file(project_id: str, path: str) -> Path | None:
+    """
+    Where path lives in the workspace, or None when it would land outside
+    its side (".." segments, absolute paths, symlinks).
+    """
+    side, _, rel = path.partition("/")
+    if side not in ("frontend", "backend") or not rel:
+        return None
+
+    root = (BASE_PREVIEW_DIR / project_id / side).resolve()
+    full = (root / rel).resolve()
+    if full == root or root not in full.parents:
+        print(f"⚠️ Refusing workspace path outside {side}/: {path!r}")
+        return None
+    return full
+
+
+def _write_workspace_file(project_id: str, path: str, content: str) -> bool:
+    """
+    Write one project file into the preview workspace.
+    Skips the write when the file on disk already has this content,
+    so dev servers are not woken up for nothing.
+    """
+    full = _workspace_file(project_id, path)
+    if full is None:
+        return False
+
+    written = WORKSPACE_HASHES.setdefault(project_id, {})
+    digest = content_hash(content)
+
+    try:
+        st = full.stat()
+    except FileNotFoundError:
+        st = None
+
+    if st is not None:
+        known = written.get(path)
+        if known is not None and known[1:] == (st.st_mtime_ns, st.st_size):
+            on_disk = known[0]
+        else:
+            on_disk = content_hash(full.read_text(encoding="utf-8", errors="replace"))
+        if on_disk == digest:
+            written[path] = (digest, st.st_mtime_ns, st.st_size)
+            return False
+
+    full.parent.mkdir(parents=True, exist_ok=True)
+    full.write_text(content, encoding="utf-8")
+    st = full.stat()
+    written[path] = (digest, st.st_mtime_ns, st.st_size)
+    return True
+
+
+def _rebuild_side(project_id: str, side: str, tree: ProjectTree = None) -> Path:
+    side_path = BASE_PREVIEW_DIR / project_id / side
+    side_path.mkdir(parents=True, exist_ok=True)
+
+    if tree is None:
+        tree = ProjectTree.from_files(iter_project_files(project_id, prefix=f"{side}/"))
 
     count = 0
-    for file in files:
-        if not file["path"].startswith("frontend/"):
-            continue
-
-        rel = file["path"].replace("frontend/", "")
-        full = frontend_path / rel
-        full.parent.mkdir(parents=True, exist_ok=True)
-        full.write_text(file["content"], encoding="utf-8")
+    for node in tree.iter_files(side):
+        _write_workspace_file(project_id, node.path, node.content)
         count += 1
 
     if count == 0:
-        raise RuntimeError("No frontend files found")
+        raise RuntimeError(f"No {side} files found")
 
-    return frontend_path
+    return side_path
+
+
+# ---------------------------------------
+# REBUILD FRONTEND
+# ---------------------------------------
+def rebuild_frontend(project_id: str, tree: ProjectTree = None) -> Path:
+    return _rebuild_side(project_id, "frontend", tree)
 
 
 # ---------------------------------------
 # REBUILD BACKEND
 # ---------------------------------------
-def rebuild_backend(project_id: str) -> Path:
-    files = list(files_col.find({"project_id": ObjectId(project_id)}))
-    backend_path = BASE_PREVIEW_DIR / project_id / "backend"
-    backend_path.mkdir(parents=True, exist_ok=True)
+def rebuild_backend(project_id: str, tree: ProjectTree = None) -> Path:
+    return _rebuild_side(project_id, "backend", tree)
 
-    count = 0
-    for file in files:
-        if not file["path"].startswith("backend/"):
-            continue
-
-        rel = file["path"].replace("backend/", "")
-        full = backend_path / rel
-        full.parent.mkdir(parents=True, exist_ok=True)
-        full.write_text(file["content"], encoding="utf-8")
-        count += 1
 
-    if count == 0:
-        raise RuntimeError("No backend files found")
+# ---------------------------------------
+# LIVE SYNC INTO A RUNNING PREVIEW
+# ---------------------------------------
+def sync_project_files(project_id: str, paths=None) -> list[str]:
+    """
+    Push changed files of the running project into its workspace.
+    Vite HMR and uvicorn --reload pick the writes up, no restart needed.
+    """
+    if not is_running_here(project_id):
+        return []
+
+    written = []
+    for file in iter_project_files(project_id, paths=paths):
+        if _write_workspace_file(project_id, file["path"], file["content"]):
+            written.append(file["path"])
+
+    if written:
+        print(f"🔄 Synced {len(written)} file(s) into preview {project_id}")
+
+    return written
 
-    return backend_path
+
+def _on_files_changed(project_id: str, paths):
+    # Any worker of the running preview's host may do this: the workspace is local to the host
+    if not is_running_here(project_id):
+        return
+
+    sync_project_files(project_id, paths)
+
+    record = preview_record(project_id) or {}
+    if record.get("mode") == "static" and any(p.startswith("frontend/") for p in paths):
+        t = threading.Thread(target=refresh_static_preview, args=(project_id,))
+        t.daemon = True
+        t.start()
+
+
+add_files_listener(_on_files_changed)
+
+
+def _watch_files(project_id: str, stop: threading.Event):
+    """
+    Follow files_col through a change stream so edits written by other
+    processes reach the workspace too. Needs a replica set; exits quietly otherwise.
+    """
+    pipeline = [{"$match": {
+        "operationType": {"$in": ["insert", "update", "replace"]},
+        "fullDocument.project_id": ObjectId(project_id)
+    }}]
+
+    try:
+        with files_col.watch(pipeline, full_document="updateLookup") as stream:
+            while not stop.is_set() and stream.alive:
+                change = stream.try_next()
+                if change is None:
+                    stop.wait(0.2)
+                    continue
+
+                doc = change.get("fullDocument") or {}
+                if "path" in doc and project_id == LOCAL_PROJECT_ID:
+                    content = decode_text(doc.get("content", ""), doc.get("content_codec"))
+                    _write_workspace_file(project_id, doc["path"], content)
+    except Exception as e:
+        print("⚠️ Preview file watcher disabled:", e)
+
+
+def start_files_watcher(project_id: str):
+    global LOCAL_WATCHER_STOP
+
+    stop_files_watcher()
+    LOCAL_WATCHER_STOP = threading.Event()
+    t = threading.Thread(target=_watch_files, args=(project_id, LOCAL_WATCHER_STOP))
+    t.daemon = True
+    t.start()
+
+
+def stop_files_watcher():
+    global LOCAL_WATCHER_STOP
+
+    if LOCAL_WATCHER_STOP:
+        LOCAL_WATCHER_STOP.set()
+        LOCAL_WATCHER_STOP = None
 
 
 # ---------------------------------------
 # RUN FRONTEND + BACKEND
 # ---------------------------------------
-def run_project(project_id: str):
-    global CURRENT_FRONTEND_PROCESS, CURRENT_BACKEND_PROCESS, CURRENT_PROJECT_ID
+def _npm_install(frontend_path: Path):
+    subprocess.run([NPM, "install"], cwd=str(frontend_path), shell=os.name == "nt", check=True)
 
-    # 🔥 Stop previous project (important)
-    stop_current_project()
 
-    frontend_path = rebuild_frontend(project_id)
-    backend_path = rebuild_backend(project_id)
+FRONTEND_READY_PATTERN = r"ready in|Local:\s+http"
+BACKEND_READY_PATTERN = r"Application startup complete|Uvicorn running on"
 
-    # ---------------- FRONTEND ----------------
-    node_modules = frontend_path / "node_modules"
-    if not node_modules.exists():
-        subprocess.run(
-            ["npm.cmd", "install"],
-            cwd=str(frontend_path),
-            shell=True,
-            check=True
-        )
+# projects whose frontend was already reinstalled once during this run
+FRONTEND_REPAIRED = set()
 
-    import time
-    import threading
 
-    def monitor_and_fix_frontend(proc, frontend_path):
-        try:
-            # Read stderr line by line for up to 10 seconds
-            start = time.time()
-            while time.time() - start < 10:
-                line = proc.stderr.readline()
-                if not line:
-                    break
-                if b"Cannot find module" in line:
-                    # Remove node_modules and package-lock.json, then reinstall
-                    subprocess.run(["rmdir", "/s", "/q", "node_modules"], cwd=str(frontend_path), shell=True)
-                    subprocess.run(["del", "/f", "/q", "package-lock.json"], cwd=str(frontend_path), shell=True)
-                    subprocess.run(["npm.cmd", "install"], cwd=str(frontend_path), shell=True, check=True)
-                    # Restart frontend process
-                    proc.terminate()
-                    new_proc = subprocess.Popen(
-                        ["npm.cmd", "run", "dev", "--", "--port", str(FRONTEND_PORT)],
-                        cwd=str(frontend_path),
-                        shell=True
-                    )
-                    return new_proc
-        except Exception:
-            pass
-        return proc
-
-    CURRENT_FRONTEND_PROCESS = subprocess.Popen(
-        ["npm.cmd", "run", "dev", "--", "--port", str(FRONTEND_PORT)],
-        cwd=str(frontend_path),
+def _start_frontend(project_id: str, frontend_path: Path):
+    proc = supervisor.start(
+        project_id,
+        "frontend",
+        [
+            NPM, "run", "dev", "--",
+            "--host", PREVIEW_BIND_HOST,
+            "--port", str(FRONTEND_PORT),
+            "--base", frontend_base_path(project_id)
+        ],
+        frontend_path,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        shell=True
+        env={**os.environ, "VITE_API_URL": backend_base_path(project_id)}
     )
-
-    # Start a thread to monitor and fix 'Cannot find module' errors
-    t = threading.Thread(target=monitor_and_fix_frontend, args=(CURRENT_FRONTEND_PROCESS, frontend_path))
-    t.daemon = True
-    t.start()
+    preview_logs.attach(
+        project_id,
+        "frontend",
+        proc,
+        ready_pattern=FRONTEND_READY_PATTERN,
+        port=FRONTEND_PORT,
+        on_line=_on_frontend_line
+    )
+    return proc
 
 
-    # ---------------- BACKEND ----------------
-    CURRENT_BACKEND_PROCESS = subprocess.Popen(
+def _start_backend(project_id: str, backend_path: Path):
+    proc = supervisor.start(
+        project_id,
+        "backend",
         [
             "uvicorn",
             "main:app",
-            "--host", "127.0.0.1",
-            "--port", str(BACKEND_PORT)
+            "--host", PREVIEW_BIND_HOST,
+            "--port", str(BACKEND_PORT),
+            "--reload"
         ],
-        cwd=str(backend_path),
-        shell=True
+        backend_path,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT
+    )
+    preview_logs.attach(
+        project_id,
+        "backend",
+        proc,
+        ready_pattern=BACKEND_READY_PATTERN,
+        port=BACKEND_PORT
     )
+    return proc
+
+
+def repair_frontend(project_id: str):
+    """
+    Remove node_modules and package-lock.json, reinstall, restart the dev server.
+    """
+    frontend_path = BASE_PREVIEW_DIR / project_id / "frontend"
+
+    # The dev server may exit while node_modules is gone: the hold keeps the
+    # crash reaper from tearing the preview down, and is revoked if the
+    # preview is stopped on purpose meanwhile
+    token = supervisor.hold(project_id)
+    try:
+        shutil.rmtree(frontend_path / "node_modules", ignore_errors=True)
+        (frontend_path / "package-lock.json").unlink(missing_ok=True)
+        _npm_install(frontend_path)
+
+        if supervisor.is_held(project_id, token):
+            _start_frontend(project_id, frontend_path)
+        else:
+            print(f"⚠️ Preview {project_id} stopped during frontend repair, not restarting")
+    except Exception as e:
+        print("❌ Frontend repair failed:", e)
+    finally:
+        supervisor.release_hold(project_id, token)
+
+
+def _on_frontend_line(project_id: str, name: str, line: str):
+    # Runs on the log loop: hand the slow reinstall to a thread
+    if "Cannot find module" in line and project_id not in FRONTEND_REPAIRED:
+        FRONTEND_REPAIRED.add(project_id)
+        t = threading.Thread(target=repair_frontend, args=(project_id,))
+        t.daemon = True
+        t.start()
+
+
+# ---------------------------------------
+# STATIC BUILDS (NO DEV SERVER)
+# ---------------------------------------
+# frontend content hash -> built dist/, shared by every project with that content
+STATIC_BUILD_DIR = BASE_PREVIEW_DIR / "_static"
+
+STATIC_BUILD_LOCKS = {}
+STATIC_BUILD_LOCKS_GUARD = threading.Lock()
+
+
+@contextmanager
+def _build_lock(digest: str):
+    """
+    One build per digest and host: a thread lock inside this worker,
+    a lease between the workers sharing STATIC_BUILD_DIR.
+    """
+    with STATIC_BUILD_LOCKS_GUARD:
+        local = STATIC_BUILD_LOCKS.setdefault(digest, threading.Lock())
+
+    with local:
+        key = f"preview:build:{PREVIEW_HOST}:{digest}"
+        deadline = time.monotonic() + PREVIEW_BUILD_TIMEOUT
+        while not state.acquire(key):
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Static build {digest[:12]} is still running on another worker")
+            time.sleep(0.5)
+
+        state.hold(key)
+        try:
+            yield
+        finally:
+            state.release(key)
+
+
+def static_dist(project_id: str) -> Path | None:
+    """
+    dist/ served under /preview/{project_id}/, if it is a static preview on this host.
+    """
+    record = preview_record(project_id)
+    if not record or record.get("mode") != "static" or record.get("host") != PREVIEW_HOST:
+        return None
+    return Path(record["dist"]) if record.get("dist") else None
+
+
+def build_static_frontend(project_id: str, tree: ProjectTree = None) -> Path:
+    """
+    Run `vite build` once per frontend content hash and cache dist/.
+    The build uses a relative base so one output serves any project id.
+    """
+    if tree is not None:
+        digest = tree.digest("frontend")
+    else:
+        digest = project_content_hash(project_id, prefix="frontend/")
+    dist_path = STATIC_BUILD_DIR / digest
+
+    with _build_lock(digest):
+        if (dist_path / "index.html").exists():
+            return dist_path
+
+        frontend_path = rebuild_frontend(project_id, tree)
+        if not (frontend_path / "node_modules").exists():
+            _npm_install(frontend_path)
 
-    CURRENT_PROJECT_ID = project_id
+        tmp_path = STATIC_BUILD_DIR / f".{digest}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        STATIC_BUILD_DIR.mkdir(parents=True, exist_ok=True)
+
+        print(f"📦 Building static preview for {project_id} ({digest[:12]})")
+        subprocess.run(
+            [NPX, "vite", "build", "--base", "./", "--outDir", str(tmp_path), "--emptyOutDir"],
+            cwd=str(frontend_path),
+            shell=os.name == "nt",
+            check=True
+        )
+
+        shutil.rmtree(dist_path, ignore_errors=True)
+        tmp_path.rename(dist_path)
+
+    return dist_path
+
+
+def refresh_static_preview(project_id: str):
+    try:
+        dist_path = build_static_frontend(project_id)
+        state.annotate(_project_key(project_id), dist=str(dist_path))
+        preview_records.invalidate(project_id)
+    except Exception as e:
+        print("❌ Static rebuild failed:", e)
+
+
+def run_project(project_id: str, mode: str = "dev", tree: ProjectTree = None):
+    """
+    mode="dev":    Vite dev server with HMR + backend.
+    mode="static": cached `vite build` served by this app + backend.
+    tree: the project's files, when the caller already loaded them.
+    """
+    global LOCAL_PROJECT_ID
+
+    # 🔥 Stop previous project (important), on whichever worker runs it
+    if not stop_current_project():
+        raise PreviewBusy("The running preview did not stop in time")
+
+    # ---------------- REGISTRY ----------------
+    if not state.acquire(_slot_key(), data={"project_id": project_id}):
+        raise PreviewBusy("Another preview is starting on this host")
+    state.hold(_slot_key(), on_lost=_on_lease_lost)
+
+    record = {"host": PREVIEW_HOST, "worker": WORKER_ID, "mode": mode, "dist": None, "ready": {}, "touched_at": time.time()}
+    if not state.acquire(_project_key(project_id), data=record):
+        state.release(_slot_key())
+        raise PreviewBusy("This project is already running on another host")
+    state.hold(_project_key(project_id), on_lost=_on_lease_lost, on_renew=_on_project_renewed)
+
+    LOCAL_PROJECT_ID = project_id
+    preview_records.invalidate(project_id)
+    preview_log_lines_col.delete_many({"project_id": project_id})   # sequence restarts at 0
+
+    try:
+        if mode == "static":
+            dist_path = build_static_frontend(project_id, tree)
+            state.update(_project_key(project_id), dist=str(dist_path))
+        else:
+            frontend_path = rebuild_frontend(project_id, tree)
+
+        backend_path = rebuild_backend(project_id, tree)
+
+        # ---------------- FRONTEND ----------------
+        if mode == "static":
+            preview_logs.mark_ready(project_id, "frontend")
+        else:
+            node_modules = frontend_path / "node_modules"
+            if not node_modules.exists():
+                _npm_install(frontend_path)
+
+            FRONTEND_REPAIRED.discard(project_id)
+            _start_frontend(project_id, frontend_path)
+
+        # ---------------- BACKEND ----------------
+        _start_backend(project_id, backend_path)
+    except Exception:
+        stop_local_project()
+        raise
+
+    start_files_watcher(project_id)
 
     return {
-        "frontend": f"http://localhost:{FRONTEND_PORT}",
-        "backend": f"http://localhost:{BACKEND_PORT}"
+        "frontend": frontend_base_path(project_id),
+        "backend": backend_base_path(project_id)
     }
 
 
 # ---------------------------------------
 # API: RUN FULL PROJECT
 # ---------------------------------------
-@router.post("/preview/full/{project_id}")
-def preview_full(project_id: str):
-    urls = run_project(project_id)
+@router.post("/preview/full/{project_id}", dependencies=[Depends(require_project_owner)])
+def preview_full(
+    project_id: str,
+    request: Request,
+    response: Response,
+    mode: str = "dev",
+    wait: bool = False,
+    timeout: float = 60,
+    force: bool = False,
+    authorization: str = Header(None)
+):
+    """
+    Start the preview. With wait=true, return only once both servers
+    are serving (or the timeout elapsed; see "ready").
+    Projects failing static validation are rejected with 422 before
+    anything is installed, unless force=true.
+    """
+    if mode not in ("dev", "static"):
+        raise HTTPException(status_code=400, detail="mode must be 'dev' or 'static'")
+
+    # One read of the project, shared by validation and the workspace rebuild
+    tree = ProjectTree.from_files(iter_project_files(project_id))
+    report = validate_files(tree.files(), hashes=tree.hashes())
+    if not report["ok"] and not force:
+        raise HTTPException(status_code=422, detail={
+            "message": "Project failed validation",
+            "errors": report["errors"],
+            "warnings": report["warnings"],
+            "diagnostics": report["diagnostics"]
+        })
+
+    # Public URLs go through this app's port (see preview_proxy)
+    base_url = str(request.base_url).rstrip("/")
+    try:
+        urls = {
+            name: base_url + path
+            for name, path in run_project(project_id, mode, tree).items()
+        }
+    except PreviewBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    ready = None
+    if wait:
+        ready = preview_logs.wait_ready(project_id, ("frontend", "backend"), timeout)
+
+    # The preview URLs are opened by the browser itself, without our header
+    set_preview_cookie(response, project_id, authorization)
+
     return {
         "ok": True,
         "project_id": project_id,
+        "mode": mode,
+        "ready": ready,
+        "validation": {k: report[k] for k in ("ok", "errors", "warnings", "elapsed_ms")},
         **urls
     }
 
 
+# ---------------------------------------
+# API: STREAM LOGS (SSE)
+# ---------------------------------------
+@router.get("/preview/logs/{project_id}", dependencies=[Depends(require_project_owner)])
+async def preview_logs_stream(project_id: str, request: Request, since: int = 0):
+    """
+    Tail the preview logs as Server-Sent Events.
+    Resumes from the Last-Event-ID header when the browser reconnects.
+    """
+    buffer = preview_logs.get(project_id)
+
+    if buffer is not None:
+        fetch = buffer.since
+        closed = lambda: buffer.closed
+    elif PREVIEW_SHARED_LOGS and preview_record(project_id) is not None:
+        # Running under another worker: read its mirrored lines
+        fetch = lambda seq: _shared_log_lines(project_id, seq)
+        closed = lambda: preview_record(project_id) is None
+    else:
+        raise HTTPException(status_code=404, detail="No logs for this project")
+
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id) + 1
+
+    async def events():
+        seq = since
+        while not await request.is_disconnected():
+            for entry in await run_in_threadpool(fetch, seq):
+                seq = entry["seq"] + 1
+                yield f"id: {entry['seq']}\ndata: {json.dumps(entry)}\n\n"
+
+            if await run_in_threadpool(closed):
+                yield "event: end\ndata: {}\n\n"
+                return
+
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# ---------------------------------------
+# API: SYNC FILES INTO RUNNING PROJECT
+# ---------------------------------------
+@router.post("/preview/sync/{project_id}", dependencies=[Depends(require_project_owner)])
+def sync_preview(project_id: str, payload: SyncPayload | None = None):
+    """
+    Write changed files into the running preview without restarting it.
+    Without paths, every file of the project is compared against the workspace.
+    """
+    if not is_running_here(project_id):
+        raise HTTPException(status_code=409, detail="Project preview is not running on this host")
+
+    touch_preview(project_id)
+    paths = payload.paths if payload else None
+    written = sync_project_files(project_id, paths)
+    return {"ok": True, "project_id": project_id, "synced": written}
+
+
 # ---------------------------------------
 # API: STOP PROJECT
 # ---------------------------------------
-@router.post("/preview/stop/{project_id}")
+@router.post("/preview/stop/{project_id}", dependencies=[Depends(require_project_owner)])
 def stop_preview(project_id: str):
     """
     Stop the currently running project (frontend and backend) in the terminal.
     """
-    stop_current_project()
+    record = preview_record(project_id)
+    if record and record.get("host") != PREVIEW_HOST:
+        # Its owner on the other host stops on its next heartbeat
+        state.request_release(_project_key(project_id))
+        preview_records.invalidate(project_id)
+        return {"ok": True, "status": "stopping"}
+
+    if not stop_current_project():
+        raise HTTPException(status_code=409, detail="The running preview did not stop in time")
     return {"ok": True, "status": "stopped"}
 
 
 # ---------------------------------------
 # API: STATUS
 # ---------------------------------------
-@router.get("/preview/status")
+@router.get("/preview/status", dependencies=[Depends(get_current_user)])
 def preview_status():
-    if CURRENT_PROJECT_ID:
-        return {
-            "status": "running",
-            "project_id": CURRENT_PROJECT_ID,
-            "frontend_port": FRONTEND_PORT,
-            "backend_port": BACKEND_PORT
+    project_id = current_project_id()
+    record = preview_record(project_id) if project_id else None
+    if not record:
+        return {"status": "idle"}
+
+    status = {
+        "status": "running",
+        "project_id": project_id,
+        "mode": record.get("mode"),
+        "host": record.get("host"),
+        "worker": record.get("worker"),
+        "frontend_port": FRONTEND_PORT,
+        "backend_port": BACKEND_PORT,
+        "ready": {
+            name: bool((record.get("ready") or {}).get(name))
+            for name in ("frontend", "backend")
         }
-    return {"status": "idle"}
+    }
+    if project_id == LOCAL_PROJECT_ID:
+        status["processes"] = supervisor.info(project_id)["processes"]
+    return status
+
+
+# ---------------------------------------
+# STATIC PREVIEW FILES
+# ---------------------------------------
+# Registered last: the catch-all must not shadow the routes above.
+@router.get("/preview/{project_id}", dependencies=[Depends(require_project_owner)])
+def static_preview_root(project_id: str):
+    # Relative asset URLs need the trailing slash
+    return RedirectResponse(f"/preview/{project_id}/")
+
+
+def static_file_response(dist_path: Path, path: str) -> FileResponse:
+    """
+    A file of a resolved dist/ (blocking: stats the file system).
+    """
+    full = (dist_path / path).resolve()
+    if not full.is_relative_to(dist_path.resolve()):
+        raise HTTPException(status_code=404, detail="Not found")
+
+    if not full.is_file():
+        # SPA fallback for client-side routes
+        return FileResponse(dist_path / "index.html", headers={"Cache-Control": "no-cache"})
+
+    headers = {"Cache-Control": "no-cache"}
+    if path.startswith("assets/"):
+        # Vite fingerprints everything under assets/
+        headers["Cache-Control"] = "public, max-age=31536000, immutable"
+
+    return FileResponse(full, headers=headers)
+
+
+@router.get("/preview/{project_id}/{path:path}", dependencies=[Depends(require_project_owner)])
+def static_preview_file(project_id: str, path: str):
+    dist_path = static_dist(project_id)
+    if dist_path is None:
+        raise HTTPException(status_code=404, detail="No static preview for this project")
+
+    return static_file_response(dist_path, path)
+
+
+@router.on_event("shutdown")
+def stop_previews_on_shutdown():
+    stop_local_project()
+    supervisor.stop_all()
+    shutdown_validation_pool()
+    if _LOG_WRITES is not None:
+        _LOG_WRITES.close()
+    state.close()
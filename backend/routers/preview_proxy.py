@@ -0,0 +1,233 @@
+import asyncio
+import httpx
+import websockets
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from routers import preview
+from utils.auth_util import PREVIEW_COOKIE, get_current_user, require_project_owner
+
+router = APIRouter(prefix="/preview")
+
+# ---------------------------------------
+# CONFIG
+# ---------------------------------------
+PROXY_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "HEAD"]
+
+# Headers that describe a single hop and must not be forwarded
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+    "host",
+    "content-length",
+}
+
+# ---------------------------------------
+# POOLED UPSTREAM CLIENT
+# ---------------------------------------
+PROXY_CLIENT = None
+
+
+def get_proxy_client() -> httpx.AsyncClient:
+    """
+    One keep-alive client for every preview, created on the serving loop.
+    """
+    global PROXY_CLIENT
+
+    if PROXY_CLIENT is None:
+        PROXY_CLIENT = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=200,
+                max_keepalive_connections=50,
+                keepalive_expiry=30
+            ),
+            timeout=httpx.Timeout(60, connect=5),
+            follow_redirects=False
+        )
+    return PROXY_CLIENT
+
+
+@router.on_event("shutdown")
+async def close_proxy_client():
+    global PROXY_CLIENT
+
+    if PROXY_CLIENT is not None:
+        await PROXY_CLIENT.aclose()
+        PROXY_CLIENT = None
+
+
+# ---------------------------------------
+# UTIL: RESOLVE SANDBOX
+# ---------------------------------------
+def _upstream(project_id: str, side: str) -> str:
+    """
+    Dev server address, whichever worker or host runs the preview.
+    """
+    if project_id == preview.LOCAL_PROJECT_ID:
+        host = "127.0.0.1"
+    else:
+        record = preview.preview_record(project_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="Project preview is not running")
+        host = "127.0.0.1" if record.get("host") == preview.PREVIEW_HOST else record["host"]
+
+    preview.touch_preview(project_id)
+    port = preview.FRONTEND_PORT if side == "app" else preview.BACKEND_PORT
+    return f"{host}:{port}"
+
+
+def _forward_headers(request: Request) -> dict:
+    headers = {
+        k: v for k, v in request.headers.items()
+        if k.lower() not in HOP_BY_HOP_HEADERS
+    }
+    # Our session cookie is not the previewed app's business
+    if "cookie" in headers:
+        cookies = [
+            c for c in headers["cookie"].split(";")
+            if c.strip().partition("=")[0] != PREVIEW_COOKIE
+        ]
+        if cookies:
+            headers["cookie"] = ";".join(cookies)
+        else:
+            del headers["cookie"]
+
+    headers["x-forwarded-host"] = request.headers.get("host", "")
+    headers["x-forwarded-proto"] = request.url.scheme
+    if request.client:
+        headers["x-forwarded-for"] = request.client.host
+    return headers
+
+
+async def _proxy(request: Request, url: str):
+    client = get_proxy_client()
+
+    upstream_request = client.build_request(
+        request.method,
+        url,
+        params=request.query_params,
+        headers=_forward_headers(request),
+        content=request.stream()
+    )
+
+    try:
+        upstream = await client.send(upstream_request, stream=True)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Preview upstream error: {e}")
+
+    headers = {
+        k: v for k, v in upstream.headers.items()
+        if k.lower() not in HOP_BY_HOP_HEADERS
+    }
+
+    return StreamingResponse(
+        upstream.aiter_raw(),
+        status_code=upstream.status_code,
+        headers=headers,
+        background=BackgroundTask(upstream.aclose)
+    )
+
+
+# ---------------------------------------
+# API: PROXY FRONTEND
+# ---------------------------------------
+@router.api_route("/{project_id}/app/{path:path}", methods=PROXY_METHODS, dependencies=[Depends(require_project_owner)])
+async def proxy_frontend(project_id: str, path: str, request: Request):
+    # Registry read and file stats are blocking: keep them off the event loop
+    dist_path = await run_in_threadpool(preview.static_dist, project_id)
+    if dist_path is not None:
+        return await run_in_threadpool(preview.static_file_response, dist_path, path)
+
+    host = await run_in_threadpool(_upstream, project_id, "app")
+    return await _proxy(request, f"http://{host}{preview.frontend_base_path(project_id)}{path}")
+
+
+# ---------------------------------------
+# API: PROXY BACKEND
+# ---------------------------------------
+@router.api_route("/{project_id}/api/{path:path}", methods=PROXY_METHODS, dependencies=[Depends(require_project_owner)])
+async def proxy_backend(project_id: str, path: str, request: Request):
+    host = await run_in_threadpool(_upstream, project_id, "api")
+    return await _proxy(request, f"http://{host}/{path}")
+
+
+# ---------------------------------------
+# WS: VITE HMR PASSTHROUGH
+# ---------------------------------------
+def _authorize_ws(websocket: WebSocket, project_id: str):
+    """
+    The HTTP routes' auth for a socket: bearer header or preview cookie.
+    """
+    user = get_current_user(websocket.headers.get("authorization"), websocket.cookies.get(PREVIEW_COOKIE))
+    require_project_owner(project_id, user)
+
+
+@router.websocket("/{project_id}/app/{path:path}")
+async def proxy_frontend_ws(websocket: WebSocket, project_id: str, path: str):
+    try:
+        await run_in_threadpool(_authorize_ws, websocket, project_id)
+        host = await run_in_threadpool(_upstream, project_id, "app")
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    url = f"ws://{host}{preview.frontend_base_path(project_id)}{path}"
+    if websocket.url.query:
+        url += f"?{websocket.url.query}"
+
+    subprotocols = websocket.scope.get("subprotocols") or []
+
+    try:
+        upstream = await websockets.connect(
+            url,
+            subprotocols=subprotocols or None,
+            max_size=None
+        )
+    except Exception:
+        await websocket.close(code=1011)
+        return
+
+    await websocket.accept(subprotocol=upstream.subprotocol)
+
+    async def client_to_upstream():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("text") is not None:
+                    await upstream.send(message["text"])
+                elif message.get("bytes") is not None:
+                    await upstream.send(message["bytes"])
+        except WebSocketDisconnect:
+            return
+
+    async def upstream_to_client():
+        async for message in upstream:
+            if isinstance(message, bytes):
+                await websocket.send_bytes(message)
+            else:
+                await websocket.send_text(message)
+
+    tasks = [
+        asyncio.create_task(client_to_upstream()),
+        asyncio.create_task(upstream_to_client())
+    ]
+
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await upstream.close()
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass
@@ -1,16 +1,37 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Depends
+from utils.auth_util import require_project_owner
 from utils.database_util import files_col
+from utils.file_utils import (
+    save_file,
+    file_manifest,
+    get_project_file,
+    iter_project_files,
+    list_directory
+)
+from utils.revision_util import (
+    list_revisions,
+    get_revision_content,
+    diff_revisions,
+    compact_revisions,
+    KEEP_REVISIONS
+)
+from utils.response_util import json_response, make_etag
+from utils.codec_util import decode_field
+from models.schemas import FilePayload, FileBatchPayload
 from bson import ObjectId
 
-router = APIRouter(prefix="/files")
+# Every route is under /files/{project_id}: only the project's owner gets through
+router = APIRouter(prefix="/files", dependencies=[Depends(require_project_owner)])
+
+MAX_BATCH_PATHS = 200
 
 
 @router.get("/{project_id}")
-def get_project_files(project_id: str):
+def get_project_files(project_id: str, request: Request):
     files = list(
         files_col.find(
             {"project_id": ObjectId(project_id)},
-            {"content": 1, "path": 1}
+            {"content": 1, "content_codec": 1, "path": 1, "hash": 1}
         )
     )
 
@@ -19,10 +40,162 @@ def get_project_files(project_id: str):
 
     for f in files:
         f["_id"] = str(f["_id"])
+        decode_field(f)
 
-    return {
+    etag = make_etag(*sorted(f"{f['path']}:{f.get('hash')}" for f in files))
+    if any(not f.get("hash") for f in files):
+        etag = None  # legacy rows: no cheap way to tell if content changed
+
+    return json_response(request, {
         "ok": True,
         "files": files
+    }, etag=etag)
+
+
+@router.get("/{project_id}/manifest")
+def get_project_manifest(project_id: str, request: Request):
+    """
+    File listing without content: path, size, hash, updated_at.
+    """
+    manifest = file_manifest(project_id)
+
+    if not manifest:
+        raise HTTPException(status_code=404, detail="No files found")
+
+    etag = make_etag(*(f"{f['path']}:{f['hash']}" for f in manifest))
+
+    return json_response(request, {
+        "ok": True,
+        "project_id": project_id,
+        "files": manifest
+    }, etag=etag)
+
+
+@router.get("/{project_id}/tree")
+def get_project_tree(project_id: str, request: Request, dir: str = ""):
+    """
+    One directory level of the project tree, e.g. ?dir=frontend/src.
+    Sub-directories carry child_count so the UI can fetch them on expand.
+    """
+    children = list_directory(project_id, dir)
+
+    if children is None:
+        raise HTTPException(status_code=404, detail="Directory not found")
+
+    return json_response(request, {
+        "ok": True,
+        "dir": dir.strip("/"),
+        "children": children
+    }, etag=make_etag(*(f"{c['path']}:{c.get('child_count')}" for c in children)))
+
+
+@router.get("/{project_id}/content")
+def get_file_content(project_id: str, path: str, request: Request):
+    """
+    Content of a single file, addressed by its project path.
+    """
+    f = get_project_file(project_id, path)
+
+    if f is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    return json_response(request, {
+        "ok": True,
+        **f
+    }, etag=f'"{f["hash"]}"')
+
+
+@router.post("/{project_id}/batch")
+def get_files_batch(project_id: str, payload: FileBatchPayload, request: Request):
+    """
+    Content of several files in one round-trip.
+    """
+    if len(payload.paths) > MAX_BATCH_PATHS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_PATHS} paths per batch")
+
+    files = sorted(iter_project_files(project_id, paths=payload.paths), key=lambda f: f["path"])
+    found = {f["path"] for f in files}
+
+    return json_response(request, {
+        "ok": True,
+        "files": files,
+        "missing": [p for p in payload.paths if p not in found]
+    }, etag=make_etag(*payload.paths, *(f"{f['path']}:{f['hash']}" for f in files)))
+
+
+@router.get("/{project_id}/revisions")
+def get_file_revisions(project_id: str, path: str):
+    revisions = list_revisions(project_id, path)
+
+    if not revisions:
+        raise HTTPException(status_code=404, detail="No revisions for this file")
+
+    return {
+        "ok": True,
+        "path": path,
+        "revisions": revisions
     }
 
 
+@router.get("/{project_id}/revisions/{rev}")
+def get_file_revision(project_id: str, rev: int, path: str, request: Request):
+    content = get_revision_content(project_id, path, rev)
+
+    if content is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+
+    return json_response(request, {
+        "ok": True,
+        "path": path,
+        "rev": rev,
+        "content": content
+    }, etag=make_etag(path, rev, content), cache_control="private, max-age=31536000, immutable")
+
+
+@router.get("/{project_id}/diff")
+def get_file_diff(project_id: str, path: str, from_rev: int, to_rev: int, request: Request):
+    """
+    Unified diff of one file between two revisions.
+    """
+    diff = diff_revisions(project_id, path, from_rev, to_rev)
+
+    if diff is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+
+    return json_response(request, {
+        "ok": True,
+        "path": path,
+        "from_rev": from_rev,
+        "to_rev": to_rev,
+        "diff": diff
+    })
+
+
+@router.post("/{project_id}/revisions/compact")
+def compact_file_revisions(project_id: str, path: str = None, keep: int = KEEP_REVISIONS):
+    """
+    Drop revisions older than the last `keep` per file (or for one path).
+    """
+    if keep < 1:
+        raise HTTPException(status_code=400, detail="keep must be at least 1")
+
+    removed = compact_revisions(project_id, path, keep)
+    return {"ok": True, "removed": removed}
+
+
+@router.put("/{project_id}")
+def update_project_file(project_id: str, payload: FilePayload):
+    """
+    Save an edited file. A running preview of the project
+    receives the new content through the files listener.
+    """
+    try:
+        changed = save_file(project_id, payload.path, payload.content)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "ok": True,
+        "path": payload.path,
+        "changed": changed
+    }
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi.responses import StreamingResponse
+from utils.auth_util import get_current_user, require_user, require_project_owner
 from utils.database_models_util import get_user_projects
+from utils.archive_util import (
+    ARCHIVE_FORMATS,
+    cached_archive_path,
+    stream_and_cache
+)
+from utils.response_util import file_range_response
 
-router = APIRouter(prefix="/projects")
+router = APIRouter(prefix="/projects", dependencies=[Depends(get_current_user)])
 
-@router.get("/{user_id}")
+@router.get("/{user_id}", dependencies=[Depends(require_user)])
 def list_projects(user_id: str):
     """
     Return all projects created by a user.
@@ -15,3 +23,34 @@ def list_projects(user_id: str):
         "count": len(projects),
         "projects": projects
     }
+
+
+
+@router.get("/{project_id}/archive", dependencies=[Depends(require_project_owner)])
+def download_project_archive(project_id: str, request: Request, format: str = "zip"):
+    """
+    Download the project as a zip (or tar.gz) built straight from the files
+    collection. Archives are cached by content hash; cached ones support
+    Range requests so interrupted downloads can resume. A Range request on
+    a cold cache gets the whole archive (200, no Accept-Ranges) instead of
+    waiting for it to be built; that download fills the cache.
+    """
+    if format not in ARCHIVE_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'zip' or 'tar.gz'")
+
+    digest, path = cached_archive_path(project_id, format)
+    ext, media_type = ARCHIVE_FORMATS[format]
+    etag = f'"{digest}"'
+    headers = {
+        "Content-Disposition": f'attachment; filename="project-{project_id}.{ext}"',
+        "Cache-Control": "private, no-cache"
+    }
+
+    if path.exists():
+        return file_range_response(request, path, media_type, headers=headers, etag=etag)
+
+    return StreamingResponse(
+        stream_and_cache(project_id, format, path),
+        media_type=media_type,
+        headers={**headers, "ETag": etag}
+    )
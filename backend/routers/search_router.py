@@ -0,0 +1,51 @@
+import re
+from fastapi import APIRouter, HTTPException, Query, Depends
+from utils.auth_util import get_current_user, authorize
+from utils.search_util import search_code, search_messages, SearchTimeout
+
+router = APIRouter(prefix="/search", dependencies=[Depends(get_current_user)])
+
+
+@router.get("")
+def search(
+    q: str = Query(..., min_length=1),
+    user_id: str = None,
+    kind: str = "all",
+    regex: bool = False,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Search the caller's project files (substring or regex) and chat messages (ranked).
+    The user comes from the token; user_id is only read when AUTH_REQUIRED=0.
+    kind: all | code | chats
+    """
+    if kind not in ("all", "code", "chats"):
+        raise HTTPException(status_code=400, detail="kind must be 'all', 'code' or 'chats'")
+
+    if user is not None:
+        if user_id:
+            authorize(user, user_id)
+        user_id = user["user_id"]
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    response = {"ok": True, "q": q}
+
+    if kind in ("all", "code"):
+        try:
+            response["code"] = search_code(user_id, q, regex, page, page_size)
+        except re.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid regex: {e}")
+        except SearchTimeout as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ValueError as e:
+            if kind == "code":
+                raise HTTPException(status_code=400, detail=str(e))
+            response["code"] = None
+
+    if kind in ("all", "chats"):
+        response["chats"] = search_messages(user_id, q, page, page_size)
+
+    return response
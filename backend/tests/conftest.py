@@ -0,0 +1,43 @@
+"""
+Tests run against an in-memory Mongo (mongomock): the collections of
+utils.database_util are swapped before any module under test imports them.
+"""
+import os
+
+import mongomock
+import pytest
+
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("JWT_SECRET", "test-secret-with-enough-bytes-for-hs256")
+os.environ.setdefault("JWT_ALGO", "HS256")
+
+import utils.database_util as database_util
+
+# pymongo >= 4.11 passes sort= to bulk updates; older mongomock rejects it
+_add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+
+def _add_update_compat(self, *args, sort=None, **kwargs):
+    return _add_update(self, *args, **kwargs)
+
+
+mongomock.collection.BulkOperationBuilder.add_update = _add_update_compat
+
+_client = mongomock.MongoClient()
+_db = _client["codexa_test"]
+
+database_util.client = _client
+database_util.db = _db
+for _name, _value in list(vars(database_util).items()):
+    if _name.endswith("_col"):
+        setattr(database_util, _name, _db[_value.name])
+
+
+@pytest.fixture(autouse=True)
+def db():
+    """
+    The test database, emptied after every test.
+    """
+    yield _db
+    for name in _db.list_collection_names():
+        _db.drop_collection(name)
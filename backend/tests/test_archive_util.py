@@ -0,0 +1,55 @@
+import io
+import tarfile
+import zipfile
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+import utils.archive_util as archives
+from utils.database_util import files_col
+from utils.file_utils import content_hash
+
+
+@pytest.fixture
+def project_id():
+    pid = ObjectId()
+    for path, updated in [("frontend/b.ts", datetime(2024, 1, 2, 3, 4, 5)), ("frontend/a.ts", None)]:
+        content = f"// {path}\n"
+        doc = {"project_id": pid, "path": path, "content": content, "hash": content_hash(content)}
+        if updated:
+            doc["updated_at"] = updated
+        files_col.insert_one(doc)
+    return str(pid)
+
+
+def build(project_id, fmt) -> bytes:
+    return b"".join(archives.iter_archive(project_id, fmt))
+
+
+@pytest.mark.parametrize("fmt", ["zip", "tar.gz"])
+def test_rebuilds_are_byte_identical(project_id, fmt, monkeypatch):
+    first = build(project_id, fmt)
+
+    # a different wall clock must not change the bytes
+    monkeypatch.setattr("time.time", lambda: 2_000_000_000)
+    assert build(project_id, fmt) == first
+
+
+def test_entries_are_ordered_and_complete(project_id):
+    with zipfile.ZipFile(io.BytesIO(build(project_id, "zip"))) as zf:
+        assert zf.namelist() == ["frontend/a.ts", "frontend/b.ts"]
+        assert zf.read("frontend/b.ts") == b"// frontend/b.ts\n"
+        assert zf.getinfo("frontend/b.ts").date_time == (2024, 1, 2, 3, 4, 4)   # zip has 2s resolution
+
+    with tarfile.open(fileobj=io.BytesIO(build(project_id, "tar.gz"))) as tf:
+        assert tf.getnames() == ["frontend/a.ts", "frontend/b.ts"]
+        assert tf.extractfile("frontend/a.ts").read() == b"// frontend/a.ts\n"
+
+
+def test_cache_key_follows_content_and_times(project_id):
+    digest, _ = archives.cached_archive_path(project_id, "zip")
+    assert archives.cached_archive_path(project_id, "zip")[0] == digest
+
+    files_col.update_one({"path": "frontend/a.ts"}, {"$set": {"updated_at": datetime(2025, 1, 1)}})
+    assert archives.cached_archive_path(project_id, "zip")[0] != digest
@@ -0,0 +1,95 @@
+import pytest
+from bson import ObjectId
+from fastapi import Depends, FastAPI, Header, Response
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+from utils.auth_util import (
+    PREVIEW_COOKIE,
+    create_token,
+    require_project_owner,
+    require_user,
+    set_preview_cookie
+)
+from utils.database_util import projects_col
+
+
+@pytest.fixture
+def project_id():
+    return str(projects_col.insert_one({"user_id": "alice"}).inserted_id)
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/projects/{user_id}", dependencies=[Depends(require_user)])
+    def list_projects(user_id: str):
+        return {"ok": True}
+
+    @app.post("/preview/full/{project_id}", dependencies=[Depends(require_project_owner)])
+    def preview_full(project_id: str, response: Response, authorization: str = Header(None)):
+        set_preview_cookie(response, project_id, authorization)
+        return {"ok": True}
+
+    @app.get("/preview/{project_id}/{path:path}", dependencies=[Depends(require_project_owner)])
+    def static_file(project_id: str, path: str):
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+def bearer(user_id: str) -> dict:
+    return {"Authorization": f"Bearer {create_token(user_id)}"}
+
+
+def test_user_routes(client):
+    assert client.get("/projects/alice").status_code == 401
+    assert client.get("/projects/alice", headers=bearer("alice")).status_code == 200
+    assert client.get("/projects/alice", headers=bearer("bob")).status_code == 403
+    assert client.get("/projects/alice", headers={"Authorization": "Bearer junk"}).status_code == 401
+
+
+def test_project_routes(client, project_id):
+    assert client.post(f"/preview/full/{project_id}").status_code == 401
+    assert client.post(f"/preview/full/{project_id}", headers=bearer("bob")).status_code == 403
+    assert client.post(f"/preview/full/{ObjectId()}", headers=bearer("alice")).status_code == 404
+    assert client.post("/preview/full/not-an-id", headers=bearer("alice")).status_code == 400
+
+
+def test_preview_cookie_is_scoped_to_the_project(client, project_id):
+    r = client.post(f"/preview/full/{project_id}", headers=bearer("alice"))
+    assert r.status_code == 200
+
+    cookie = r.headers["set-cookie"]
+    assert cookie.startswith(f"{PREVIEW_COOKIE}=")
+    assert f"Path=/preview/{project_id}" in cookie
+    assert "HttpOnly" in cookie
+
+    # the browser now loads the preview without the header
+    assert client.get(f"/preview/{project_id}/index.html").status_code == 200
+    assert TestClient(client.app).get(f"/preview/{project_id}/index.html").status_code == 401
+
+
+def test_preview_cookie_of_another_user(client, project_id):
+    client.cookies.set(PREVIEW_COOKIE, create_token("bob"))
+    assert client.get(f"/preview/{project_id}/index.html").status_code == 403
+
+
+def test_every_project_route_checks_the_owner():
+    from routers import preview, preview_proxy, project_files_router, projects_router
+
+    def calls(dependant):
+        for sub in dependant.dependencies:
+            yield sub.call
+            yield from calls(sub)
+
+    routes = [
+        route
+        for module in (preview, preview_proxy, project_files_router, projects_router)
+        for route in module.router.routes
+        if isinstance(route, APIRoute) and "{project_id}" in route.path
+    ]
+    assert len(routes) > 10
+    unprotected = [route.path for route in routes if require_project_owner not in set(calls(route.dependant))]
+    assert unprotected == []
@@ -0,0 +1,89 @@
+import pytest
+
+import utils.cache_util as cache_util
+from utils.cache_util import TTLCache
+from utils.database_util import runtime_state_col
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    """
+    Two workers' copies of one shared cache.
+    """
+    monkeypatch.setattr(cache_util, "CACHE_MAX_STALENESS", 60)
+    return TTLCache("test_shared"), TTLCache("test_shared")
+
+
+def count_lookups(monkeypatch) -> list:
+    lookups = []
+    find_one = runtime_state_col.find_one
+
+    def counting(*args, **kwargs):
+        lookups.append(args)
+        return find_one(*args, **kwargs)
+
+    monkeypatch.setattr(runtime_state_col, "find_one", counting)
+    return lookups
+
+
+def test_hits_do_not_touch_mongo(workers, monkeypatch):
+    a, _ = workers
+    a.get_or_load("u1", lambda: [1])
+
+    lookups = count_lookups(monkeypatch)
+    for _ in range(50):
+        assert a.get_or_load("u1", lambda: pytest.fail("reloaded")) == [1]
+    assert lookups == []
+
+
+def test_own_writes_are_seen_at_once(workers):
+    a, _ = workers
+    a.get_or_load("u1", lambda: [1])
+    a.invalidate("u1")
+    assert a.get_or_load("u1", lambda: [1, 2]) == [1, 2]
+
+
+def test_other_workers_writes_are_seen_after_the_window(workers, monkeypatch):
+    a, b = workers
+    a.get_or_load("u1", lambda: [1])
+    b.get_or_load("u1", lambda: [1])
+
+    a.invalidate("u1")
+    assert b.get_or_load("u1", lambda: [1, 2]) == [1]       # within the window
+
+    monkeypatch.setattr(cache_util, "CACHE_MAX_STALENESS", 0)
+    assert b.get_or_load("u1", lambda: [1, 2]) == [1, 2]
+
+
+def test_unchanged_version_revalidates_without_loading(workers, monkeypatch):
+    a, _ = workers
+    a.get_or_load("u1", lambda: [1])
+
+    monkeypatch.setattr(cache_util, "CACHE_MAX_STALENESS", 0)
+    lookups = count_lookups(monkeypatch)
+    assert a.get_or_load("u1", lambda: pytest.fail("reloaded")) == [1]
+    assert len(lookups) == 1
+
+
+def test_live_change_stream_skips_revalidation(workers, monkeypatch):
+    a, _ = workers
+    a.get_or_load("u1", lambda: [1])
+
+    monkeypatch.setattr(cache_util, "CACHE_MAX_STALENESS", 0)
+    monkeypatch.setattr(cache_util, "_stream_live", type("Live", (), {"is_set": lambda self: True})())
+    lookups = count_lookups(monkeypatch)
+    assert a.get_or_load("u1", lambda: pytest.fail("reloaded")) == [1]
+    assert lookups == []
+
+
+def test_version_documents_expire(workers):
+    a, _ = workers
+    a.invalidate("u1")
+    doc = runtime_state_col.find_one({"_id": "cache:test_shared:u1"})
+    assert doc["expires_at"] is not None
+
+    # a recreated document never repeats an old version
+    version = doc["version"]
+    runtime_state_col.delete_one({"_id": doc["_id"]})
+    a.invalidate("u1")
+    assert runtime_state_col.find_one({"_id": doc["_id"]})["version"] != version
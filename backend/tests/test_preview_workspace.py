@@ -0,0 +1,81 @@
+import pytest
+from bson import ObjectId
+
+from routers import preview
+from utils.file_utils import is_safe_project_path, save_file
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.setattr(preview, "BASE_PREVIEW_DIR", tmp_path / "previews")
+    preview.WORKSPACE_HASHES.clear()
+    return tmp_path
+
+
+@pytest.mark.parametrize("path", [
+    "frontend/src/App.tsx",
+    "backend/app/main.py",
+    "frontend/.env",
+])
+def test_safe_paths(path):
+    assert is_safe_project_path(path)
+
+
+@pytest.mark.parametrize("path", [
+    "",
+    "frontend/../../../escaped.txt",
+    "frontend/./src/App.tsx",
+    "frontend//App.tsx",
+    "frontend/src/",
+    "/etc/passwd",
+    "C:/Windows/x",
+    "frontend\\..\\x",
+    "frontend/a\x00b",
+])
+def test_unsafe_paths(path):
+    assert not is_safe_project_path(path)
+
+
+def test_workspace_file_stays_in_its_side(workspace):
+    pid = str(ObjectId())
+    root = (workspace / "previews" / pid / "frontend").resolve()
+
+    assert preview._workspace_file(pid, "frontend/src/main.tsx") == root / "src" / "main.tsx"
+    assert preview._workspace_file(pid, "frontend/../../../escaped.txt") is None
+    assert preview._workspace_file(pid, "frontend/../backend/app.py") is None
+    assert preview._workspace_file(pid, "frontend/..") is None
+    assert preview._workspace_file(pid, "other/file.txt") is None
+    assert preview._workspace_file(pid, "frontend") is None
+
+
+def test_write_refuses_escaping_paths(workspace):
+    pid = str(ObjectId())
+
+    assert preview._write_workspace_file(pid, "frontend/../../../escaped.txt", "x") is False
+    assert not any(p.name == "escaped.txt" for p in workspace.rglob("*"))
+
+
+def test_write_refuses_symlinked_escape(workspace):
+    pid = str(ObjectId())
+    side = workspace / "previews" / pid / "frontend"
+    side.mkdir(parents=True)
+    outside = workspace / "outside"
+    outside.mkdir()
+    (side / "link").symlink_to(outside, target_is_directory=True)
+
+    assert preview._write_workspace_file(pid, "frontend/link/x.txt", "x") is False
+    assert not (outside / "x.txt").exists()
+
+
+def test_write_skips_unchanged_content(workspace):
+    pid = str(ObjectId())
+
+    assert preview._write_workspace_file(pid, "frontend/index.html", "<html/>") is True
+    assert preview._write_workspace_file(pid, "frontend/index.html", "<html/>") is False
+    assert preview._write_workspace_file(pid, "frontend/index.html", "<html></html>") is True
+    assert (workspace / "previews" / pid / "frontend" / "index.html").read_text() == "<html></html>"
+
+
+def test_save_file_rejects_unsafe_paths():
+    with pytest.raises(ValueError):
+        save_file(str(ObjectId()), "frontend/../../x", "x")
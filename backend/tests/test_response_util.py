@@ -0,0 +1,102 @@
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from utils.response_util import file_range_response, json_response, make_etag
+
+BODY = bytes(range(256)) * 40       # 10240 bytes
+ETAG = make_etag("archive", 1)
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "archive.zip"
+    path.write_bytes(BODY)
+    app = FastAPI()
+
+    @app.get("/file")
+    def get_file(request: Request):
+        return file_range_response(request, path, "application/zip", etag=ETAG)
+
+    @app.get("/json")
+    def get_json(request: Request, size: int = 10):
+        return json_response(request, {"items": ["x" * size]}, etag=ETAG)
+
+    return TestClient(app)
+
+
+def test_full_download(client):
+    r = client.get("/file")
+    assert r.status_code == 200
+    assert r.content == BODY
+    assert r.headers["accept-ranges"] == "bytes"
+    assert r.headers["etag"] == ETAG
+    assert r.headers["content-length"] == str(len(BODY))
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-99", 0, 99),
+    ("bytes=100-", 100, len(BODY) - 1),
+    ("bytes=-50", len(BODY) - 50, len(BODY) - 1),
+    ("bytes=10000-99999", 10000, len(BODY) - 1),
+])
+def test_single_range(client, header, start, end):
+    r = client.get("/file", headers={"Range": header})
+    assert r.status_code == 206
+    assert r.content == BODY[start:end + 1]
+    assert r.headers["content-range"] == f"bytes {start}-{end}/{len(BODY)}"
+    assert r.headers["content-length"] == str(end - start + 1)
+
+
+def test_unsatisfiable_range(client):
+    r = client.get("/file", headers={"Range": f"bytes={len(BODY)}-"})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{len(BODY)}"
+
+
+@pytest.mark.parametrize("header", ["bytes=0-1,5-9", "items=0-1", "bytes=abc"])
+def test_unsupported_ranges_get_everything(client, header):
+    r = client.get("/file", headers={"Range": header})
+    assert r.status_code == 200
+    assert r.content == BODY
+
+
+def test_if_range(client):
+    resumed = client.get("/file", headers={"Range": "bytes=100-", "If-Range": ETAG})
+    assert resumed.status_code == 206
+
+    changed = client.get("/file", headers={"Range": "bytes=100-", "If-Range": make_etag("other")})
+    assert changed.status_code == 200
+    assert changed.content == BODY
+
+
+@pytest.mark.parametrize("header", [ETAG, f"W/{ETAG}", f'"nope", {ETAG}', "*"])
+def test_if_none_match(client, header):
+    assert client.get("/file", headers={"If-None-Match": header}).status_code == 304
+    assert client.get("/json", headers={"If-None-Match": header}).status_code == 304
+
+
+def test_if_none_match_other_etag(client):
+    assert client.get("/json", headers={"If-None-Match": make_etag("other")}).status_code == 200
+
+
+def test_json_compression(client):
+    small = client.get("/json", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+    # TestClient decodes transparently: read the raw body
+    with client.stream("GET", "/json?size=5000", headers={"Accept-Encoding": "gzip"}) as r:
+        assert r.headers["content-encoding"] == "gzip"
+        raw = b"".join(r.iter_raw())
+    assert json.loads(gzip.decompress(raw)) == {"items": ["x" * 5000]}
+
+    plain = client.get("/json?size=5000", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+
+def test_etags_are_stable_and_distinct():
+    assert make_etag("a", "b") == make_etag("a", "b")
+    assert make_etag("a", "b") != make_etag("ab")
@@ -0,0 +1,136 @@
+import threading
+
+import pytest
+from bson import ObjectId
+
+import utils.revision_util as revisions
+from utils.database_util import file_revisions_col
+
+
+@pytest.fixture
+def project_id():
+    file_revisions_col.create_index([("project_id", 1), ("path", 1), ("rev", 1)], unique=True)
+    return str(ObjectId())
+
+
+def versions(n: int) -> list[str]:
+    lines = [f"line {i}\n" for i in range(30)]
+    out = []
+    for v in range(n):
+        lines[v % 30] = f"changed in v{v}\n"
+        if v % 4 == 0:
+            lines.insert(v % 7, f"inserted in v{v}\n")
+        if v % 5 == 0 and len(lines) > 10:
+            del lines[-1]
+        out.append("".join(lines))
+    return out
+
+
+def test_delta_round_trip():
+    old, new = versions(2)
+    assert revisions.apply_delta(old, revisions.make_delta(old, new)) == new
+    assert revisions.apply_delta("", revisions.make_delta("", new)) == new
+    assert revisions.apply_delta(old, revisions.make_delta(old, "")) == ""
+
+
+def test_every_revision_reads_back(project_id, monkeypatch):
+    monkeypatch.setattr(revisions, "SNAPSHOT_INTERVAL", 4)
+    contents = versions(10)
+
+    for content in contents:
+        revisions.record_revision(project_id, "a.py", content)
+
+    listed = revisions.list_revisions(project_id, "a.py")
+    assert [r["rev"] for r in listed] == list(range(1, 11))
+    # a full snapshot every SNAPSHOT_INTERVAL revisions bounds the delta chain
+    assert [r["rev"] for r in listed if r["kind"] == "full"] == [1, 5, 9]
+
+    for rev, content in enumerate(contents, start=1):
+        assert revisions.get_revision_content(project_id, "a.py", rev) == content
+    assert revisions.get_revision_content(project_id, "a.py", 11) is None
+
+
+def test_unchanged_content_is_not_recorded(project_id):
+    assert revisions.record_revision(project_id, "a.py", "x\n") == 1
+    assert revisions.record_revision(project_id, "a.py", "x\n") == 1
+    assert revisions.record_revision(project_id, "a.py", "y\n") == 2
+
+
+def test_diff(project_id):
+    revisions.record_revision(project_id, "a.py", "a\nb\n")
+    revisions.record_revision(project_id, "a.py", "a\nc\n")
+
+    diff = revisions.diff_revisions(project_id, "a.py", 1, 2)
+    assert "-b\n" in diff and "+c\n" in diff
+    assert revisions.diff_revisions(project_id, "a.py", 1, 3) is None
+
+
+def test_compaction_keeps_the_latest_readable(project_id, monkeypatch):
+    monkeypatch.setattr(revisions, "SNAPSHOT_INTERVAL", 20)
+    contents = versions(12)
+    for content in contents:
+        revisions.record_revision(project_id, "a.py", content)
+
+    assert revisions.compact_revisions(project_id, keep=5) == 7
+
+    listed = revisions.list_revisions(project_id, "a.py")
+    assert [r["rev"] for r in listed] == [8, 9, 10, 11, 12]
+    assert listed[0]["kind"] == "full"
+    for rev in range(8, 13):
+        assert revisions.get_revision_content(project_id, "a.py", rev) == contents[rev - 1]
+
+    # appending continues the chain after compaction
+    revisions.record_revision(project_id, "a.py", "new\n")
+    assert revisions.get_revision_content(project_id, "a.py", 13) == "new\n"
+
+
+def test_concurrent_saves_get_distinct_revisions(project_id, monkeypatch):
+    revisions.record_revision(project_id, "a.py", "base\n")
+
+    # every saver reads the same latest revision before any of them inserts
+    barrier = threading.Barrier(4)
+    latest = revisions._latest
+
+    def racing_latest(*args):
+        doc = latest(*args)
+        try:
+            barrier.wait(timeout=1)
+        except threading.BrokenBarrierError:
+            pass
+        return doc
+
+    monkeypatch.setattr(revisions, "_latest", racing_latest)
+
+    contents = [f"base\nsaver {i}\n" for i in range(4)]
+    threads = [threading.Thread(target=revisions.record_revision, args=(project_id, "a.py", c)) for c in contents]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    revs = [r["rev"] for r in revisions.list_revisions(project_id, "a.py")]
+    assert revs == [1, 2, 3, 4, 5]
+    stored = {revisions.get_revision_content(project_id, "a.py", rev) for rev in revs[1:]}
+    assert stored == set(contents)
+
+
+def test_record_revisions_reports_failures(project_id, monkeypatch):
+    monkeypatch.setattr(revisions, "REVISION_SAVE_RETRIES", 0)
+
+    with pytest.raises(revisions.RevisionError):
+        revisions.record_revisions(project_id, {"a.py": "x", "b.py": "y"})
+
+
+def test_failed_revision_does_not_fail_the_save(project_id, monkeypatch):
+    import utils.file_utils as file_utils
+
+    def broken(*args):
+        raise revisions.RevisionError("history unavailable")
+
+    notified = []
+    monkeypatch.setattr(file_utils, "record_revisions", broken)
+    monkeypatch.setattr(file_utils, "FILES_LISTENERS", [lambda pid, paths: notified.append(paths)])
+
+    assert file_utils.save_file(project_id, "frontend/a.ts", "export {}\n") is True
+    assert notified == [["frontend/a.ts"]]
+    assert file_utils.get_project_file(project_id, "frontend/a.ts") is not None
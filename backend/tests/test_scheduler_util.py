@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+
+from utils.scheduler_util import BULK, INTERACTIVE, FairScheduler
+
+
+def queue_up(scheduler, requests, granted):
+    """
+    Start one waiting acquire per (user, lane) in order, each queued
+    before the next starts. Granted tickets are appended to granted.
+    """
+    threads = []
+    for user, lane in requests:
+        before = scheduler.stats()["lanes"][lane]["queued"]
+
+        def run(user=user, lane=lane):
+            granted.append((user, scheduler.acquire(lane, user=user, timeout=5)))
+
+        t = threading.Thread(target=run, daemon=True)
+        t.start()
+        threads.append(t)
+
+        deadline = time.monotonic() + 2
+        while scheduler.stats()["lanes"][lane]["queued"] == before:
+            assert time.monotonic() < deadline, "acquire did not queue"
+            time.sleep(0.001)
+    return threads
+
+
+def drain(scheduler, first_ticket, granted, count):
+    """
+    Release the held slot, then each granted ticket in grant order;
+    returns the order in which users were served.
+    """
+    scheduler.release(first_ticket)
+    order = []
+    for _ in range(count):
+        deadline = time.monotonic() + 2
+        while len(granted) <= len(order):
+            assert time.monotonic() < deadline, "nothing was granted"
+            time.sleep(0.001)
+        user, ticket = granted[len(order)]
+        order.append(user)
+        scheduler.release(ticket)
+    return order
+
+
+def test_a_burst_does_not_run_ahead_of_other_users():
+    scheduler = FairScheduler(capacity=1, interactive_reserved=0)
+    held = scheduler.acquire(INTERACTIVE, user="holder")
+
+    granted = []
+    queue_up(scheduler, [("alice", INTERACTIVE)] * 4 + [("bob", INTERACTIVE), ("carol", INTERACTIVE)], granted)
+
+    order = drain(scheduler, held, granted, 6)
+    # bob and carol arrived after alice's whole burst, but are served right after her first call
+    assert order[:3] == ["alice", "bob", "carol"]
+    assert order.count("alice") == 4
+
+
+def test_weights_share_the_lane():
+    scheduler = FairScheduler(capacity=1, interactive_reserved=0)
+    scheduler.set_user_weight("paid", 2)
+    held = scheduler.acquire(INTERACTIVE, user="holder")
+
+    granted = []
+    queue_up(scheduler, [("paid", INTERACTIVE)] * 4 + [("free", INTERACTIVE)] * 2, granted)
+
+    order = drain(scheduler, held, granted, 6)
+    assert order[:3].count("paid") == 2
+
+
+def test_interactive_goes_before_bulk():
+    scheduler = FairScheduler(capacity=2, interactive_reserved=1)
+    held = [scheduler.acquire(INTERACTIVE, user="holder"), scheduler.acquire(INTERACTIVE, user="holder2")]
+
+    granted = []
+    queue_up(scheduler, [("alice", BULK), ("bob", INTERACTIVE)], granted)
+
+    scheduler.release(held[0])
+    deadline = time.monotonic() + 2
+    while not granted:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    assert granted[0][0] == "bob"
+
+    scheduler.release(held[1])
+    scheduler.release(granted[0][1])
+    while len(granted) < 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    scheduler.release(granted[1][1])
+
+
+def test_bulk_never_takes_the_reserved_slots():
+    scheduler = FairScheduler(capacity=3, interactive_reserved=1)
+    bulk = [scheduler.acquire(BULK, user=f"user{i}") for i in range(2)]
+
+    assert scheduler.try_acquire(BULK, user="user9") is None
+    interactive = scheduler.try_acquire(INTERACTIVE, user="user9")
+    assert interactive is not None
+
+    for ticket in bulk + [interactive]:
+        scheduler.release(ticket)
+    assert scheduler.stats()["running"] == 0
+
+
+def test_per_user_cap():
+    scheduler = FairScheduler(capacity=4, interactive_reserved=0)
+    first = scheduler.acquire(BULK, user="alice")     # LLM_USER_MAX_BULK is 1
+
+    with pytest.raises(TimeoutError):
+        scheduler.acquire(BULK, user="alice", timeout=0.1)
+    assert scheduler.stats()["lanes"][BULK]["queued"] == 0
+
+    other = scheduler.acquire(BULK, user="bob", timeout=1)
+    scheduler.release(first)
+    scheduler.release(other)
+
+
+def test_try_acquire_never_jumps_the_queue():
+    scheduler = FairScheduler(capacity=1, interactive_reserved=0)
+    held = scheduler.acquire(INTERACTIVE, user="holder")
+
+    granted = []
+    queue_up(scheduler, [("alice", INTERACTIVE)], granted)
+    assert not scheduler.has_room(INTERACTIVE)
+
+    scheduler.release(held)
+    deadline = time.monotonic() + 2
+    while not granted:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+    assert scheduler.try_acquire(INTERACTIVE, user="hedge") is None
+    scheduler.release(granted[0][1])
+    assert scheduler.has_room(INTERACTIVE)
@@ -0,0 +1,43 @@
+import threading
+import time
+
+import pytest
+
+import utils.search_util as search
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool():
+    yield
+    search.shutdown_search_pool()
+
+
+def test_literal_and_regex_matching():
+    docs = [("a", "first line\nfoo = 1\nFOO = 2\n"), ("b", "nothing here\n")]
+    assert search._match_files("foo", False, docs) == [
+        ("a", [{"line": 2, "text": "foo = 1"}, {"line": 3, "text": "FOO = 2"}])
+    ]
+    assert search._match_files(r"fo+\s=\s2", True, docs) == [("a", [{"line": 3, "text": "FOO = 2"}])]
+
+
+def test_catastrophic_regex_times_out(monkeypatch):
+    start = time.monotonic()
+    with pytest.raises(search.SearchTimeout):
+        search._match_regex("aaa(a+)+$", [("k", "a" * 40 + "b")], time.monotonic() + 1)
+    assert time.monotonic() - start < 5
+
+    # the pool is usable again afterwards
+    assert search._match_regex("ok", [("k", "ok")], time.monotonic() + 30) == [("k", [{"line": 1, "text": "ok"}])]
+
+
+def test_search_survives_another_requests_pool_kill():
+    search._match_regex("warm", [("k", "warm")], time.monotonic() + 30)
+    pool = search._get_regex_pool()
+
+    # another request's timeout kills the pool while ours (~2s) is running in it
+    threading.Timer(0.5, search._kill_regex_pool, args=(pool,)).start()
+    docs = [("k", "x" * 24), ("needle", "needle")]
+
+    result = search._match_regex(r"(x+x+)+y|needle", docs, time.monotonic() + 30)
+    assert result == [("needle", [{"line": 1, "text": "needle"}])]
+    assert search._get_regex_pool() is not pool
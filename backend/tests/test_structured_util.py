@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+import utils.structured_util as structured
+from models.schemas import Intent, ProjectStructure, Title
+
+
+class FakeResponse:
+    def __init__(self, text, finish_reason="STOP"):
+        self.text = text
+        self.candidates = [type("Candidate", (), {"finish_reason": finish_reason})()]
+
+
+class FakeModel:
+    """
+    First call answers with `first`; repair calls go through `repair(prompt)`.
+    """
+
+    def __init__(self, first, repair=None, finish_reason="STOP"):
+        self.first = first
+        self.repair = repair
+        self.finish_reason = finish_reason
+        self.calls = []
+
+    def __call__(self, model, contents, config, lane, cost):
+        self.calls.append({"contents": contents, "max_output_tokens": getattr(config, "max_output_tokens", None)})
+        if len(self.calls) == 1:
+            return FakeResponse(self.first, self.finish_reason)
+        return FakeResponse(self.repair(contents))
+
+
+def repaired_object(prompt: str) -> dict:
+    return json.loads(prompt.split("Object:\n", 1)[1])
+
+
+def project(big_content: str, bad_type: str = "fil") -> dict:
+    return {"structure": [{
+        "type": "folder",
+        "name": "src",
+        "children": [
+            {"type": "file", "name": "big.py", "content": big_content},
+            {"type": bad_type, "name": "small.py", "content": "print(1)"},
+        ]
+    }]}
+
+
+def test_valid_output_needs_no_repair(monkeypatch):
+    fake = FakeModel('```json\n{"type": "project",}\n```')
+    monkeypatch.setattr(structured, "generate", fake)
+
+    assert structured.generate_structured("m", "p", Intent).type == "project"
+    assert len(fake.calls) == 1
+
+
+def test_only_the_failing_object_is_repaired(monkeypatch):
+    big = "x = 1\n" * 50000
+
+    def repair(prompt):
+        node = repaired_object(prompt)
+        node["type"] = "file"
+        return json.dumps(node)
+
+    fake = FakeModel(json.dumps(project(big)), repair)
+    monkeypatch.setattr(structured, "generate", fake)
+
+    result = structured.generate_structured("m", "p", ProjectStructure, send_schema=False, max_output_tokens=100000)
+
+    assert result.structure[0].children[1].type == "file"
+    assert result.structure[0].children[0].content == big
+    assert len(fake.calls) == 2
+
+    repair_call = fake.calls[1]
+    assert big not in repair_call["contents"]
+    assert "small.py" in repair_call["contents"]
+    assert repair_call["max_output_tokens"] <= structured.STRUCTURED_REPAIR_MAX_TOKENS
+
+
+def test_too_large_fragment_is_not_sent(monkeypatch):
+    monkeypatch.setattr(structured, "STRUCTURED_REPAIR_MAX_CHARS", 1000)
+    fake = FakeModel(json.dumps({"structure": [{"type": "file", "name": "", "content": "y" * 5000}]}))
+    monkeypatch.setattr(structured, "generate", fake)
+
+    with pytest.raises(structured.StructuredOutputError, match="too large"):
+        structured.generate_structured("m", "p", ProjectStructure, send_schema=False)
+    assert len(fake.calls) == 1
+
+
+def test_unparseable_output_is_repaired_whole_only_when_small(monkeypatch):
+    fake = FakeModel('{"type": "project"', lambda prompt: '{"type": "conversation"}')
+    monkeypatch.setattr(structured, "generate", fake)
+    assert structured.generate_structured("m", "p", Intent).type == "conversation"
+
+    monkeypatch.setattr(structured, "STRUCTURED_REPAIR_MAX_CHARS", 10)
+    fake = FakeModel('{"type": "project"', lambda prompt: '{"type": "conversation"}')
+    monkeypatch.setattr(structured, "generate", fake)
+    with pytest.raises(structured.StructuredOutputError, match="too large"):
+        structured.generate_structured("m", "p", Intent)
+
+
+def test_truncated_output_is_not_repaired(monkeypatch):
+    fake = FakeModel('{"structure": [', finish_reason="MAX_TOKENS")
+    monkeypatch.setattr(structured, "generate", fake)
+
+    with pytest.raises(structured.StructuredOutputError, match="truncated"):
+        structured.generate_structured("m", "p", ProjectStructure, send_schema=False)
+    assert len(fake.calls) == 1
+
+
+def test_long_titles_validate():
+    title = structured.parse_structured(json.dumps({"title": "t" * 500}), Title)
+    assert len(title.title) == 500
@@ -0,0 +1,132 @@
+import json
+
+import pytest
+
+import utils.validation_util as validation
+from utils.validation_util import validate_files
+
+
+def codes(report, path=None) -> list:
+    return sorted(d["code"] for d in report["diagnostics"] if path is None or d["path"] == path)
+
+
+def frontend(**extra) -> dict:
+    files = {
+        "frontend/package.json": json.dumps({
+            "dependencies": {"react": "18.2.0", "react-dom": "18.2.0"},
+            "devDependencies": {"vite": "5.0.0"}
+        }),
+        "frontend/index.html": '<div id="root"></div><script type="module" src="/src/main.tsx"></script>',
+        "frontend/src/main.tsx": 'import React from "react";\nimport App from "./App";\nimport "./index.css";\n',
+        "frontend/src/App.tsx": 'import { Button } from "@/components/Button";\nexport default function App() {}\n',
+        "frontend/src/components/Button.tsx": "export const Button = () => null;\n",
+        "frontend/src/index.css": "body {}\n",
+    }
+    files.update(extra)
+    return files
+
+
+def backend(**extra) -> dict:
+    files = {
+        "backend/requirements.txt": "fastapi==0.110.0\npython-dotenv==1.0.0\n",
+        "backend/app/__init__.py": "",
+        "backend/app/main.py": "import os\nfrom fastapi import FastAPI\nfrom dotenv import load_dotenv\nfrom app.routes import router\n",
+        "backend/app/routes.py": "from .models import Item\nrouter = None\n",
+        "backend/app/models.py": "class Item: pass\n",
+    }
+    files.update(extra)
+    return files
+
+
+def test_valid_project_passes():
+    report = validate_files({**frontend(), **backend()})
+    assert report["ok"], report["diagnostics"]
+    assert report["warnings"] == 0
+
+
+def test_unresolved_js_imports():
+    report = validate_files(frontend(**{
+        "frontend/src/App.tsx": 'import Missing from "./Missing";\nimport x from "@/lib/x";\n'
+                                '// import Commented from "./Commented";\nconst y = require("./y");\n',
+    }))
+    assert codes(report, "frontend/src/App.tsx") == ["js-import", "js-import", "js-import"]
+    assert {d["line"] for d in report["diagnostics"]} == {1, 2, 4}
+
+
+def test_js_packages_come_from_the_nearest_package_json():
+    report = validate_files(frontend(**{
+        "frontend/src/api.ts": 'import axios from "axios";\nimport { readFile } from "fs";\nimport "node:path";\n',
+    }))
+    assert codes(report, "frontend/src/api.ts") == ["js-package"]
+
+
+def test_html_entry_must_exist():
+    files = frontend()
+    del files["frontend/src/main.tsx"]
+    report = validate_files(files, required={"frontend/src/main.tsx"})
+    assert "html-entry" in codes(report, "frontend/index.html")
+    assert codes(report, "frontend/src/main.tsx") == ["missing-file"]
+
+
+def test_package_json_versions():
+    report = validate_files(frontend(**{
+        "frontend/package.json": json.dumps({"dependencies": {"react": "latest", "react-dom": "^18.2.0"}}),
+    }))
+    diagnostics = {d["message"].split(":")[0]: d["severity"] for d in report["diagnostics"]
+                   if d["path"] == "frontend/package.json"}
+    assert diagnostics == {"react": "error", "react-dom": "warning"}
+
+
+def test_json_syntax_but_not_tsconfig():
+    report = validate_files({
+        "frontend/data.json": '{"a": 1,}',
+        "frontend/tsconfig.json": '{\n  // comments are fine\n  "compilerOptions": {},\n}',
+    })
+    assert codes(report) == ["json-syntax"]
+
+
+def test_python_syntax_error_has_a_line():
+    report = validate_files(backend(**{"backend/app/routes.py": "def broken(:\n    pass\n"}))
+    [d] = [d for d in report["diagnostics"] if d["path"] == "backend/app/routes.py"]
+    assert d["code"] == "python-syntax" and d["line"] == 1
+
+
+def test_python_local_imports():
+    report = validate_files(backend(**{
+        "backend/app/routes.py": "from .models import Item\nfrom .missing import thing\nfrom app.services import run\n",
+    }))
+    assert codes(report, "backend/app/routes.py") == ["python-import", "python-import"]
+
+
+def test_python_requirements_are_warnings():
+    report = validate_files(backend(**{"backend/app/db.py": "import json\nimport pymongo\nimport yaml\n"}))
+    assert report["ok"]
+    messages = [d["message"] for d in report["diagnostics"] if d["path"] == "backend/app/db.py"]
+    assert len(messages) == 2
+    assert any("'yaml'" in m for m in messages) and any("'pymongo'" in m for m in messages)
+
+
+def test_results_are_cached_per_content_and_tree():
+    files = {**frontend(), **backend()}
+    validate_files(files)
+
+    again = validate_files(files)
+    assert again["checked"] == 0
+
+    edited = {**files, "frontend/src/App.tsx": 'import Missing from "./Missing";\n'}
+    report = validate_files(edited)
+    # the path set is unchanged: only the edited file is checked again
+    assert report["checked"] == 1
+    assert not report["ok"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parallel_and_inline_agree(monkeypatch, workers):
+    monkeypatch.setattr(validation, "VALIDATION_WORKERS", workers)
+    monkeypatch.setattr(validation, "VALIDATION_PARALLEL_MIN", 2)
+    validation._cache.clear()
+
+    files = frontend(**{f"frontend/src/broken{i}.ts": f'import x from "./nothing{i}";\n' for i in range(6)})
+    report = validate_files(files)
+    assert report["errors"] == 6
+    validation.shutdown_validation_pool()
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+
+import pytest
+
+import utils.write_behind_util as write_behind
+from utils.write_behind_util import WriteBehindBuffer
+
+
+@pytest.fixture(autouse=True)
+def spill_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_SPILL_DIR", str(tmp_path))
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_RETRIES", 1)
+    return tmp_path
+
+
+class SlowWriter:
+    """
+    Records written docs; each write blocks until released (or fails).
+    """
+
+    def __init__(self):
+        self.written = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.fail = False
+
+    def __call__(self, batch):
+        self.started.set()
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("database down")
+        self.written.extend(doc for _, doc in batch)
+
+
+def test_barrier_waits_for_a_batch_in_flight():
+    writer = SlowWriter()
+    buffer = WriteBehindBuffer(writer, "barrier", interval=0.01)
+    try:
+        buffer.add("chat", 1)
+        assert writer.started.wait(2)        # the background flush took the batch
+
+        assert buffer.pending("chat") == 1   # ...but it is not written yet
+        assert buffer.pending("other") == 0
+
+        done = threading.Event()
+        threading.Thread(target=lambda: (buffer.flush("chat"), done.set())).start()
+        assert not done.wait(0.2)
+
+        writer.release.set()
+        assert done.wait(2)
+        assert writer.written == [1]
+    finally:
+        writer.release.set()
+        buffer.close()
+
+
+def test_direct_write_after_barrier_keeps_order():
+    writer = SlowWriter()
+    buffer = WriteBehindBuffer(writer, "order", interval=0.01)
+    try:
+        buffer.add("chat", "deferred")
+        assert writer.started.wait(2)
+        threading.Timer(0.1, writer.release.set).start()
+
+        # what save_message does for a non-deferred message
+        buffer.flush("chat")
+        writer.written.append("direct")
+
+        assert writer.written == ["deferred", "direct"]
+    finally:
+        writer.release.set()
+        buffer.close()
+
+
+def test_add_after_close_writes_after_the_batch_in_flight():
+    writer = SlowWriter()
+    buffer = WriteBehindBuffer(writer, "closed", interval=0.01)
+    buffer.add("chat", 1)
+    assert writer.started.wait(2)
+
+    closer = threading.Thread(target=buffer.close)
+    closer.start()
+    late = threading.Thread(target=buffer.add, args=("chat", 2))
+    late.start()
+
+    time.sleep(0.1)
+    writer.release.set()
+    closer.join(2)
+    late.join(2)
+    assert writer.written == [1, 2]
+
+
+def test_failed_writes_are_spilled_and_replayed(spill_dir):
+    writer = SlowWriter()
+    writer.release.set()
+    writer.fail = True
+    buffer = WriteBehindBuffer(writer, "spill", interval=60)
+    try:
+        buffer.add("chat", {"n": 1})
+        buffer.add("chat", {"n": 2})
+        buffer.flush()
+
+        assert os.path.exists(buffer.spill_path)
+        assert writer.written == []
+
+        writer.fail = False
+        buffer.add("chat", {"n": 3})
+        buffer.flush()
+
+        # spilled writes go first, then the spill file is gone
+        assert writer.written == [{"n": 1}, {"n": 2}, {"n": 3}]
+        assert os.listdir(spill_dir) == []
+    finally:
+        buffer.close()
+
+
+def test_failed_replay_is_kept(spill_dir):
+    writer = SlowWriter()
+    writer.release.set()
+    writer.fail = True
+    buffer = WriteBehindBuffer(writer, "kept", interval=60)
+    try:
+        buffer.add("chat", {"n": 1})
+        buffer.flush()
+        buffer.flush()      # replay fails too: spilled again
+
+        assert os.listdir(spill_dir) == ["kept.jsonl"]
+
+        writer.fail = False
+        buffer.flush()
+        assert writer.written == [{"n": 1}]
+    finally:
+        buffer.close()
@@ -1,6 +1,12 @@
+import contextvars
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from google import genai
 from dotenv import load_dotenv
+from utils.scheduler_util import scheduler, INTERACTIVE, BULK
+from utils.hedging_util import latencies, hedge_budget, FALLBACK_MODELS
 
 load_dotenv()
 
@@ -12,3 +18,186 @@ if not API_KEY:
 gemini = genai.Client(api_key=API_KEY)
 
 print("✅ Gemini client initialized successfully")
+
+LLM_HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", 32))
+_hedge_executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+HEDGE_QUEUE_POLL = 0.1          # seconds between checks while the primary waits for a slot
+
+TRANSIENT_ERRORS = ("503", "UNAVAILABLE", "429", "RESOURCE_EXHAUSTED", "500", "INTERNAL", "DEADLINE", "timed out")
+
+
+def _is_transient(error: Exception) -> bool:
+    message = str(error)
+    return any(marker in message for marker in TRANSIENT_ERRORS)
+
+
+def _has_text(response) -> bool:
+    return bool((getattr(response, "text", None) or "").strip())
+
+
+class _Skipped(Exception):
+    """
+    A hedge that found no spare slot, or whose call was already decided.
+    """
+
+
+def _request(model: str, contents, config):
+    start = time.monotonic()
+    response = gemini.models.generate_content(
+        model=model,
+        contents=contents,
+        config=config
+    )
+    latencies.record(model, time.monotonic() - start)
+    return response
+
+
+def _call(model: str, contents, config, lane: str, cost: float, started: threading.Event = None, cancelled: threading.Event = None):
+    """
+    started is set once the scheduler grants the slot; a call that is
+    cancelled while it queued gives the slot back without calling the model.
+    """
+    with scheduler.slot(lane, cost):
+        if started is not None:
+            started.set()
+        if cancelled is not None and cancelled.is_set():
+            raise _Skipped("cancelled")
+        return _request(model, contents, config)
+
+
+def _hedge_call(model: str, contents, config, lane: str, cost: float, cancelled: threading.Event):
+    """
+    A duplicate only runs on a slot that is free right now: it never waits
+    in the queue (behind its own primary, under the per-user cap).
+    """
+    ticket = scheduler.try_acquire(lane, cost)
+    if ticket is None:
+        raise _Skipped("no spare slot")
+    try:
+        if cancelled.is_set():
+            raise _Skipped("cancelled")
+        return _request(model, contents, config)
+    finally:
+        scheduler.release(ticket)
+
+
+def _hedged_call(model: str, contents, config, lane: str, cost: float, validate):
+    """
+    Primary call; if it has not answered within the model's latency
+    percentile of getting its slot (queue wait does not count), one
+    duplicate is fired on spare capacity, and if it fails transiently (or
+    returns nothing usable) the alternate model is tried. The first valid
+    response wins. Extra calls that have not reached the model yet drop out;
+    ones that already started finish in the background and are dropped.
+    """
+    hedge_budget.on_primary()
+    started = threading.Event()
+    cancelled = threading.Event()
+
+    def submit(fn, *args):
+        ctx = contextvars.copy_context()    # keep the user for the scheduler
+        return _hedge_executor.submit(ctx.run, fn, *args)
+
+    primary = submit(_call, model, contents, config, lane, cost, started, cancelled)
+    pending = {primary}
+    hedge_delay = latencies.hedge_delay(model)
+    hedge_at = None
+    extra_sent = False
+    last_error = None
+    invalid = False
+
+    try:
+        while pending:
+            if extra_sent:
+                timeout = None
+            elif hedge_at is None:
+                # Still queued for a slot: the hedge clock has not started
+                timeout = HEDGE_QUEUE_POLL
+                if started.is_set():
+                    hedge_at = time.monotonic() + hedge_delay
+                    timeout = hedge_delay
+            else:
+                timeout = max(hedge_at - time.monotonic(), 0)
+
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for f in done:
+                try:
+                    response = f.result()
+                    if validate(response):
+                        for other in pending:
+                            other.cancel()
+                        if f is not primary:
+                            hedge_budget.on_hedge_win()
+                        return response
+                    invalid = True
+                    last_error = RuntimeError("Empty response from model")
+                except _Skipped:
+                    continue
+                except Exception as e:
+                    last_error = e
+
+            if extra_sent or (not done and hedge_at is None):
+                continue
+
+            if not done:
+                if hedge_at > time.monotonic():
+                    continue
+                kind, target = "hedge", model                      # slow: duplicate
+            elif invalid or _is_transient(last_error):
+                kind, target = "failover", FALLBACK_MODELS.get(model, model)
+            else:
+                break                                              # e.g. a bad request: do not repeat it
+
+            extra_sent = True
+            if kind == "hedge" and not scheduler.has_room(lane):
+                continue                                           # would only queue: do not hedge
+            if hedge_budget.try_spend(kind):
+                print(f"⚡ LLM {kind}: {model} -> {target}")
+                if kind == "hedge":
+                    pending.add(submit(_hedge_call, target, contents, config, lane, cost, cancelled))
+                else:
+                    pending.add(submit(_call, target, contents, config, lane, cost, None, cancelled))
+    finally:
+        # Losers still queued or not yet running give up instead of calling the model
+        cancelled.set()
+
+    raise last_error or RuntimeError("LLM call failed")
+
+
+def generate(model: str, contents, config=None, lane: str = INTERACTIVE, cost: float = 1.0, hedge: bool = None, validate=_has_text):
+    """
+    Every Gemini call goes through here so the scheduler can order it:
+    lane "interactive" for chat / classification, "bulk" for generation.
+    cost is the rough relative duration, used for fair sharing.
+    hedge defaults to on for interactive calls (see _hedged_call).
+    """
+    if hedge is None:
+        hedge = lane == INTERACTIVE
+
+    if hedge:
+        return _hedged_call(model, contents, config, lane, cost, validate)
+    return _call(model, contents, config, lane, cost)
+
+
+def generate_stream(model: str, contents, config=None, lane: str = INTERACTIVE, cost: float = 1.0):
+    """
+    Yield text deltas as they arrive. The scheduler slot is held until
+    the stream ends (or the consumer stops iterating).
+    """
+    with scheduler.slot(lane, cost):
+        start = time.monotonic()
+        first = True
+        for chunk in gemini.models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=config
+        ):
+            text = getattr(chunk, "text", None)
+            if not text:
+                continue
+            if first:
+                # time to first token is what the user waits for
+                latencies.record(f"{model}:ttft", time.monotonic() - start)
+                first = False
+            yield text
@@ -0,0 +1,136 @@
+import gzip
+import io
+import os
+import tarfile
+import uuid
+import zipfile
+from pathlib import Path
+from utils.file_utils import iter_project_files, project_content_hash
+
+
+ARCHIVE_CACHE_DIR = Path(os.getenv("ARCHIVE_CACHE_DIR", "/tmp/codexa/_archives"))
+ARCHIVE_CACHE_MAX = int(os.getenv("ARCHIVE_CACHE_MAX", 200))   # cached archives kept on disk
+
+# Archives are byte-identical for identical files (paths, contents and
+# updated_at; see cached_archive_path): that hash is their ETag, and a
+# resumed download may hit a rebuilt copy
+FALLBACK_DATE = (1980, 1, 1, 0, 0, 0)     # zip's earliest representable date
+
+ARCHIVE_FORMATS = {
+    "zip": ("zip", "application/zip"),
+    "tar.gz": ("tar.gz", "application/gzip"),
+}
+
+
+class _ChunkWriter(io.RawIOBase):
+    """
+    Write-only, non-seekable sink that hands out what was written so far.
+    zipfile/tarfile stream into it; we drain it after every file.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._position += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_chunks(project_id: str):
+    writer = _ChunkWriter()
+
+    with zipfile.ZipFile(writer, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for f in iter_project_files(project_id, ordered=True):
+            updated = f.get("updated_at")
+            info = zipfile.ZipInfo(
+                f["path"],
+                date_time=updated.timetuple()[:6] if updated else FALLBACK_DATE
+            )
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            zf.writestr(info, f["content"])
+            yield writer.drain()
+
+    yield writer.drain()
+
+
+def _targz_chunks(project_id: str):
+    writer = _ChunkWriter()
+
+    # Our own gzip layer: tarfile's "w|gz" stamps the current time into its header
+    with gzip.GzipFile(filename="", fileobj=writer, mode="wb", mtime=0) as gz, \
+            tarfile.open(fileobj=gz, mode="w|") as tf:
+        for f in iter_project_files(project_id, ordered=True):
+            data = f["content"].encode("utf-8")
+            updated = f.get("updated_at")
+
+            info = tarfile.TarInfo(f["path"])
+            info.size = len(data)
+            info.mode = 0o644
+            info.mtime = int(updated.timestamp()) if updated else 0
+            tf.addfile(info, io.BytesIO(data))
+            yield writer.drain()
+
+    yield writer.drain()
+
+
+def iter_archive(project_id: str, fmt: str):
+    """
+    Archive bytes built on the fly, one project file at a time.
+    """
+    chunks = _zip_chunks(project_id) if fmt == "zip" else _targz_chunks(project_id)
+    for chunk in chunks:
+        if chunk:
+            yield chunk
+
+
+# ---------------------------------------
+# CACHE (keyed by project content hash)
+# ---------------------------------------
+def cached_archive_path(project_id: str, fmt: str) -> tuple[str, Path]:
+    # The entries carry updated_at as their modification time
+    digest = project_content_hash(project_id, with_times=True)
+    ext, _ = ARCHIVE_FORMATS[fmt]
+    return digest, ARCHIVE_CACHE_DIR / f"{digest}.{ext}"
+
+
+def _evict_old_archives():
+    archives = sorted(
+        (p for p in ARCHIVE_CACHE_DIR.iterdir() if not p.name.startswith(".")),
+        key=lambda p: p.stat().st_mtime
+    )
+    for old in archives[:-ARCHIVE_CACHE_MAX]:
+        old.unlink(missing_ok=True)
+
+
+def stream_and_cache(project_id: str, fmt: str, target: Path):
+    """
+    Yield the archive while teeing it into the cache.
+    The cache entry only appears once the whole archive was written.
+    """
+    ARCHIVE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = ARCHIVE_CACHE_DIR / f".{uuid.uuid4().hex}.tmp"
+
+    try:
+        with open(tmp, "wb") as out:
+            for chunk in iter_archive(project_id, fmt):
+                out.write(chunk)
+                yield chunk
+        tmp.replace(target)
+        _evict_old_archives()
+    finally:
+        tmp.unlink(missing_ok=True)
+
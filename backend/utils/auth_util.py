@@ -1,37 +1,326 @@
 import bcrypt, jwt, os
+import asyncio
+import hashlib
+import math
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
 from dotenv import load_dotenv
+from fastapi import Cookie, Depends, Header, HTTPException, Response
+from utils.database_util import chats_col, projects_col
 
 load_dotenv()
 
 JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGO = os.getenv("JWT_ALGO")
 
+# AUTH_REQUIRED=0 only for local development: requests without a token
+# are then let through and ownership is not checked
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "1") == "1"
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+
+# Previews load in an iframe / new tab, which cannot send the bearer
+# header: starting one sets the token as a cookie scoped to its URLs
+PREVIEW_COOKIE = "codexa_preview"
+PREVIEW_COOKIE_SECURE = os.getenv("PREVIEW_COOKIE_SECURE", "0") == "1"
+
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+BCRYPT_MAX_CONCURRENCY = int(os.getenv("BCRYPT_MAX_CONCURRENCY", BCRYPT_WORKERS * 2))
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", 250))
+BCRYPT_MIN_ROUNDS = 12      # bcrypt's default; never go below it
+BCRYPT_MAX_ROUNDS = 15
+
+
+# ---------------------------------------
+# BCRYPT (runs in a process pool)
+# ---------------------------------------
+def _hashpw(pw: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(pw, bcrypt.gensalt(rounds))
+
+
+def _checkpw(pw: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(pw, hashed)
+
+
+def _password_bytes(password: str) -> bytes:
+    return password.encode("utf-8")[:72]     # bcrypt limit
+
+
+def hash_rounds(hashed: bytes) -> int:
+    # $2b$12$...
+    return int(bytes(hashed)[4:6])
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_semaphore = None
+_rounds = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded server process is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=BCRYPT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(BCRYPT_MAX_CONCURRENCY)
+    return _semaphore
+
+
+def bcrypt_rounds() -> int:
+    """
+    Cost factor that makes one hash take about BCRYPT_TARGET_MS on this
+    machine (every extra round doubles the time). BCRYPT_ROUNDS overrides.
+    """
+    global _rounds
+    if _rounds is None:
+        if os.getenv("BCRYPT_ROUNDS"):
+            _rounds = int(os.getenv("BCRYPT_ROUNDS"))
+        else:
+            start = time.perf_counter()
+            _hashpw(b"calibration", BCRYPT_MIN_ROUNDS)
+            elapsed_ms = max((time.perf_counter() - start) * 1000, 0.001)
+
+            extra = math.floor(math.log2(max(BCRYPT_TARGET_MS / elapsed_ms, 1)))
+            _rounds = min(BCRYPT_MIN_ROUNDS + extra, BCRYPT_MAX_ROUNDS)
+            print(f"🔐 bcrypt cost factor: {_rounds}")
+    return _rounds
+
+
+async def _run_bcrypt(fn, *args):
+    async with _get_semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_pool(), fn, *args)
+
+
+async def hash_password_async(password: str) -> bytes:
+    return await _run_bcrypt(_hashpw, _password_bytes(password), bcrypt_rounds())
+
+
+async def verify_password_async(password: str, hashed: bytes) -> bool:
+    return await _run_bcrypt(_checkpw, _password_bytes(password), bytes(hashed))
+
+
+def needs_rehash(hashed: bytes) -> bool:
+    """
+    Stored hashes are upgraded to the current cost factor on login.
+    """
+    return hash_rounds(hashed) < bcrypt_rounds()
+
+
+def shutdown_bcrypt_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
 
 def hash_password(password: str):
-    pw = password.encode("utf-8")[:72]     # bcrypt limit
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(pw, salt)
+    return _hashpw(_password_bytes(password), bcrypt_rounds())
 
 def verify_password(password: str, hashed: bytes):
-    pw = password.encode("utf-8")[:72]
-    return bcrypt.checkpw(pw, hashed)
+    return _checkpw(_password_bytes(password), bytes(hashed))
+
 
+# ---------------------------------------
+# TOKENS
+# ---------------------------------------
 def create_token(user_id: str, name: str = "", email: str = ""):
     payload = {
-        "user_id": user_id,
+        "sub": user_id,
+        "user_id": user_id,     # kept for tokens read by older code
         "name": name,
         "email":email,
         "exp": datetime.utcnow() + timedelta(days=7)
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGO)
 
-def verify_token(token: str):
+
+# sha256(token) -> (exp timestamp, claims)
+_claims_cache = OrderedDict()
+_claims_lock = threading.Lock()
+
+
+def decode_token(token: str) -> dict:
+    """
+    Verified claims of a token. A token is verified once, then its claims
+    are served from a bounded LRU until the token expires.
+    """
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    now = time.time()
+
+    with _claims_lock:
+        entry = _claims_cache.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                _claims_cache.move_to_end(key)
+                return entry[1]
+            del _claims_cache[key]
+
     try:
-        decoded = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
-        return decoded["sub"]
+        claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
     except jwt.ExpiredSignatureError:
         raise Exception("Token expired")
     except jwt.InvalidTokenError:
         raise Exception("Invalid token")
 
+    with _claims_lock:
+        _claims_cache[key] = (claims.get("exp", now + 60), claims)
+        while len(_claims_cache) > TOKEN_CACHE_SIZE:
+            _claims_cache.popitem(last=False)
+
+    return claims
+
+
+def verify_token(token: str):
+    claims = decode_token(token)
+    # Tokens issued before "sub" was added only carry user_id
+    return claims.get("sub") or claims["user_id"]
+
+
+# ---------------------------------------
+# FASTAPI DEPENDENCY
+# ---------------------------------------
+def get_current_user(
+    authorization: str = Header(None),
+    preview_token: str = Cookie(None, alias=PREVIEW_COOKIE)
+) -> dict | None:
+    """
+    Claims of the bearer token (or of the preview cookie, see
+    set_preview_cookie). Invalid or expired tokens are rejected; a missing
+    token is only rejected when AUTH_REQUIRED=1.
+    """
+    if not authorization and preview_token:
+        authorization = f"Bearer {preview_token}"
+
+    if not authorization:
+        if AUTH_REQUIRED:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        return None
+
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Invalid authorization header")
+
+    try:
+        claims = decode_token(token.strip())
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+    return {**claims, "user_id": claims.get("sub") or claims.get("user_id")}
+
+
+# ---------------------------------------
+# OWNERSHIP
+# ---------------------------------------
+OWNER_CACHE_SIZE = int(os.getenv("OWNER_CACHE_SIZE", 10000))
+
+# (collection name, id) -> owner user_id; owners never change
+_owner_cache = OrderedDict()
+_owner_lock = threading.Lock()
+
+
+def _owner_of(col, doc_id: str) -> str | None:
+    key = (col.name, doc_id)
+    with _owner_lock:
+        if key in _owner_cache:
+            _owner_cache.move_to_end(key)
+            return _owner_cache[key]
+
+    try:
+        doc = col.find_one({"_id": ObjectId(doc_id)}, {"user_id": 1})
+    except InvalidId:
+        doc = None
+    if doc is None:
+        return None
+
+    owner = str(doc.get("user_id"))
+    with _owner_lock:
+        _owner_cache[key] = owner
+        while len(_owner_cache) > OWNER_CACHE_SIZE:
+            _owner_cache.popitem(last=False)
+    return owner
+
+
+def authorize(user: dict | None, owner_id) -> None:
+    """
+    403 unless the caller is owner_id. user is None only with
+    AUTH_REQUIRED=0 and no token, where nothing is enforced.
+    """
+    if user is None:
+        return
+    if owner_id is None or str(owner_id) != user["user_id"]:
+        raise HTTPException(status_code=403, detail="Not allowed")
+
+
+def authorize_chat(user: dict | None, chat_id: str) -> None:
+    if user is None:
+        return
+    owner = _owner_of(chats_col, chat_id)
+    if owner is None:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    authorize(user, owner)
+
+
+def authorize_project(user: dict | None, project_id: str) -> None:
+    if user is None:
+        return
+    owner = _owner_of(projects_col, project_id)
+    if owner is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    authorize(user, owner)
+
+
+def require_user(user_id: str, user: dict | None = Depends(get_current_user)) -> dict | None:
+    """
+    Dependency for routes with a {user_id}: only that user may call them.
+    """
+    authorize(user, user_id)
+    return user
+
+
+def require_chat_owner(chat_id: str, user: dict | None = Depends(get_current_user)) -> dict | None:
+    authorize_chat(user, chat_id)
+    return user
+
+
+def require_project_owner(project_id: str, user: dict | None = Depends(get_current_user)) -> dict | None:
+    if not ObjectId.is_valid(project_id):
+        raise HTTPException(status_code=400, detail="Invalid project id")
+    authorize_project(user, project_id)
+    return user
+
+
+def set_preview_cookie(response: Response, project_id: str, authorization: str | None):
+    """
+    Hand the caller's bearer token to the preview URLs of project_id
+    (static files, dev-server proxy, HMR socket). HttpOnly, so the
+    previewed app cannot read it, and sent nowhere else.
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return
+
+    response.set_cookie(
+        PREVIEW_COOKIE,
+        token.strip(),
+        path=f"/preview/{project_id}",
+        httponly=True,
+        samesite="lax",
+        secure=PREVIEW_COOKIE_SECURE
+    )
@@ -0,0 +1,233 @@
+"""
+In-process read-through caches for hot sidebar reads (chat lists,
+project lists, file manifests).
+
+Entries are bounded (LRU) and expire after a TTL. The write paths
+invalidate them directly. Shared caches are coherent across workers:
+invalidate() also bumps a version document in runtime_state. A hit is
+served from memory for CACHE_MAX_STALENESS seconds after the version was
+last checked; after that one _id lookup revalidates it (instead of the
+list query). While the change stream runs (CACHE_CHANGE_STREAM=1) it
+invalidates other workers' entries itself and no lookups are made; it
+also feeds other in-process state (RAG index).
+
+Cached values are shared: callers must not mutate them.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from utils.database_util import db
+from utils.state_util import state
+
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+CACHE_TTL = float(os.getenv("CACHE_TTL", 30))            # seconds
+CACHE_CHANGE_STREAM = os.getenv("CACHE_CHANGE_STREAM", "0") == "1"
+# How long another worker's write may go unseen without a change stream
+CACHE_MAX_STALENESS = float(os.getenv("CACHE_MAX_STALENESS", 2))      # seconds
+
+CACHES = {}
+
+# Set while the change stream is connected: it delivers every invalidation
+_stream_live = threading.Event()
+
+
+class TTLCache:
+
+    def __init__(self, name: str, maxsize: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL, shared: bool = True):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = shared
+
+        self._data = OrderedDict()        # key -> (expires_at, version, checked_at, value)
+        self._lock = threading.Lock()
+        self._epoch = 0                   # bumped by every invalidation
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        CACHES[name] = self
+
+    def _version_key(self, key) -> str:
+        return f"cache:{self.name}:{key}"
+
+    def version(self, key):
+        """
+        Shared version of key: changes whenever any worker invalidates it.
+        """
+        return state.version(self._version_key(key)) if self.shared else 0
+
+    def _trusted(self, entry, now: float) -> bool:
+        return not self.shared or _stream_live.is_set() or now - entry[2] < CACHE_MAX_STALENESS
+
+    def get_or_load(self, key, loader):
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now and self._trusted(entry, now):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[3]
+
+        # Read before the load: a write racing with it leaves the entry outdated
+        version = self.version(key)
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now and entry[1] == version:
+                self._data[key] = (entry[0], version, now, entry[3])
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[3]
+
+            self.misses += 1
+            epoch = self._epoch
+
+        value = loader()
+
+        with self._lock:
+            # An invalidation during the load means the value may be stale already
+            if epoch == self._epoch:
+                self._data[key] = (time.monotonic() + self.ttl, version, now, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+        return value
+
+    def invalidate(self, key, broadcast: bool = True):
+        """
+        Drop key here and, for shared caches, in every other worker.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+            self._epoch += 1
+            self.invalidations += 1
+
+        if self.shared and broadcast:
+            try:
+                # Outlives every entry cached under the old version
+                state.bump(self._version_key(key), ttl=self.ttl + CACHE_MAX_STALENESS)
+            except Exception as e:
+                print(f"⚠️ Could not bump cache version for {self.name}:{key}:", e)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._epoch += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.maxsize,
+                "ttl": self.ttl,
+                "shared": self.shared,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations
+            }
+
+
+chats_cache = TTLCache("user_chats")          # user_id -> chats
+projects_cache = TTLCache("user_projects")    # user_id -> projects
+manifest_cache = TTLCache("file_manifest")    # project_id -> manifest
+
+
+def cache_stats() -> dict:
+    return {name: cache.stats() for name, cache in CACHES.items()}
+
+
+# ---------------------------------------
+# CROSS-WORKER INVALIDATION
+# ---------------------------------------
+# Other in-process state derived from these collections (e.g. the RAG
+# index) registers fn(coll, doc) to follow the same change stream.
+# coll is None after an interruption: drop everything.
+CHANGE_LISTENERS = []
+
+
+def add_change_listener(fn):
+    if fn not in CHANGE_LISTENERS:
+        CHANGE_LISTENERS.append(fn)
+    return fn
+
+
+def _invalidate_from_change(change: dict):
+    coll = change.get("ns", {}).get("coll")
+    doc = change.get("fullDocument") or {}
+
+    for fn in list(CHANGE_LISTENERS):
+        try:
+            fn(coll, doc)
+        except Exception as e:
+            print("❌ Change listener failed:", e)
+
+    cache, owner = {
+        "chats": (chats_cache, "user_id"),
+        "projects": (projects_cache, "user_id"),
+        "files": (manifest_cache, "project_id"),
+    }.get(coll, (None, None))
+
+    if cache is None:
+        return
+    # The writer already bumped the shared version; only drop our copy
+    if owner in doc:
+        cache.invalidate(str(doc[owner]), broadcast=False)
+    else:
+        cache.clear()      # deletes carry no document: drop everything
+
+
+def _watch_changes():
+    pipeline = [
+        {"$match": {"ns.coll": {"$in": ["chats", "projects", "files"]}}},
+        # only the owner keys are needed, never file contents
+        {"$project": {
+            "ns": 1,
+            "operationType": 1,
+            "fullDocument.user_id": 1,
+            "fullDocument.project_id": 1,
+            "fullDocument.path": 1
+        }}
+    ]
+
+    while True:
+        try:
+            with db.watch(pipeline, full_document="updateLookup") as stream:
+                # Entries cached before the stream opened may have missed changes
+                for cache in CACHES.values():
+                    cache.clear()
+                _stream_live.set()
+                for change in stream:
+                    _invalidate_from_change(change)
+        except Exception as e:
+            _stream_live.clear()
+            print("⚠️ Cache change stream interrupted:", e)
+
+            # Changes may have been missed while disconnected
+            for cache in CACHES.values():
+                cache.clear()
+            for fn in list(CHANGE_LISTENERS):
+                fn(None, {})        # None: anything may have changed
+            time.sleep(5)
+
+
+def start_cache_sync():
+    """
+    Follow the change stream in the background (CACHE_CHANGE_STREAM=1).
+    Requires a replica set. The caches above work without it (they check
+    their shared versions); with it they skip those lookups, and the RAG
+    index uses it for early invalidation.
+    """
+    if not CACHE_CHANGE_STREAM:
+        return
+
+    t = threading.Thread(target=_watch_changes, name="cache-sync", daemon=True)
+    t.start()
@@ -0,0 +1,68 @@
+import os
+import zlib
+from bson import Binary
+
+try:
+    import zstandard
+except ImportError:  # optional: zlib only
+    zstandard = None
+
+
+# Payloads smaller than this stay plain strings (compression would not pay off)
+CODEC_THRESHOLD = int(os.getenv("STORAGE_CODEC_THRESHOLD", 4096))   # bytes
+DEFAULT_CODEC = os.getenv("STORAGE_CODEC") or ("zstd" if zstandard else "zlib")
+
+_ZSTD_COMPRESSOR = zstandard.ZstdCompressor(level=6) if zstandard else None
+_ZSTD_DECOMPRESSOR = zstandard.ZstdDecompressor() if zstandard else None
+
+
+def encode_text(text: str, codec: str = DEFAULT_CODEC):
+    """
+    Returns (stored value, codec). codec is None for values kept as plain text.
+    """
+    raw = (text or "").encode("utf-8")
+    if len(raw) < CODEC_THRESHOLD:
+        return text, None
+
+    if codec == "zstd" and _ZSTD_COMPRESSOR:
+        return Binary(_ZSTD_COMPRESSOR.compress(raw)), "zstd"
+
+    return Binary(zlib.compress(raw, 6)), "zlib"
+
+
+def decode_text(value, codec: str = None) -> str:
+    if value is None:
+        return ""
+    if not codec:
+        return value
+
+    if codec == "zstd":
+        if _ZSTD_DECOMPRESSOR is None:
+            raise RuntimeError("zstandard is required to read zstd-encoded documents")
+        raw = _ZSTD_DECOMPRESSOR.decompress(value)
+    elif codec == "zlib":
+        raw = zlib.decompress(value)
+    else:
+        raise ValueError(f"Unknown storage codec: {codec}")
+
+    return raw.decode("utf-8")
+
+
+def encode_field(doc: dict, field: str = "content") -> dict:
+    """
+    Encode doc[field] in place and record the codec next to it as <field>_codec.
+    """
+    value, codec = encode_text(doc.get(field, ""))
+    doc[field] = value
+    doc[f"{field}_codec"] = codec
+    return doc
+
+
+def decode_field(doc: dict, field: str = "content") -> dict:
+    """
+    Decode doc[field] in place. Rows without <field>_codec are plain text.
+    """
+    codec = doc.pop(f"{field}_codec", None)
+    if field in doc:
+        doc[field] = decode_text(doc[field], codec)
+    return doc
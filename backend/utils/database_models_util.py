@@ -1,6 +1,13 @@
 from utils.database_util import chats_col, messages_col, projects_col
 from datetime import datetime
 from bson import ObjectId
+import heapq
+from utils.codec_util import encode_field, decode_field
+from pymongo.errors import BulkWriteError
+from utils.message_bucket_util import bucketed_storage, append_message, iter_bucket_messages
+from utils.write_behind_util import WriteBehindBuffer
+from utils.search_util import index_messages
+from utils.cache_util import chats_cache, projects_cache
 
 
 
@@ -16,9 +23,10 @@ def create_chat(user_id: str, title: str, description: str):
     }
 
     res = chats_col.insert_one(chat)
+    chats_cache.invalidate(user_id)
     return str(res.inserted_id)
 
-def get_user_chats(user_id: str):
+def _load_user_chats(user_id: str):
     cursor = chats_col.find({"user_id": user_id}).sort("created_at", -1)
 
     chats = []
@@ -28,13 +36,19 @@ def get_user_chats(user_id: str):
 
     return chats
 
+def get_user_chats(user_id: str):
+    return chats_cache.get_or_load(user_id, lambda: _load_user_chats(user_id))
+
 
 
 def update_project_timestamp(chat_id: str):
-    chats_col.update_one(
+    chat = chats_col.find_one_and_update(
         {"_id": ObjectId(chat_id)},
-        {"$set": {"updated_at": datetime.utcnow()}}
+        {"$set": {"updated_at": datetime.utcnow()}},
+        projection={"user_id": 1}
     )
+    if chat:
+        chats_cache.invalidate(chat["user_id"])
 
 
 
@@ -46,8 +60,32 @@ def convert_messages_to_text(messages):
         lines.append(f"{role}: {m['content']}")
     return "\n".join(lines)
 
-def save_message(chat_id: str, role: str, content: str, agent: str = None):
+def _write_messages(batch):
+    """
+    batch: [(chat_id, encoded message doc)] in creation order.
+    """
+    if bucketed_storage():
+        for chat_id, msg in batch:
+            append_message(chat_id, {k: v for k, v in msg.items() if k != "chat_id"})
+    else:
+        try:
+            messages_col.insert_many([msg for _, msg in batch], ordered=False)
+        except BulkWriteError as e:
+            # A retried batch may be partly written already: duplicates are fine
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+
+    index_messages(batch)
+
+
+# Bookkeeping messages (planner / developer / debugger / pipeline)
+# are not needed until the chat is read again.
+message_writes = WriteBehindBuffer(_write_messages, "messages")
+
+
+def save_message(chat_id: str, role: str, content: str, agent: str = None, deferred: bool = False):
     msg = {
+        "_id": ObjectId(),
         "chat_id": chat_id,
         "role": role,              # "user" or "assistant"
         "content": content,
@@ -55,7 +93,16 @@ def save_message(chat_id: str, role: str, content: str, agent: str = None):
         "created_at": datetime.utcnow()
     }
 
-    messages_col.insert_one(msg)
+    # Long replies and planner JSON are stored compressed
+    encode_field(msg)
+
+    if deferred:
+        message_writes.add(chat_id, msg)
+        return True
+
+    # Earlier deferred messages of this chat go first to keep the order
+    message_writes.flush(chat_id)
+    _write_messages([(chat_id, msg)])
     return True
 
 def format_for_gemini(messages):
@@ -72,16 +119,30 @@ def format_for_gemini(messages):
 
 
 def get_chat_messages(chat_id: str):
+    # Read barrier: make buffered writes of this chat visible first
+    message_writes.flush(chat_id)
+
     try:
         msgs = list(
             messages_col.find(
                 {"chat_id": chat_id}
             ).sort("created_at", 1)
         )
+
+        if bucketed_storage():
+            # Chats not migrated yet still have flat documents
+            msgs = list(heapq.merge(
+                msgs,
+                iter_bucket_messages(chat_id),
+                key=lambda m: m["created_at"]
+            ))
+
         print(f"Loaded {len(msgs)} messages for chat_id {chat_id}") 
 
         for m in msgs:
             m["_id"] = str(m["_id"])
+            m["chat_id"] = chat_id
+            decode_field(m)
 
         return msgs
 
@@ -106,12 +167,13 @@ def save_project(user_id: str, title: str, description: str, chat_id:str,plan:di
     }
 
     res = projects_col.insert_one(project)
+    projects_cache.invalidate(user_id)
     print("Saved project with ID:", str(res.inserted_id))
     return str(res.inserted_id)
 
 
 
-def get_user_projects(user_id: str):
+def _load_user_projects(user_id: str):
     cursor = projects_col.find({"user_id": user_id}).sort("created_at", -1)
 
     projects = []
@@ -119,4 +181,8 @@ def get_user_projects(user_id: str):
         p["_id"] = str(p["_id"])
         projects.append(p)
 
-    return projects
\ No newline at end of file
+    return projects
+
+
+def get_user_projects(user_id: str):
+    return projects_cache.get_or_load(user_id, lambda: _load_user_projects(user_id))
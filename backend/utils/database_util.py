@@ -1,4 +1,4 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING
 import os
 
 MONGO_URI = os.getenv("MONGO_URI")
@@ -11,4 +11,40 @@ users_col = db["users"]
 chats_col = db["chats"]
 messages_col = db["messages"]
 projects_col = db["projects"]
-files_col = db["files"]
\ No newline at end of file
+files_col = db["files"]
+file_dirs_col = db["file_dirs"]
+file_revisions_col = db["file_revisions"]
+message_buckets_col = db["message_buckets"]
+search_code_col = db["search_code"]
+search_messages_col = db["search_messages"]
+runtime_state_col = db["runtime_state"]
+preview_log_lines_col = db["preview_log_lines"]
+
+
+def ensure_indexes():
+    """
+    Create the indexes the read/write paths rely on. Safe to call repeatedly.
+    """
+    indexes = [
+        (projects_col, [("chat_id", ASCENDING), ("created_at", ASCENDING)], {}),
+        (files_col, [("project_id", ASCENDING), ("path", ASCENDING)], {"unique": True}),
+        (file_dirs_col, [("project_id", ASCENDING), ("dir", ASCENDING)], {"unique": True}),
+        (messages_col, [("chat_id", ASCENDING), ("created_at", ASCENDING)], {}),
+        (message_buckets_col, [("chat_id", ASCENDING), ("seq", ASCENDING)], {"unique": True}),
+        (search_code_col, [("project_id", ASCENDING), ("path", ASCENDING)], {"unique": True}),
+        (search_code_col, [("user_id", ASCENDING), ("grams", ASCENDING)], {}),
+        # message snippets are read from the (compressed) message itself
+        (message_buckets_col, [("messages._id", ASCENDING)], {}),
+        (search_messages_col, [("user_id", ASCENDING), ("terms", "text")], {"default_language": "none"}),
+        (file_revisions_col, [("project_id", ASCENDING), ("path", ASCENDING), ("rev", ASCENDING)], {"unique": True}),
+        # expired leases are cleaned up an hour after they ran out
+        (runtime_state_col, [("expires_at", ASCENDING)], {"expireAfterSeconds": 3600}),
+        (preview_log_lines_col, [("project_id", ASCENDING), ("seq", ASCENDING)], {}),
+        (preview_log_lines_col, [("created_at", ASCENDING)], {"expireAfterSeconds": 86400}),
+    ]
+
+    for col, keys, options in indexes:
+        try:
+            col.create_index(keys, **options)
+        except Exception as e:
+            print(f"⚠️ Could not create index on {col.name}:", e)
@@ -1,6 +1,58 @@
+import hashlib
+import re
 from datetime import datetime
 from bson import ObjectId
-from utils.database_util import files_col
+from pymongo import UpdateOne
+from utils.database_util import files_col, file_dirs_col
+from utils.revision_util import record_revisions
+from utils.codec_util import encode_text, decode_text
+from utils.search_util import index_files
+from utils.cache_util import manifest_cache
+from utils.project_tree import ProjectTree
+
+
+# ---------------------------------------
+# FILE CHANGE LISTENERS
+# ---------------------------------------
+# Callbacks of the form fn(project_id: str, paths: list[str]) that run
+# after files of a project were written (edit, save or regeneration).
+FILES_LISTENERS = []
+
+
+def add_files_listener(fn):
+    if fn not in FILES_LISTENERS:
+        FILES_LISTENERS.append(fn)
+    return fn
+
+
+def notify_files_changed(project_id: str, paths):
+    paths = list(paths)
+    if not paths:
+        return
+
+    for fn in list(FILES_LISTENERS):
+        try:
+            fn(str(project_id), paths)
+        except Exception as e:
+            print("❌ Files listener failed:", e)
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+def is_safe_project_path(path: str) -> bool:
+    """
+    Relative, "/"-separated and without empty, "." or ".." segments, so
+    the path cannot leave the project when joined onto a directory.
+    """
+    if not path or path.startswith("/") or "\\" in path or "\x00" in path:
+        return False
+
+    parts = path.split("/")
+    if ":" in parts[0]:        # drive letters / URLs
+        return False
+    return all(part not in ("", ".", "..") for part in parts)
 
 
 def normalize_project_path(path: str) -> str:
@@ -17,39 +69,273 @@ def normalize_project_path(path: str) -> str:
     return normalized
 
 
-def flatten_structure(structure, base_path=""):
-    files = []
+def iter_project_files(project_id: str, prefix: str = None, paths=None, ordered: bool = False):
+    """
+    Yield {"path", "content", "hash"} for the files of a project,
+    optionally restricted to a path prefix or an explicit list of paths.
+    ordered=True yields them by path (served by the unique index).
+    """
+    query = {"project_id": ObjectId(project_id)}
+
+    if paths is not None:
+        query["path"] = {"$in": list(paths)}
+    elif prefix:
+        query["path"] = {"$regex": "^" + re.escape(prefix)}
+
+    projection = {"path": 1, "content": 1, "content_codec": 1, "hash": 1, "updated_at": 1}
+    cursor = files_col.find(query, projection)
+    if ordered:
+        cursor = cursor.sort("path", 1)
 
-    for node in structure:
-        current_path = f"{base_path}/{node['name']}".lstrip("/")
+    for f in cursor:
+        content = decode_text(f.get("content", ""), f.get("content_codec"))
+        yield {
+            "path": f["path"],
+            "content": content,
+            "hash": f.get("hash") or content_hash(content),
+            "updated_at": f.get("updated_at")
+        }
+
+
+def _existing_hashes(project_id: str, paths):
+    cursor = files_col.find(
+        {"project_id": ObjectId(project_id), "path": {"$in": list(paths)}},
+        {"path": 1, "hash": 1}
+    )
+    return {f["path"]: f.get("hash") for f in cursor}
+
+
+def _file_update(project_id: str, path: str, content: str, now):
+    stored, codec = encode_text(content)
+    return UpdateOne(
+        {"project_id": ObjectId(project_id), "path": path},
+        {
+            "$set": {
+                "content": stored,
+                "content_codec": codec,
+                "hash": content_hash(content),
+                "size": len(content.encode("utf-8")),
+                "updated_at": now
+            },
+            "$setOnInsert": {"created_at": now}
+        },
+        upsert=True
+    )
+
+
+def file_manifest(project_id: str) -> list[dict]:
+    """
+    path / size / hash / updated_at of every project file, without content.
+    Cached until the project's files are written.
+    """
+    project_id = str(project_id)
+    return manifest_cache.get_or_load(project_id, lambda: _load_file_manifest(project_id))
+
+
+def _load_file_manifest(project_id: str) -> list[dict]:
+    manifest = list(files_col.find(
+        {"project_id": ObjectId(project_id)},
+        {"_id": 0, "path": 1, "size": 1, "hash": 1, "updated_at": 1}
+    ).sort("path", 1))
+
+    # Rows written before size/hash were stored
+    missing = {m["path"]: m for m in manifest if not m.get("hash")}
+    if missing:
+        for f in iter_project_files(project_id, paths=missing.keys()):
+            missing[f["path"]]["hash"] = f["hash"]
+            missing[f["path"]]["size"] = len(f["content"].encode("utf-8"))
+
+    return manifest
+
+
+def get_project_file(project_id: str, path: str) -> dict | None:
+    return next(iter_project_files(project_id, paths=[path]), None)
+
+
+def project_content_hash(project_id: str, prefix: str = None, with_times: bool = False) -> str:
+    """
+    Stable hash over (path, content hash) of a project's files,
+    optionally restricted to a path prefix such as "frontend/".
+    with_times also covers updated_at (for outputs that embed it).
+    """
+    query = {"project_id": ObjectId(project_id)}
+    if prefix:
+        query["path"] = {"$regex": "^" + re.escape(prefix)}
 
-        if node["type"] == "file":
-            files.append({
-                "path": current_path,
-                "content": node.get("content", "")
-            })
+    hashes, times = {}, {}
+    for f in files_col.find(query, {"path": 1, "hash": 1, "updated_at": 1}):
+        hashes[f["path"]] = f.get("hash")
+        times[f["path"]] = f.get("updated_at")
 
-        elif node["type"] == "folder":
-            files.extend(
-                flatten_structure(
-                    node.get("children", []),
-                    current_path
-                )
-            )
+    # Rows written before hashes were stored
+    missing = [p for p, h in hashes.items() if not h]
+    for f in iter_project_files(project_id, paths=missing) if missing else []:
+        hashes[f["path"]] = f["hash"]
 
-    return files
+    digest = hashlib.sha256()
+    for path in sorted(hashes):
+        if with_times:
+            digest.update(f"{path}\0{hashes[path]}\0{times[path]}\n".encode("utf-8"))
+        else:
+            digest.update(f"{path}\0{hashes[path]}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+# ---------------------------------------
+# DIRECTORY INDEX
+# ---------------------------------------
+# One file_dirs document per directory: {project_id, dir, entries: [{name, type}]}
+# with dir="" for the project root. Kept up to date on save.
+def _dir_entries(paths):
+    entries = {}
+    for path in paths:
+        parts = path.split("/")
+        for i, name in enumerate(parts):
+            parent = "/".join(parts[:i])
+            kind = "file" if i == len(parts) - 1 else "dir"
+            entries.setdefault(parent, set()).add((name, kind))
+    return entries
+
+
+def update_dir_index(project_id: str, paths):
+    """
+    Register new file paths (and all their parent directories) in the index.
+    """
+    entries = _dir_entries(paths)
+    if not entries:
+        return
+
+    file_dirs_col.bulk_write([
+        UpdateOne(
+            {"project_id": ObjectId(project_id), "dir": parent},
+            {"$addToSet": {"entries": {"$each": [
+                {"name": name, "type": kind} for name, kind in sorted(children)
+            ]}}},
+            upsert=True
+        )
+        for parent, children in entries.items()
+    ], ordered=False)
+
+
+def rebuild_dir_index(project_id: str):
+    file_dirs_col.delete_many({"project_id": ObjectId(project_id)})
+    paths = [f["path"] for f in files_col.find({"project_id": ObjectId(project_id)}, {"path": 1})]
+    update_dir_index(project_id, paths)
+    return len(paths)
+
+
+def list_directory(project_id: str, dir: str = "") -> list[dict] | None:
+    """
+    One level of the project tree with a child count for each sub-directory.
+    Returns None when the directory does not exist.
+    """
+    dir = dir.strip("/")
+    doc = file_dirs_col.find_one({"project_id": ObjectId(project_id), "dir": dir})
+
+    if doc is None and dir == "":
+        # Projects saved before the index existed
+        if rebuild_dir_index(project_id):
+            doc = file_dirs_col.find_one({"project_id": ObjectId(project_id), "dir": dir})
+
+    if doc is None:
+        return None
+
+    def child_path(name):
+        return f"{dir}/{name}" if dir else name
+
+    sub_dirs = [child_path(e["name"]) for e in doc["entries"] if e["type"] == "dir"]
+    counts = {
+        d["dir"]: len(d.get("entries", []))
+        for d in file_dirs_col.find(
+            {"project_id": ObjectId(project_id), "dir": {"$in": sub_dirs}},
+            {"dir": 1, "entries": 1}
+        )
+    } if sub_dirs else {}
+
+    children = []
+    for e in doc["entries"]:
+        path = child_path(e["name"])
+        node = {"name": e["name"], "path": path, "type": e["type"]}
+        if e["type"] == "dir":
+            node["child_count"] = counts.get(path, 0)
+        children.append(node)
+
+    children.sort(key=lambda n: (n["type"] != "dir", n["name"].lower()))
+    return children
+
+
+def _record_revisions(project_id: str, files: dict):
+    """
+    History only: the files are stored already, so a failure here is
+    reported but does not fail the save.
+    """
+    try:
+        record_revisions(project_id, files)
+    except Exception as e:
+        print(f"❌ Revision history incomplete for project {project_id}:", e)
 
 
 def save_files(project_id: str, structure):
-    files = flatten_structure(structure)
+    """
+    Upsert every file of the structure (nested JSON or a ProjectTree)
+    by (project_id, path). Only files whose content hash changed are
+    written. Returns the changed paths.
+    """
+    tree = structure if isinstance(structure, ProjectTree) else ProjectTree.from_structure(structure)
+
+    files, hashes = {}, {}
+    for node in tree.iter_files():
+        path = normalize_project_path(node.path)
+        if not is_safe_project_path(path):
+            print(f"⚠️ Skipping unsafe file path: {path!r}")
+            continue
+        files[path] = node.content
+        hashes[path] = node.hash
+
+    if not files:
+        return []
 
+    existing = _existing_hashes(project_id, files.keys())
     now = datetime.utcnow()
 
-    for f in files:
-        files_col.insert_one({
-            "project_id": ObjectId(project_id),
-            "path": normalize_project_path(f["path"]),
-            "content": f["content"],
-            "created_at": now,
-            "updated_at": now
-        })
+    changed = [
+        path for path in files
+        if existing.get(path) != hashes[path]
+    ]
+
+    if changed:
+        files_col.bulk_write(
+            [_file_update(project_id, p, files[p], now) for p in changed],
+            ordered=False
+        )
+        update_dir_index(project_id, [p for p in changed if p not in existing])
+        index_files(project_id, {p: files[p] for p in changed})
+        manifest_cache.invalidate(str(project_id))
+        notify_files_changed(project_id, changed)
+        _record_revisions(project_id, {p: files[p] for p in changed})
+
+    return changed
+
+
+def save_file(project_id: str, path: str, content: str):
+    """
+    Create or overwrite a single project file (user edit).
+    Returns True when the stored content changed; ValueError for a path
+    that could leave the project (see is_safe_project_path).
+    """
+    path = normalize_project_path(path)
+    if not is_safe_project_path(path):
+        raise ValueError(f"Invalid file path: {path!r}")
+
+    existing = _existing_hashes(project_id, [path])
+    if existing.get(path) == content_hash(content):
+        return False
+
+    files_col.bulk_write([_file_update(project_id, path, content, datetime.utcnow())])
+    if path not in existing:
+        update_dir_index(project_id, [path])
+    index_files(project_id, {path: content})
+    manifest_cache.invalidate(str(project_id))
+    notify_files_changed(project_id, [path])
+    _record_revisions(project_id, {path: content})
+    return True
@@ -0,0 +1,136 @@
+"""
+Bookkeeping for hedged LLM requests: per-model latency percentiles
+(when to hedge), the extra-request budget (whether we may) and the
+alternate model to fall over to.
+"""
+import os
+import threading
+from collections import defaultdict, deque
+
+
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 95))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", 8))     # seconds, until enough samples
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", 1))
+HEDGE_MIN_SAMPLES = 20
+HEDGE_WINDOW = 500                                                  # latencies kept per model
+
+# Extra requests may be at most this fraction of primary requests (plus a small burst)
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", 0.1))
+HEDGE_BUDGET_BURST = float(os.getenv("HEDGE_BUDGET_BURST", 5))
+
+
+def _parse_fallbacks(raw: str) -> dict:
+    pairs = (item.split("=", 1) for item in raw.split(",") if "=" in item)
+    return {a.strip(): b.strip() for a, b in pairs}
+
+
+# model -> alternate model for hedges/failover, e.g. "a=b,c=d"
+FALLBACK_MODELS = _parse_fallbacks(os.getenv(
+    "LLM_FALLBACK_MODELS",
+    "gemini-2.5-flash-lite=gemini-2.5-flash,gemini-2.5-flash=gemini-2.5-flash-lite"
+))
+
+
+class LatencyTracker:
+
+    def __init__(self, window=HEDGE_WINDOW):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, model: str, seconds: float):
+        with self._lock:
+            self._samples[model].append(seconds)
+
+    def percentile(self, model: str, p: float) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples[model])
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(int(len(samples) * p / 100), len(samples) - 1)]
+
+    def hedge_delay(self, model: str) -> float:
+        """
+        How long to wait for a call before firing a hedge.
+        """
+        value = self.percentile(model, HEDGE_PERCENTILE)
+        if value is None:
+            return HEDGE_DEFAULT_DELAY
+        return max(value, HEDGE_MIN_DELAY)
+
+    def stats(self) -> dict:
+        with self._lock:
+            models = list(self._samples)
+        return {
+            m: {
+                "samples": len(self._samples[m]),
+                "p50": self.percentile(m, 50),
+                "p95": self.percentile(m, 95),
+                "p99": self.percentile(m, 99),
+            }
+            for m in models
+        }
+
+
+class HedgeBudget:
+    """
+    Token bucket: every primary request earns HEDGE_BUDGET_RATIO tokens,
+    every extra request spends one.
+    """
+
+    def __init__(self, ratio=HEDGE_BUDGET_RATIO, burst=HEDGE_BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self._lock = threading.Lock()
+
+        self.primaries = 0
+        self.hedges = 0
+        self.failovers = 0
+        self.hedge_wins = 0
+        self.denied = 0
+
+    def on_primary(self):
+        with self._lock:
+            self.primaries += 1
+            self.tokens = min(self.tokens + self.ratio, self.burst)
+
+    def try_spend(self, kind: str) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                self.denied += 1
+                return False
+            self.tokens -= 1
+            if kind == "failover":
+                self.failovers += 1
+            else:
+                self.hedges += 1
+            return True
+
+    def on_hedge_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "primaries": self.primaries,
+                "hedges": self.hedges,
+                "failovers": self.failovers,
+                "hedge_wins": self.hedge_wins,
+                "denied": self.denied,
+                "extra_ratio": round((self.hedges + self.failovers) / self.primaries, 4) if self.primaries else None,
+                "budget_tokens": round(self.tokens, 2)
+            }
+
+
+latencies = LatencyTracker()
+hedge_budget = HedgeBudget()
+
+
+def hedging_stats() -> dict:
+    return {
+        "percentile": HEDGE_PERCENTILE,
+        "fallback_models": FALLBACK_MODELS,
+        "budget": hedge_budget.stats(),
+        "latency": latencies.stats()
+    }
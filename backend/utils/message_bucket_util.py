@@ -0,0 +1,131 @@
+import os
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
+from utils.database_util import message_buckets_col
+
+
+# "flat": one messages_col document per message (default)
+# "bucketed": messages packed into per-chat message_buckets_col documents
+MESSAGE_STORAGE = os.getenv("MESSAGE_STORAGE", "flat")
+
+BUCKET_MAX_MESSAGES = int(os.getenv("MESSAGE_BUCKET_MAX_MESSAGES", 100))
+BUCKET_MAX_BYTES = int(os.getenv("MESSAGE_BUCKET_MAX_BYTES", 512 * 1024))
+
+MESSAGE_OVERHEAD = 128   # rough BSON cost of the non-content fields
+
+
+def bucketed_storage() -> bool:
+    return MESSAGE_STORAGE == "bucketed"
+
+
+def message_size(msg: dict) -> int:
+    content = msg.get("content") or ""
+    size = len(content) if isinstance(content, (bytes, bytearray)) else len(content.encode("utf-8"))
+    return size + MESSAGE_OVERHEAD
+
+
+def append_message(chat_id: str, msg: dict, max_retries: int = 5):
+    """
+    $push the message into the chat's open bucket, or open the next bucket
+    when the current one is full. A chat has at most one open bucket.
+    """
+    size = message_size(msg)
+
+    for _ in range(max_retries):
+        res = message_buckets_col.update_one(
+            {
+                "chat_id": chat_id,
+                "open": True,
+                "count": {"$lt": BUCKET_MAX_MESSAGES},
+                "bytes": {"$lte": BUCKET_MAX_BYTES - size}
+            },
+            {
+                "$push": {"messages": msg},
+                "$inc": {"count": 1, "bytes": size},
+                "$set": {"last_at": msg["created_at"]}
+            }
+        )
+        if res.matched_count:
+            return
+
+        message_buckets_col.update_many(
+            {"chat_id": chat_id, "open": True},
+            {"$set": {"open": False}}
+        )
+        latest = message_buckets_col.find_one(
+            {"chat_id": chat_id},
+            {"seq": 1},
+            sort=[("seq", DESCENDING)]
+        )
+
+        try:
+            message_buckets_col.insert_one({
+                "chat_id": chat_id,
+                "seq": latest["seq"] + 1 if latest else 0,
+                "open": True,
+                "count": 1,
+                "bytes": size,
+                "first_at": msg["created_at"],
+                "last_at": msg["created_at"],
+                "messages": [msg]
+            })
+            return
+        except DuplicateKeyError:
+            continue   # another writer opened the bucket first: append to it
+
+    raise RuntimeError(f"Could not append message to chat {chat_id}")
+
+
+def iter_bucket_messages(chat_id: str):
+    """
+    Stream a chat's messages in order, one bucket document at a time.
+    While a migration swaps buckets a message can briefly be in two of
+    them: repeats are skipped.
+    """
+    cursor = message_buckets_col.find(
+        {"chat_id": chat_id},
+        {"messages": 1}
+    ).sort("seq", ASCENDING)
+
+    seen = set()
+    for bucket in cursor:
+        for msg in bucket.get("messages", []):
+            if msg["_id"] not in seen:
+                seen.add(msg["_id"])
+                yield msg
+
+
+def pack_buckets(chat_id: str, messages: list[dict]) -> list[dict]:
+    """
+    Group ordered messages into bucket documents (used by the migration).
+    """
+    buckets = []
+    current = None
+
+    for msg in messages:
+        size = message_size(msg)
+        if (
+            current is None
+            or current["count"] >= BUCKET_MAX_MESSAGES
+            or current["bytes"] + size > BUCKET_MAX_BYTES
+        ):
+            current = {
+                "chat_id": chat_id,
+                "seq": len(buckets),
+                "open": False,
+                "count": 0,
+                "bytes": 0,
+                "first_at": msg["created_at"],
+                "messages": []
+            }
+            buckets.append(current)
+
+        current["messages"].append(msg)
+        current["count"] += 1
+        current["bytes"] += size
+        current["last_at"] = msg["created_at"]
+
+    if buckets:
+        buckets[-1]["open"] = True
+
+    return buckets
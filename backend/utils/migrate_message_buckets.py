@@ -0,0 +1,73 @@
+"""
+Convert chats from one messages_col document per message to bucketed storage.
+
+Usage (from backend/):
+    python -m utils.migrate_message_buckets            # every chat
+    python -m utils.migrate_message_buckets <chat_id>  # selected chats
+
+Run it before (or right after) switching MESSAGE_STORAGE=bucketed.
+Messages already appended to buckets are merged back in order.
+"""
+import heapq
+import sys
+from pymongo import ASCENDING
+from utils.database_util import messages_col, message_buckets_col
+from utils.message_bucket_util import pack_buckets
+
+
+def migrate_chat(chat_id: str) -> int:
+    flat = list(messages_col.find({"chat_id": chat_id}).sort("created_at", ASCENDING))
+    if not flat:
+        return 0
+
+    # Freeze the chat's buckets: append_message only pushes into an open
+    # bucket, so from here on live appends open a new one instead of
+    # landing in a bucket this migration is about to replace.
+    message_buckets_col.update_many({"chat_id": chat_id, "open": True}, {"$set": {"open": False}})
+    frozen = list(message_buckets_col.find({"chat_id": chat_id, "open": False}).sort("seq", ASCENDING))
+
+    existing = [m for bucket in frozen for m in bucket.get("messages", [])]
+
+    merged = []
+    seen = set()
+    for m in heapq.merge(existing, flat, key=lambda m: m["created_at"]):
+        if m["_id"] in seen:
+            continue
+        seen.add(m["_id"])
+        m.pop("chat_id", None)
+        merged.append(m)
+
+    buckets = pack_buckets(chat_id, merged)
+
+    # The new buckets take seqs below every existing one (unique per chat),
+    # so they sort before buckets opened by live appends meanwhile
+    base = min([b["seq"] for b in frozen] + [0]) - len(buckets)
+    for i, bucket in enumerate(buckets):
+        bucket["seq"] = base + i
+        bucket["open"] = False
+
+    # New buckets first, then the superseded buckets, then the flat copies.
+    # A crash in between leaves duplicates (readers skip them by _id and a
+    # re-run merges them), never a lost message.
+    message_buckets_col.insert_many(buckets, ordered=True)
+    message_buckets_col.delete_many({"_id": {"$in": [b["_id"] for b in frozen]}})
+    messages_col.delete_many({"_id": {"$in": [m["_id"] for m in flat]}})
+
+    return len(flat)
+
+
+def main(chat_ids=None):
+    chat_ids = chat_ids or messages_col.distinct("chat_id")
+
+    total = 0
+    for chat_id in chat_ids:
+        moved = migrate_chat(chat_id)
+        total += moved
+        if moved:
+            print(f"✅ {chat_id}: moved {moved} message(s) into buckets")
+
+    print(f"Done: {total} message(s) migrated across {len(chat_ids)} chat(s)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,259 @@
+import asyncio
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+
+PREVIEW_LOG_LINES = int(os.getenv("PREVIEW_LOG_LINES", 2000))   # per preview
+PORT_PROBE_INTERVAL = 0.5                                      # seconds
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+
+
+class LogBuffer:
+    """
+    Bounded ring buffer of log lines for one preview.
+    Every line gets a sequence number so readers can resume where they stopped.
+    """
+
+    def __init__(self, maxlen: int = PREVIEW_LOG_LINES, on_append=None):
+        self._lines = deque(maxlen=maxlen)
+        self._next_seq = 0
+        self._lock = threading.Lock()
+        self._on_append = on_append      # fn(seq, ts, source, line)
+        self.closed = False
+
+    def append(self, source: str, line: str):
+        with self._lock:
+            entry = (self._next_seq, time.time(), source, line)
+            self._lines.append(entry)
+            self._next_seq += 1
+
+        if self._on_append:
+            self._on_append(*entry)
+
+    def since(self, seq: int = 0) -> list[dict]:
+        with self._lock:
+            return [
+                {"seq": s, "ts": ts, "source": source, "line": line}
+                for s, ts, source, line in self._lines
+                if s >= seq
+            ]
+
+    @property
+    def next_seq(self) -> int:
+        return self._next_seq
+
+
+class PreviewLogs:
+    """
+    Drains preview process pipes on a dedicated asyncio loop, so dev servers
+    never block on a full pipe, and feeds per-preview ring buffers.
+    Readiness comes from a log pattern or from the port accepting connections.
+    Listeners see every line / readiness change, e.g. to share them with
+    other workers. They run in order on a dispatcher thread, never on the
+    loop: a slow listener (a Mongo write) must not stall every pump.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._buffers = {}      # project_id -> LogBuffer
+        self._ready = {}        # (project_id, name) -> threading.Event
+        self.line_listeners = []     # fn(project_id, entry: dict)
+        self.ready_listeners = []    # fn(project_id, name)
+        self._events = queue.SimpleQueue()      # (listeners, args) for the dispatcher
+        self._dispatcher = None
+
+    # --------------------------------------------------
+    # EVENT LOOP
+    # --------------------------------------------------
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="preview-logs",
+                    daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    # --------------------------------------------------
+    # LISTENERS
+    # --------------------------------------------------
+    def _notify(self, listeners: list, *args):
+        if not listeners:
+            return
+
+        with self._lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(
+                    target=self._dispatch_loop,
+                    name="preview-log-listeners",
+                    daemon=True
+                )
+                self._dispatcher.start()
+
+        self._events.put((listeners, args))
+
+    def _dispatch_loop(self):
+        while True:
+            listeners, args = self._events.get()
+            for fn in list(listeners):
+                try:
+                    fn(*args)
+                except Exception as e:
+                    print("❌ Log listener failed:", e)
+
+    # --------------------------------------------------
+    # PUMPS
+    # --------------------------------------------------
+    async def _read_lines(self, pipe):
+        loop = asyncio.get_running_loop()
+
+        if os.name == "nt":
+            # Proactor loops cannot wrap anonymous subprocess pipes
+            try:
+                while True:
+                    line = await loop.run_in_executor(None, pipe.readline)
+                    if not line:
+                        return
+                    yield line
+            finally:
+                pipe.close()
+
+        reader = asyncio.StreamReader(limit=1024 * 1024)
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), pipe
+        )
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Overlong line without newline: take what is buffered
+                    line = await reader.read(64 * 1024)
+                if not line:
+                    return
+                yield line
+        finally:
+            transport.close()      # closes the pipe
+
+    async def _pump(self, project_id, name, pipe, buffer, ready_pattern, on_line):
+        try:
+            async for raw in self._read_lines(pipe):
+                line = ANSI_ESCAPE.sub("", raw.decode("utf-8", errors="replace")).rstrip()
+                if not line:
+                    continue
+
+                buffer.append(name, line)
+
+                if ready_pattern and ready_pattern.search(line):
+                    self.mark_ready(project_id, name)
+
+                if on_line:
+                    try:
+                        on_line(project_id, name, line)
+                    except Exception as e:
+                        print("❌ Log handler failed:", e)
+        except Exception as e:
+            buffer.append(name, f"[log pump stopped: {e}]")
+
+    async def _probe_port(self, project_id, name, proc, port):
+        event = self._ready_event(project_id, name)
+
+        while not event.is_set() and proc.poll() is None:
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.close()
+                self.mark_ready(project_id, name)
+                return
+            except OSError:
+                await asyncio.sleep(PORT_PROBE_INTERVAL)
+
+    def attach(self, project_id: str, name: str, proc, ready_pattern: str = None, port: int = None, on_line=None):
+        """
+        Start draining stdout/stderr of a preview process.
+        on_line(project_id, name, line) runs on the log loop and must not block.
+        """
+        loop = self._ensure_loop()
+        pattern = re.compile(ready_pattern) if ready_pattern else None
+
+        with self._lock:
+            buffer = self._buffer_locked(project_id)
+            buffer.closed = False
+            self._ready[(project_id, name)] = threading.Event()
+
+        for pipe in (proc.stdout, proc.stderr):
+            if pipe is not None:
+                asyncio.run_coroutine_threadsafe(
+                    self._pump(project_id, name, pipe, buffer, pattern, on_line), loop
+                )
+
+        if port:
+            asyncio.run_coroutine_threadsafe(self._probe_port(project_id, name, proc, port), loop)
+
+    # --------------------------------------------------
+    # READINESS
+    # --------------------------------------------------
+    def _ready_event(self, project_id: str, name: str) -> threading.Event:
+        with self._lock:
+            return self._ready.setdefault((project_id, name), threading.Event())
+
+    def mark_ready(self, project_id: str, name: str):
+        event = self._ready_event(project_id, name)
+        if not event.is_set():
+            event.set()
+            self.buffer(project_id).append(name, "[codexa] ready")
+            self._notify(self.ready_listeners, project_id, name)
+
+    def is_ready(self, project_id: str, name: str) -> bool:
+        return self._ready_event(project_id, name).is_set()
+
+    def wait_ready(self, project_id: str, names, timeout: float) -> bool:
+        deadline = time.time() + timeout
+        for name in names:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not self._ready_event(project_id, name).wait(remaining):
+                return False
+        return True
+
+    # --------------------------------------------------
+    # BUFFERS
+    # --------------------------------------------------
+    def _buffer_locked(self, project_id: str) -> LogBuffer:
+        buffer = self._buffers.get(project_id)
+        if buffer is None:
+            buffer = LogBuffer(on_append=lambda *entry: self._notify_line(project_id, *entry))
+            self._buffers[project_id] = buffer
+        return buffer
+
+    def _notify_line(self, project_id, seq, ts, source, line):
+        entry = {"seq": seq, "ts": ts, "source": source, "line": line}
+        self._notify(self.line_listeners, project_id, entry)
+
+    def buffer(self, project_id: str) -> LogBuffer:
+        with self._lock:
+            return self._buffer_locked(project_id)
+
+    def get(self, project_id: str) -> LogBuffer | None:
+        with self._lock:
+            return self._buffers.get(project_id)
+
+    def clear(self, project_id: str):
+        with self._lock:
+            buffer = self._buffers.pop(project_id, None)
+            for key in [k for k in self._ready if k[0] == project_id]:
+                del self._ready[key]
+
+        if buffer:
+            buffer.closed = True
+
+
+preview_logs = PreviewLogs()
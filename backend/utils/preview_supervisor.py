@@ -0,0 +1,329 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+IS_WINDOWS = os.name == "nt"
+
+PREVIEW_IDLE_TIMEOUT = int(os.getenv("PREVIEW_IDLE_TIMEOUT", 30 * 60))    # seconds
+PREVIEW_STOP_GRACE = float(os.getenv("PREVIEW_STOP_GRACE", 5))           # seconds
+PREVIEW_REAP_INTERVAL = float(os.getenv("PREVIEW_REAP_INTERVAL", 15))    # seconds
+PREVIEW_MAX_MEMORY_MB = int(os.getenv("PREVIEW_MAX_MEMORY_MB", 0))       # 0 = unlimited
+PREVIEW_MAX_OPEN_FILES = int(os.getenv("PREVIEW_MAX_OPEN_FILES", 4096))
+PREVIEW_CGROUP_ROOT = os.getenv("PREVIEW_CGROUP_ROOT")                   # writable cgroup v2 dir
+
+
+class ManagedProcess:
+    """
+    One supervised preview process (frontend dev server, backend, ...).
+    It leads its own process group, so the whole tree is signalled at once.
+    """
+
+    def __init__(self, name: str, proc: subprocess.Popen, cmd, cwd: str, cgroup: Path = None):
+        self.name = name
+        self.proc = proc
+        self.pid = proc.pid
+        self.cmd = cmd
+        self.cwd = cwd
+        self.cgroup = cgroup
+        self.started_at = time.time()
+
+    @property
+    def running(self) -> bool:
+        return self.proc.poll() is None
+
+    def info(self) -> dict:
+        return {
+            "name": self.name,
+            "pid": self.pid,
+            "running": self.running,
+            "returncode": self.proc.returncode,
+            "started_at": self.started_at
+        }
+
+
+class PreviewSupervisor:
+    """
+    Launches preview processes in their own session / process group with
+    resource limits, records their PIDs and stops them by group signal.
+    A background reaper stops previews that crashed or sat idle too long.
+    """
+
+    def __init__(
+        self,
+        idle_timeout=PREVIEW_IDLE_TIMEOUT,
+        stop_grace=PREVIEW_STOP_GRACE,
+        reap_interval=PREVIEW_REAP_INTERVAL,
+    ):
+        self.idle_timeout = idle_timeout
+        self.stop_grace = stop_grace
+        self.reap_interval = reap_interval
+
+        self._previews = {}          # project_id -> {name: ManagedProcess}
+        self._last_seen = {}         # project_id -> last activity timestamp
+        self._holds = {}             # project_id -> tokens of running repairs
+        self._lock = threading.RLock()
+        self._reaper = None
+        self.on_reaped = []          # callbacks fn(project_id, reason)
+
+    # --------------------------------------------------
+    # LAUNCH
+    # --------------------------------------------------
+    def _cgroup_dir(self, project_id: str, name: str) -> Path | None:
+        if not PREVIEW_CGROUP_ROOT:
+            return None
+
+        path = Path(PREVIEW_CGROUP_ROOT) / f"codexa-{project_id}-{name}"
+        try:
+            path.mkdir(exist_ok=True)
+            if PREVIEW_MAX_MEMORY_MB:
+                (path / "memory.max").write_text(str(PREVIEW_MAX_MEMORY_MB * 1024 * 1024))
+            return path
+        except OSError as e:
+            print("⚠️ cgroup unavailable, falling back to rlimits:", e)
+            return None
+
+    def _preexec(self, cgroup: Path | None):
+        """
+        Runs in the child between fork and exec (POSIX only).
+        """
+        def apply_limits():
+            if cgroup is not None:
+                try:
+                    (cgroup / "cgroup.procs").write_text("0")
+                except OSError:
+                    pass
+
+            if resource is None:
+                return
+
+            resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+            if PREVIEW_MAX_OPEN_FILES:
+                _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+                soft = PREVIEW_MAX_OPEN_FILES
+                if hard != resource.RLIM_INFINITY:
+                    soft = min(soft, hard)
+                resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+            if PREVIEW_MAX_MEMORY_MB and cgroup is None:
+                limit = PREVIEW_MAX_MEMORY_MB * 1024 * 1024
+                resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+
+        return apply_limits
+
+    def start(self, project_id: str, name: str, cmd, cwd, **popen_kwargs) -> subprocess.Popen:
+        """
+        Start (or replace) the process `name` of a preview.
+        """
+        self.stop(project_id, name)
+
+        cgroup = None
+        if IS_WINDOWS:
+            popen_kwargs.setdefault("shell", True)
+            popen_kwargs["creationflags"] = (
+                popen_kwargs.get("creationflags", 0) | subprocess.CREATE_NEW_PROCESS_GROUP
+            )
+        else:
+            popen_kwargs["start_new_session"] = True
+            cgroup = self._cgroup_dir(project_id, name)
+            popen_kwargs["preexec_fn"] = self._preexec(cgroup)
+
+        proc = subprocess.Popen(cmd, cwd=str(cwd), **popen_kwargs)
+
+        with self._lock:
+            self._previews.setdefault(project_id, {})[name] = ManagedProcess(name, proc, cmd, str(cwd), cgroup)
+            self._last_seen[project_id] = time.time()
+
+        print(f"🚀 Preview {project_id}: started {name} (pid {proc.pid})")
+        self._ensure_reaper()
+        return proc
+
+    # --------------------------------------------------
+    # STOP
+    # --------------------------------------------------
+    def _signal_group(self, mp: ManagedProcess, sig):
+        try:
+            if IS_WINDOWS:
+                if sig == signal.SIGTERM:
+                    mp.proc.send_signal(signal.CTRL_BREAK_EVENT)
+                else:
+                    subprocess.run(
+                        ["taskkill", "/T", "/F", "/PID", str(mp.pid)],
+                        stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL
+                    )
+            else:
+                os.killpg(mp.pid, sig)
+        except (ProcessLookupError, PermissionError, OSError):
+            pass
+
+    def _stop_process(self, mp: ManagedProcess):
+        self._signal_group(mp, signal.SIGTERM)
+
+        try:
+            mp.proc.wait(timeout=self.stop_grace)
+        except subprocess.TimeoutExpired:
+            pass
+
+        # The leader may be gone while children of the group linger, so always finish with a kill
+        self._signal_group(mp, signal.SIGKILL if not IS_WINDOWS else None)
+
+        try:
+            mp.proc.wait(timeout=self.stop_grace)
+        except subprocess.TimeoutExpired:
+            print(f"⚠️ Process {mp.pid} did not exit after SIGKILL")
+
+        # stdout / stderr are left open: the log pumps reading them see EOF
+        # now that the group is gone, and close them themselves
+
+        if mp.cgroup is not None:
+            try:
+                mp.cgroup.rmdir()
+            except OSError:
+                pass
+
+    def stop(self, project_id: str, name: str = None):
+        """
+        Stop one process of a preview, or the whole preview when name is None.
+        """
+        with self._lock:
+            procs = self._previews.get(project_id, {})
+            targets = [procs.pop(name)] if name in procs else []
+            if name is None:
+                targets = list(procs.values())
+                procs.clear()
+
+            if not procs:
+                self._previews.pop(project_id, None)
+                self._last_seen.pop(project_id, None)
+            if name is None:
+                self._holds.pop(project_id, None)      # repairs must not restart it
+
+        for mp in targets:
+            self._stop_process(mp)
+            print(f"🛑 Preview {project_id}: stopped {mp.name} (pid {mp.pid})")
+
+    def stop_all(self):
+        for project_id in self.project_ids():
+            self.stop(project_id)
+
+    # --------------------------------------------------
+    # STATE
+    # --------------------------------------------------
+    def touch(self, project_id: str):
+        with self._lock:
+            if project_id in self._previews:
+                self._last_seen[project_id] = time.time()
+
+    def hold(self, project_id: str) -> object:
+        """
+        Keep the reaper off a preview while it is being repaired (its
+        processes may exit meanwhile). Returns a token for release_hold.
+        """
+        token = object()
+        with self._lock:
+            self._holds.setdefault(project_id, set()).add(token)
+        return token
+
+    def release_hold(self, project_id: str, token) -> bool:
+        """
+        False when the preview was stopped while held.
+        """
+        with self._lock:
+            tokens = self._holds.get(project_id)
+            if not tokens or token not in tokens:
+                return False
+            tokens.discard(token)
+            if not tokens:
+                del self._holds[project_id]
+            return True
+
+    def is_held(self, project_id: str, token) -> bool:
+        with self._lock:
+            return token in self._holds.get(project_id, ())
+
+    def project_ids(self) -> list[str]:
+        with self._lock:
+            return list(self._previews)
+
+    def get(self, project_id: str, name: str) -> subprocess.Popen | None:
+        with self._lock:
+            mp = self._previews.get(project_id, {}).get(name)
+            return mp.proc if mp else None
+
+    def is_running(self, project_id: str) -> bool:
+        with self._lock:
+            procs = list(self._previews.get(project_id, {}).values())
+        return bool(procs) and all(mp.running for mp in procs)
+
+    def info(self, project_id: str) -> dict:
+        with self._lock:
+            procs = list(self._previews.get(project_id, {}).values())
+            last_seen = self._last_seen.get(project_id)
+        return {
+            "project_id": project_id,
+            "last_seen": last_seen,
+            "processes": [mp.info() for mp in procs]
+        }
+
+    # --------------------------------------------------
+    # REAPER
+    # --------------------------------------------------
+    def _ensure_reaper(self):
+        if self._reaper and self._reaper.is_alive():
+            return
+
+        self._reaper = threading.Thread(target=self._reap_loop, name="preview-reaper")
+        self._reaper.daemon = True
+        self._reaper.start()
+
+    def reap(self):
+        """
+        Stop previews whose processes crashed or that were idle too long.
+        """
+        now = time.time()
+        with self._lock:
+            candidates = [
+                (pid, list(procs.values()), self._last_seen.get(pid, now))
+                for pid, procs in self._previews.items()
+                if not self._holds.get(pid)
+            ]
+
+        for project_id, procs, last_seen in candidates:
+            reason = None
+            crashed = [mp for mp in procs if not mp.running]
+            if crashed:
+                reason = "crashed: " + ", ".join(
+                    f"{mp.name} exited {mp.proc.returncode}" for mp in crashed
+                )
+            elif self.idle_timeout and now - last_seen > self.idle_timeout:
+                reason = "idle"
+
+            if reason:
+                print(f"🧹 Reaping preview {project_id} ({reason})")
+                self.stop(project_id)
+                for fn in list(self.on_reaped):
+                    try:
+                        fn(project_id, reason)
+                    except Exception as e:
+                        print("❌ Reap callback failed:", e)
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.reap()
+            except Exception as e:
+                print("❌ Preview reaper error:", e)
+
+
+supervisor = PreviewSupervisor()
@@ -0,0 +1,220 @@
+"""
+In-memory model of a generated project.
+
+The nested `structure` JSON (folders with children, files with content)
+is turned into a tree once, with a path -> node index, and then shared by
+the debugger, the repair loop, the file saver and the preview. Building
+and walking are iterative, so deep trees do not hit the recursion limit.
+
+Hashes:
+- file: sha256 of the content (same as file_utils.content_hash)
+- subtree: sha256 over sorted (path, file hash) pairs, the same scheme as
+  file_utils.project_content_hash, cached until a file below changes
+"""
+import hashlib
+
+
+def _sha256(content: str) -> str:
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+class TreeNode:
+    __slots__ = ("name", "path", "is_file", "content", "children", "parent", "_hash")
+
+    def __init__(self, name, path, is_file, parent=None, content=None):
+        self.name = name
+        self.path = path
+        self.is_file = is_file
+        self.parent = parent
+        self.content = content if is_file else None
+        self.children = None if is_file else {}      # name -> TreeNode, insertion ordered
+        self._hash = None
+
+    @property
+    def hash(self) -> str:
+        """
+        Content hash for a file, subtree digest for a folder.
+        """
+        if self._hash is None:
+            if self.is_file:
+                self._hash = _sha256(self.content)
+            else:
+                digest = hashlib.sha256()
+                for node in sorted(self.iter_files(), key=lambda n: n.path):
+                    digest.update(f"{node.path}\0{node.hash}\n".encode("utf-8"))
+                self._hash = digest.hexdigest()
+        return self._hash
+
+    def iter_files(self):
+        """
+        Files below this node, depth first, in structure order.
+        """
+        if self.is_file:
+            yield self
+            return
+
+        stack = [iter(self.children.values())]
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+            elif node.is_file:
+                yield node
+            else:
+                stack.append(iter(node.children.values()))
+
+    def __repr__(self):
+        return f"<TreeNode {'file' if self.is_file else 'folder'} {self.path or '/'}>"
+
+
+class ProjectTree:
+
+    def __init__(self):
+        self.root = TreeNode("", "", is_file=False)
+        self.index = {"": self.root}        # path -> TreeNode (files and folders)
+
+    # ---------------------------------------
+    # BUILD
+    # ---------------------------------------
+    @classmethod
+    def from_structure(cls, structure: list) -> "ProjectTree":
+        tree = cls()
+        stack = [(tree.root, structure or [])]
+
+        while stack:
+            parent, nodes = stack.pop()
+            for raw in nodes:
+                node = tree._child(parent, raw["name"], raw["type"] == "file", raw.get("content") or "")
+                if not node.is_file:
+                    stack.append((node, raw.get("children") or []))
+
+        return tree
+
+    @classmethod
+    def from_files(cls, files) -> "ProjectTree":
+        """
+        From {path: content} or an iterable of {"path", "content", "hash"?}
+        dicts (iter_project_files); stored hashes are reused.
+        """
+        tree = cls()
+        if isinstance(files, dict):
+            for path, content in files.items():
+                tree.set_file(path, content)
+            return tree
+
+        for f in files:
+            node = tree.set_file(f["path"], f["content"])
+            node._hash = f.get("hash") or None
+        return tree
+
+    def _child(self, parent: TreeNode, name: str, is_file: bool, content: str = "") -> TreeNode:
+        node = parent.children.get(name)
+        if node is not None and node.is_file == is_file:
+            if is_file:
+                node.content = content
+            return node
+
+        path = f"{parent.path}/{name}" if parent.path else name
+        if node is not None:
+            # A file replaced by a folder or the other way round
+            self._unindex(node)
+
+        node = TreeNode(name, path, is_file, parent, content)
+        parent.children[name] = node
+        self.index[path] = node
+        return node
+
+    def _unindex(self, node: TreeNode):
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            self.index.pop(n.path, None)
+            if not n.is_file:
+                stack.extend(n.children.values())
+
+    def _invalidate(self, node: TreeNode):
+        while node is not None:
+            node._hash = None
+            node = node.parent
+
+    # ---------------------------------------
+    # EDIT
+    # ---------------------------------------
+    def set_file(self, path: str, content: str) -> TreeNode:
+        """
+        Create or overwrite a file, creating missing folders.
+        """
+        *folders, name = path.strip("/").split("/")
+        parent = self.root
+        for folder in folders:
+            parent = self._child(parent, folder, is_file=False)
+
+        node = self._child(parent, name, is_file=True, content=content or "")
+        self._invalidate(node)
+        return node
+
+    def remove(self, path: str) -> bool:
+        node = self.index.get(path.strip("/"))
+        if node is None or node is self.root:
+            return False
+        del node.parent.children[node.name]
+        self._unindex(node)
+        self._invalidate(node.parent)
+        return True
+
+    def copy(self) -> "ProjectTree":
+        return ProjectTree.from_structure(self.to_structure())
+
+    # ---------------------------------------
+    # READ
+    # ---------------------------------------
+    def get(self, path: str) -> TreeNode | None:
+        return self.index.get(path.strip("/"))
+
+    def __contains__(self, path: str) -> bool:
+        node = self.get(path)
+        return node is not None and node.is_file
+
+    def __len__(self) -> int:
+        return sum(1 for n in self.index.values() if n.is_file)
+
+    def iter_files(self, prefix: str = None):
+        """
+        File nodes of the whole project, or of one subtree ("frontend").
+        """
+        node = self.get(prefix) if prefix else self.root
+        return node.iter_files() if node is not None else iter(())
+
+    def files(self, prefix: str = None) -> dict:
+        return {n.path: n.content for n in self.iter_files(prefix)}
+
+    def hashes(self, prefix: str = None) -> dict:
+        return {n.path: n.hash for n in self.iter_files(prefix)}
+
+    def digest(self, prefix: str = None) -> str | None:
+        """
+        Subtree digest, equal to project_content_hash(project_id, prefix)
+        for the stored project.
+        """
+        node = self.get(prefix) if prefix else self.root
+        return node.hash if node is not None else None
+
+    # ---------------------------------------
+    # EXPORT
+    # ---------------------------------------
+    def to_structure(self) -> list:
+        """
+        Back to the nested `structure` JSON.
+        """
+        out = []
+        stack = [(self.root, out)]
+        while stack:
+            folder, target = stack.pop()
+            for node in folder.children.values():
+                if node.is_file:
+                    target.append({"type": "file", "name": node.name, "content": node.content})
+                else:
+                    entry = {"type": "folder", "name": node.name, "children": []}
+                    target.append(entry)
+                    stack.append((node, entry["children"]))
+        return out
@@ -0,0 +1,139 @@
+import gzip
+import hashlib
+import json
+import re
+from pathlib import Path
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+
+COMPRESS_MIN_SIZE = 1024   # bytes; smaller bodies are not worth the CPU
+FILE_CHUNK_SIZE = 64 * 1024
+
+RANGE_HEADER = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def make_etag(*parts) -> str:
+    """
+    Strong ETag from already-computed content hashes (or any strings).
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+
+    if header.strip() == "*":
+        return True
+
+    candidates = [c.strip().removeprefix("W/") for c in header.split(",")]
+    return etag in candidates
+
+
+def _negotiate_encoding(request: Request) -> str | None:
+    accepted = request.headers.get("accept-encoding", "")
+    encodings = {
+        part.split(";")[0].strip().lower()
+        for part in accepted.split(",")
+        if part.strip() and not part.strip().endswith("q=0")
+    }
+
+    if brotli is not None and "br" in encodings:
+        return "br"
+    if "gzip" in encodings:
+        return "gzip"
+    return None
+
+
+def json_response(request: Request, payload, etag: str = None, cache_control: str = "no-cache") -> Response:
+    """
+    JSON response with ETag / If-None-Match handling and
+    brotli or gzip compression negotiated from Accept-Encoding.
+    """
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if etag:
+        headers["ETag"] = etag
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+    body = json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode("utf-8")
+
+    encoding = _negotiate_encoding(request) if len(body) >= COMPRESS_MIN_SIZE else None
+    if encoding == "br":
+        body = brotli.compress(body, quality=5)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=6)
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _iter_file(path: Path, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(FILE_CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def file_range_response(request: Request, path: Path, media_type: str, headers: dict = None, etag: str = None):
+    """
+    Stream a file from disk, honouring a single-range Range header
+    (and If-Range) so interrupted downloads can resume.
+    """
+    size = path.stat().st_size
+    headers = {**(headers or {}), "Accept-Ranges": "bytes"}
+    if etag:
+        headers["ETag"] = etag
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and etag and if_range.strip() != etag:
+        range_header = None  # resource changed since the partial download
+
+    match = RANGE_HEADER.match(range_header.strip()) if range_header else None
+    if range_header and not match:
+        range_header = None  # multi-range or unknown unit: send everything
+
+    if match:
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(size - int(last or 0), 0)
+            end = size - 1
+
+        if start >= size or start > end:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            _iter_file(path, start, end - start + 1),
+            status_code=206,
+            media_type=media_type,
+            headers=headers
+        )
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(_iter_file(path, 0, size), media_type=media_type, headers=headers)
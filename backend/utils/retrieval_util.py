@@ -0,0 +1,269 @@
+"""
+Local retrieval over a project's files for grounding chat answers.
+
+Files are split into overlapping line chunks and scored with BM25 in
+NumPy (no embedding service). One index per project is kept in memory;
+file writes mark the changed paths dirty and only those files are
+re-chunked before the next query. Writes made by other workers are found
+through the file manifest's shared version (see cache_util).
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+from utils.file_utils import iter_project_files, file_manifest, add_files_listener
+from utils.cache_util import add_change_listener, manifest_cache
+
+
+CHUNK_LINES = int(os.getenv("RAG_CHUNK_LINES", 40))
+CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", 10))
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", 8))
+RAG_TOKEN_BUDGET = int(os.getenv("RAG_TOKEN_BUDGET", 3000))
+RAG_MAX_INDEXES = int(os.getenv("RAG_MAX_INDEXES", 32))   # projects kept in memory
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+MAX_FILE_SIZE = 200_000        # bigger files are usually generated / lock files
+SKIPPED_FILES = ("package-lock.json", "yarn.lock", "pnpm-lock.yaml")
+
+WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Identifiers count as a whole and by their camelCase / snake_case parts,
+    so "useAppData" matches questions about "app data".
+    """
+    tokens = []
+    for word in WORD.findall(text):
+        lower = word.lower()
+        tokens.append(lower)
+
+        parts = [p.lower() for part in word.split("_") for p in CAMEL.findall(part)]
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if len(p) > 1)
+    return tokens
+
+
+def chunk_file(path: str, content: str) -> list[dict]:
+    lines = content.splitlines()
+    step = max(CHUNK_LINES - CHUNK_OVERLAP, 1)
+
+    chunks = []
+    for start in range(0, max(len(lines), 1), step):
+        text = "\n".join(lines[start:start + CHUNK_LINES])
+        if text.strip():
+            chunks.append({
+                "path": path,
+                "start": start + 1,
+                "end": min(start + CHUNK_LINES, len(lines)),
+                "text": text,
+                # the path is searchable too ("the login page")
+                "tokens": tokenize(path) + tokenize(text)
+            })
+        if start + CHUNK_LINES >= len(lines):
+            break
+    return chunks
+
+
+# ---------------------------------------
+# INDEX
+# ---------------------------------------
+class ProjectIndex:
+    """
+    BM25 over the chunks of one project. Postings are stored term-major
+    (CSC-like): the chunks containing term t are
+    post_chunk[offsets[t]:offsets[t + 1]] with frequencies in post_tf.
+    """
+
+    def __init__(self, project_id: str):
+        self.project_id = project_id
+        self.files = {}           # path -> list of chunks
+        self.hashes = {}          # path -> content hash that was indexed
+        self.version = None       # manifest version the index is in sync with
+        self.dirty = None         # None: full load needed, else set of paths
+        self.lock = threading.Lock()
+        self._clear_arrays()
+
+    def _clear_arrays(self):
+        self.chunks = []
+        self.vocab = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.post_chunk = np.zeros(0, dtype=np.int32)
+        self.post_tf = np.zeros(0, dtype=np.float32)
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+
+    def mark_dirty(self, paths):
+        with self.lock:
+            if self.dirty is not None:
+                self.dirty.update(paths)
+
+    def _sync_version(self):
+        """
+        Another worker wrote files when the manifest version moved: compare
+        the stored hashes with the indexed ones and mark the differences.
+        """
+        version = manifest_cache.version(self.project_id)
+        if self.dirty is None or version == self.version:
+            return
+
+        stored = {m["path"]: m.get("hash") for m in file_manifest(self.project_id)}
+        self.dirty.update(p for p, h in stored.items() if self.hashes.get(p) != h)
+        self.dirty.update(set(self.hashes) - set(stored))
+        self.version = version
+
+    def _refresh(self):
+        self._sync_version()
+
+        if self.dirty is None:
+            self.files = {}
+            self.hashes = {}
+            self.version = manifest_cache.version(self.project_id)
+            loaded = iter_project_files(self.project_id)
+        elif self.dirty:
+            for path in self.dirty:
+                self.files.pop(path, None)
+                self.hashes.pop(path, None)
+            loaded = iter_project_files(self.project_id, paths=self.dirty)
+        else:
+            return
+
+        for f in loaded:
+            self.hashes[f["path"]] = f["hash"]
+            if f["path"].endswith(SKIPPED_FILES) or len(f["content"]) > MAX_FILE_SIZE:
+                continue
+            self.files[f["path"]] = chunk_file(f["path"], f["content"])
+
+        self.dirty = set()
+        self._build()
+
+    def _build(self):
+        self.chunks = [c for path in sorted(self.files) for c in self.files[path]]
+        if not self.chunks:
+            self._clear_arrays()
+            return
+
+        vocab = {}
+        rows, cols, counts = [], [], []
+        for i, chunk in enumerate(self.chunks):
+            terms, tf = np.unique(
+                np.array([vocab.setdefault(t, len(vocab)) for t in chunk["tokens"]], dtype=np.int64),
+                return_counts=True
+            )
+            rows.append(np.full(len(terms), i, dtype=np.int32))
+            cols.append(terms)
+            counts.append(tf)
+
+        rows = np.concatenate(rows)
+        cols = np.concatenate(cols)
+        counts = np.concatenate(counts).astype(np.float32)
+
+        order = np.argsort(cols, kind="stable")
+        df = np.bincount(cols, minlength=len(vocab))
+
+        n = len(self.chunks)
+        self.vocab = vocab
+        self.offsets = np.concatenate(([0], np.cumsum(df)))
+        self.post_chunk = rows[order]
+        self.post_tf = counts[order]
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self.doc_len = np.array([len(c["tokens"]) for c in self.chunks], dtype=np.float32)
+
+    def search(self, query: str, k: int = RAG_TOP_K) -> list[dict]:
+        with self.lock:
+            self._refresh()
+
+            term_ids = sorted({self.vocab[t] for t in tokenize(query) if t in self.vocab})
+            if not term_ids or not self.chunks:
+                return []
+
+            scores = np.zeros(len(self.chunks), dtype=np.float32)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len / self.doc_len.mean())
+
+            for t in term_ids:
+                lo, hi = self.offsets[t], self.offsets[t + 1]
+                docs = self.post_chunk[lo:hi]
+                tf = self.post_tf[lo:hi]
+                scores[docs] += self.idf[t] * tf * (BM25_K1 + 1) / (tf + norm[docs])
+
+            k = min(k, int(np.count_nonzero(scores)))
+            if k == 0:
+                return []
+
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [{**self.chunks[i], "score": float(scores[i])} for i in top]
+
+
+_INDEXES = OrderedDict()
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_index(project_id: str) -> ProjectIndex:
+    project_id = str(project_id)
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(project_id)
+        if index is None:
+            index = _INDEXES[project_id] = ProjectIndex(project_id)
+        _INDEXES.move_to_end(project_id)
+
+        while len(_INDEXES) > RAG_MAX_INDEXES:
+            _INDEXES.popitem(last=False)
+        return index
+
+
+@add_files_listener
+def _on_files_changed(project_id: str, paths):
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(project_id)
+    if index is not None:
+        index.mark_dirty(paths)
+
+
+@add_change_listener
+def _on_remote_change(coll: str, doc: dict):
+    """
+    Files written by other workers (CACHE_CHANGE_STREAM=1); without the
+    stream, _sync_version finds them on the next query.
+    """
+    if coll is None or (coll == "files" and not doc):
+        # interruption, or a delete (no document): rebuild on next use
+        with _INDEXES_LOCK:
+            _INDEXES.clear()
+    elif coll == "files" and "project_id" in doc and "path" in doc:
+        _on_files_changed(str(doc["project_id"]), [doc["path"]])
+
+
+# ---------------------------------------
+# CONTEXT
+# ---------------------------------------
+def retrieve_context(project_id: str, query: str, k: int = RAG_TOP_K, token_budget: int = RAG_TOKEN_BUDGET) -> str:
+    """
+    The top-k chunks for a query, best first, as long as they fit the budget.
+    Returns "" when nothing relevant was found.
+    """
+    try:
+        hits = get_index(project_id).search(query, k)
+    except Exception as e:
+        print("❌ Project retrieval failed:", e)
+        return ""
+
+    blocks = []
+    used = 0
+    for hit in hits:
+        block = f"--- {hit['path']} (lines {hit['start']}-{hit['end']}) ---\n{hit['text']}"
+        cost = estimate_tokens(block)
+        if used + cost > token_budget:
+            continue      # a smaller chunk further down may still fit
+        blocks.append(block)
+        used += cost
+
+    return "\n\n".join(blocks)
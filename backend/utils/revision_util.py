@@ -0,0 +1,246 @@
+import difflib
+import hashlib
+import json
+import os
+import zlib
+from datetime import datetime
+from bson import ObjectId, Binary
+from pymongo import DESCENDING, ASCENDING
+from pymongo.errors import DuplicateKeyError
+from utils.database_util import file_revisions_col
+
+
+# A full snapshot every N revisions bounds reconstruction to N-1 deltas
+SNAPSHOT_INTERVAL = int(os.getenv("REVISION_SNAPSHOT_INTERVAL", 20))
+KEEP_REVISIONS = int(os.getenv("REVISION_KEEP", 100))
+# Concurrent saves of one file race for the next rev (unique index): retry
+REVISION_SAVE_RETRIES = int(os.getenv("REVISION_SAVE_RETRIES", 5))
+
+
+class RevisionError(RuntimeError):
+    pass
+
+
+def _hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _pack(obj) -> Binary:
+    return Binary(zlib.compress(json.dumps(obj, separators=(",", ":")).encode("utf-8"), 6))
+
+
+def _unpack(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+# ---------------------------------------
+# LINE DELTAS
+# ---------------------------------------
+def make_delta(old: str, new: str) -> list:
+    """
+    Line-based delta: [0, i1, i2] copies old lines i1:i2, [1, text] inserts text.
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([0, i1, i2])
+        elif j2 > j1:
+            ops.append([1, "".join(new_lines[j1:j2])])
+    return ops
+
+
+def apply_delta(old: str, ops: list) -> str:
+    old_lines = old.splitlines(keepends=True)
+    out = []
+    for op in ops:
+        if op[0] == 0:
+            out.extend(old_lines[op[1]:op[2]])
+        else:
+            out.append(op[1])
+    return "".join(out)
+
+
+# ---------------------------------------
+# WRITE
+# ---------------------------------------
+def _query(project_id: str, path: str) -> dict:
+    return {"project_id": ObjectId(project_id), "path": path}
+
+
+def _latest(project_id: str, path: str):
+    return file_revisions_col.find_one(
+        _query(project_id, path),
+        {"rev": 1, "chain": 1, "hash": 1},
+        sort=[("rev", DESCENDING)]
+    )
+
+
+def _next_revision(project_id: str, path: str, content: str, digest: str, now: datetime):
+    """
+    The document for the revision after the current latest, or the latest
+    rev when content is unchanged.
+    """
+    latest = _latest(project_id, path)
+
+    if latest and latest.get("hash") == digest:
+        return latest["rev"]
+
+    doc = {
+        **_query(project_id, path),
+        "rev": (latest["rev"] + 1) if latest else 1,
+        "hash": digest,
+        "size": len(content.encode("utf-8")),
+        "created_at": now
+    }
+
+    chain = (latest.get("chain", 0) + 1) if latest else 0
+    if latest is None or chain >= SNAPSHOT_INTERVAL:
+        doc.update(kind="full", chain=0, data=Binary(zlib.compress(content.encode("utf-8"), 6)))
+    else:
+        previous = get_revision_content(project_id, path, latest["rev"])
+        doc.update(kind="delta", chain=chain, data=_pack(make_delta(previous, content)))
+
+    return doc
+
+
+def record_revision(project_id: str, path: str, content: str, now: datetime = None):
+    """
+    Append a revision for one file: a delta against the previous
+    revision, or a full snapshot every SNAPSHOT_INTERVAL revisions.
+    A concurrent save that took the same rev first makes us rebuild the
+    revision on top of it (the delta base changed too).
+    """
+    now = now or datetime.utcnow()
+    digest = _hash(content)
+
+    for _ in range(REVISION_SAVE_RETRIES):
+        doc = _next_revision(project_id, path, content, digest, now)
+        if not isinstance(doc, dict):
+            return doc
+
+        try:
+            file_revisions_col.insert_one(doc)
+            return doc["rev"]
+        except DuplicateKeyError:
+            continue
+
+    raise RevisionError(f"Could not record a revision for {path} after {REVISION_SAVE_RETRIES} concurrent saves")
+
+
+def record_revisions(project_id: str, files: dict):
+    """
+    files: {path: new content}. Every file is tried; failures are raised
+    together afterwards.
+    """
+    now = datetime.utcnow()
+    failed = {}
+    for path, content in files.items():
+        try:
+            record_revision(project_id, path, content, now)
+        except Exception as e:
+            failed[path] = e
+
+    if failed:
+        raise RevisionError("Failed to record revisions: " + "; ".join(f"{p}: {e}" for p, e in failed.items()))
+
+
+# ---------------------------------------
+# READ
+# ---------------------------------------
+def get_revision_content(project_id: str, path: str, rev: int) -> str | None:
+    """
+    Rebuild a revision: the nearest full snapshot at or below rev,
+    then every delta after it in order.
+    """
+    query = _query(project_id, path)
+    base = file_revisions_col.find_one(
+        {**query, "kind": "full", "rev": {"$lte": rev}},
+        sort=[("rev", DESCENDING)]
+    )
+    if base is None:
+        return None
+
+    content = zlib.decompress(base["data"]).decode("utf-8")
+    if base["rev"] == rev:
+        return content
+
+    deltas = file_revisions_col.find(
+        {**query, "rev": {"$gt": base["rev"], "$lte": rev}},
+        {"rev": 1, "kind": 1, "data": 1}
+    ).sort("rev", ASCENDING)
+
+    last = base["rev"]
+    for d in deltas:
+        if d["kind"] == "full":
+            content = zlib.decompress(d["data"]).decode("utf-8")
+        else:
+            content = apply_delta(content, _unpack(d["data"]))
+        last = d["rev"]
+
+    return content if last == rev else None
+
+
+def list_revisions(project_id: str, path: str) -> list[dict]:
+    return list(file_revisions_col.find(
+        _query(project_id, path),
+        {"_id": 0, "rev": 1, "kind": 1, "hash": 1, "size": 1, "created_at": 1}
+    ).sort("rev", ASCENDING))
+
+
+def diff_revisions(project_id: str, path: str, from_rev: int, to_rev: int) -> str | None:
+    old = get_revision_content(project_id, path, from_rev)
+    new = get_revision_content(project_id, path, to_rev)
+    if old is None or new is None:
+        return None
+
+    return "".join(difflib.unified_diff(
+        old.splitlines(keepends=True),
+        new.splitlines(keepends=True),
+        fromfile=f"{path}@{from_rev}",
+        tofile=f"{path}@{to_rev}"
+    ))
+
+
+# ---------------------------------------
+# COMPACTION
+# ---------------------------------------
+def compact_revisions(project_id: str, path: str = None, keep: int = KEEP_REVISIONS) -> int:
+    """
+    Drop revisions older than the last `keep` of each file. The oldest kept
+    revision is rewritten as a full snapshot so its chain stays readable.
+    Returns the number of removed revisions.
+    """
+    match = {"project_id": ObjectId(project_id)}
+    if path:
+        match["path"] = path
+
+    removed = 0
+    for group in file_revisions_col.aggregate([
+        {"$match": match},
+        {"$group": {"_id": "$path", "latest": {"$max": "$rev"}, "count": {"$sum": 1}}}
+    ]):
+        if group["count"] <= keep:
+            continue
+
+        file_path = group["_id"]
+        cutoff = group["latest"] - keep + 1
+        content = get_revision_content(project_id, file_path, cutoff)
+        if content is None:
+            continue
+
+        query = _query(project_id, file_path)
+        file_revisions_col.update_one(
+            {**query, "rev": cutoff},
+            {"$set": {
+                "kind": "full",
+                "chain": 0,
+                "data": Binary(zlib.compress(content.encode("utf-8"), 6))
+            }}
+        )
+        removed += file_revisions_col.delete_many({**query, "rev": {"$lt": cutoff}}).deleted_count
+
+    return removed
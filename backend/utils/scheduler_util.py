@@ -0,0 +1,258 @@
+"""
+Fair scheduler in front of every LLM call.
+
+Two lanes share the upstream slots:
+- interactive: chat replies, classification, titles
+- bulk: planning and project generation
+Bulk work may never take the last LLM_INTERACTIVE_RESERVED slots, and a
+free slot goes to interactive work first, so chat latency stays flat
+while generation saturates the upstream.
+
+Inside a lane, users are served by weighted fair queuing (start-time
+fair queuing on virtual time): one user's burst of requests is
+interleaved with everyone else's instead of running ahead of them.
+Per-user caps bound how many calls a single user has in flight.
+"""
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_INTERACTIVE_RESERVED = int(os.getenv("LLM_INTERACTIVE_RESERVED", 2))
+LLM_USER_MAX_INTERACTIVE = int(os.getenv("LLM_USER_MAX_INTERACTIVE", 2))
+LLM_USER_MAX_BULK = int(os.getenv("LLM_USER_MAX_BULK", 1))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 300))     # seconds
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = (INTERACTIVE, BULK)
+
+ANONYMOUS = "anonymous"
+
+# Set by the request handlers; inherited by helper threads that copy the context
+current_user = contextvars.ContextVar("current_user", default=ANONYMOUS)
+
+
+@contextmanager
+def user_context(user_id: str):
+    token = current_user.set(user_id or ANONYMOUS)
+    try:
+        yield
+    finally:
+        current_user.reset(token)
+
+
+class _Ticket:
+    __slots__ = ("user", "lane", "cost", "start_tag", "finish_tag", "seq", "enqueued_at", "granted")
+
+    def __init__(self, user, lane, cost, seq):
+        self.user = user
+        self.lane = lane
+        self.cost = cost
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.granted = threading.Event()
+        self.start_tag = 0.0
+        self.finish_tag = 0.0
+
+
+class _Lane:
+    def __init__(self, name, per_user_limit):
+        self.name = name
+        self.per_user_limit = per_user_limit
+        self.virtual_time = 0.0
+        self.queues = defaultdict(deque)          # user -> tickets in arrival order
+        self.last_finish = defaultdict(float)     # user -> finish tag of last ticket
+        self.running = defaultdict(int)           # user -> calls in flight
+        self.running_total = 0
+        self.queued_total = 0
+        self.granted_total = 0
+        self.waits = deque(maxlen=1000)           # recent queue waits (seconds)
+
+
+class FairScheduler:
+
+    def __init__(self, capacity=LLM_MAX_CONCURRENCY, interactive_reserved=LLM_INTERACTIVE_RESERVED):
+        self.capacity = capacity
+        self.interactive_reserved = min(interactive_reserved, capacity - 1)
+        self.lanes = {
+            INTERACTIVE: _Lane(INTERACTIVE, LLM_USER_MAX_INTERACTIVE),
+            BULK: _Lane(BULK, LLM_USER_MAX_BULK),
+        }
+        self.weights = {}                 # user -> weight (default 1)
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def set_user_weight(self, user: str, weight: float):
+        with self._lock:
+            self.weights[user] = max(weight, 0.01)
+
+    # ---------------------------------------
+    # DISPATCH
+    # ---------------------------------------
+    def _running(self) -> int:
+        return sum(lane.running_total for lane in self.lanes.values())
+
+    def _lane_has_room(self, lane: _Lane) -> bool:
+        running = self._running()
+        if running >= self.capacity:
+            return False
+        if lane.name == BULK:
+            return lane.running_total < self.capacity - self.interactive_reserved
+        return True
+
+    def _pick(self, lane: _Lane):
+        """
+        Head ticket with the smallest start tag among users under their cap.
+        """
+        candidates = [
+            (q[0].start_tag, q[0].seq, user)
+            for user, q in lane.queues.items()
+            if q and lane.running.get(user, 0) < lane.per_user_limit
+        ]
+        if not candidates:
+            return None
+
+        _, _, user = heapq.nsmallest(1, candidates)[0]
+        ticket = lane.queues[user].popleft()
+        if not lane.queues[user]:
+            del lane.queues[user]
+        return ticket
+
+    def _dispatch(self):
+        # Interactive first: a freed slot always goes to a waiting chat call
+        for lane in (self.lanes[INTERACTIVE], self.lanes[BULK]):
+            while lane.queued_total and self._lane_has_room(lane):
+                ticket = self._pick(lane)
+                if ticket is None:
+                    break
+
+                lane.queued_total -= 1
+                lane.running[ticket.user] += 1
+                lane.running_total += 1
+                lane.granted_total += 1
+                lane.virtual_time = max(lane.virtual_time, ticket.start_tag)
+                lane.waits.append(time.monotonic() - ticket.enqueued_at)
+                ticket.granted.set()
+
+    # ---------------------------------------
+    # ACQUIRE / RELEASE
+    # ---------------------------------------
+    def acquire(self, lane: str = INTERACTIVE, cost: float = 1.0, user: str = None, timeout: float = LLM_QUEUE_TIMEOUT) -> _Ticket:
+        user = user or current_user.get()
+
+        with self._lock:
+            q = self.lanes[lane]
+            ticket = _Ticket(user, lane, cost, next(self._seq))
+
+            # SFQ tags: start where the user left off, or at the lane's clock
+            ticket.start_tag = max(q.virtual_time, q.last_finish[user])
+            ticket.finish_tag = ticket.start_tag + cost / self.weights.get(user, 1.0)
+            q.last_finish[user] = ticket.finish_tag
+
+            q.queues[user].append(ticket)
+            q.queued_total += 1
+            self._dispatch()
+
+        if ticket.granted.wait(timeout):
+            return ticket
+
+        with self._lock:
+            if ticket.granted.is_set():     # granted while timing out
+                return ticket
+            q.queues[user].remove(ticket)
+            if not q.queues[user]:
+                del q.queues[user]
+            q.queued_total -= 1
+
+        raise TimeoutError(f"LLM queue wait exceeded {timeout}s ({lane} lane)")
+
+    def try_acquire(self, lane: str = INTERACTIVE, cost: float = 1.0, user: str = None) -> _Ticket | None:
+        """
+        A slot right now or None; never queues. For hedged duplicates: they
+        only run on spare capacity, ahead of nobody, and may go over the
+        user's cap (their primary already holds the user's slot).
+        """
+        user = user or current_user.get()
+
+        with self._lock:
+            q = self.lanes[lane]
+            if q.queued_total or not self._lane_has_room(q):
+                return None
+
+            ticket = _Ticket(user, lane, cost, next(self._seq))
+            ticket.start_tag = ticket.finish_tag = q.virtual_time
+            q.running[user] += 1
+            q.running_total += 1
+            q.granted_total += 1
+            ticket.granted.set()
+            return ticket
+
+    def has_room(self, lane: str = INTERACTIVE) -> bool:
+        """
+        Whether try_acquire would succeed right now.
+        """
+        with self._lock:
+            q = self.lanes[lane]
+            return not q.queued_total and self._lane_has_room(q)
+
+    def release(self, ticket: _Ticket):
+        with self._lock:
+            q = self.lanes[ticket.lane]
+            q.running[ticket.user] -= 1
+            if q.running[ticket.user] <= 0:
+                del q.running[ticket.user]
+            q.running_total -= 1
+
+            # Idle lane: forget old tags so a returning user is not penalised
+            if not q.running_total and not q.queued_total:
+                q.last_finish.clear()
+                q.virtual_time = 0.0
+
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, lane: str = INTERACTIVE, cost: float = 1.0, user: str = None):
+        """
+        Hold one upstream slot for the duration of the block
+        (a single call, or a whole streamed response).
+        """
+        ticket = self.acquire(lane, cost, user)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    # ---------------------------------------
+    # METRICS
+    # ---------------------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            lanes = {}
+            for name, q in self.lanes.items():
+                waits = sorted(q.waits)
+                lanes[name] = {
+                    "queued": q.queued_total,
+                    "running": q.running_total,
+                    "granted": q.granted_total,
+                    "queued_by_user": {u: len(t) for u, t in q.queues.items()},
+                    "running_by_user": dict(q.running),
+                    "wait_p50": round(waits[len(waits) // 2], 3) if waits else None,
+                    "wait_p99": round(waits[int(len(waits) * 0.99)], 3) if waits else None,
+                }
+
+            return {
+                "capacity": self.capacity,
+                "interactive_reserved": self.interactive_reserved,
+                "running": self._running(),
+                "lanes": lanes
+            }
+
+
+scheduler = FairScheduler()
@@ -0,0 +1,464 @@
+"""
+Per-user search over project files (trigram index) and chat messages
+(Mongo text index). Both indexes are maintained on write by save_files /
+save_file and by the message writer. The message index keeps only the
+distinct terms of each message; snippets come from the stored (possibly
+compressed) message.
+
+User regexes run in a separate process with a time limit, so a
+catastrophically backtracking pattern cannot hang a request thread.
+
+Backfill existing data (from backend/), which also replaces a full-text
+message index from older versions:
+    python -m utils.search_util
+"""
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from bson import ObjectId
+from pymongo import UpdateOne
+from utils.database_util import (
+    ensure_indexes,
+    chats_col,
+    projects_col,
+    files_col,
+    messages_col,
+    message_buckets_col,
+    search_code_col,
+    search_messages_col
+)
+from utils.codec_util import decode_text
+
+
+MIN_QUERY_GRAMS = 1          # a query needs at least one trigram (3 chars)
+MAX_QUERY_GRAMS = 16         # enough to be selective without a huge $all
+MAX_MATCHES_PER_FILE = 5
+MAX_TERM_LENGTH = 40         # longer "words" are hashes / base64, not search terms
+SNIPPET_LENGTH = 300
+
+TERM = re.compile(r"\w+")
+
+MAX_REGEX_LENGTH = int(os.getenv("SEARCH_MAX_REGEX_LENGTH", 200))
+SEARCH_REGEX_TIMEOUT = float(os.getenv("SEARCH_REGEX_TIMEOUT", 2))       # seconds per request
+SEARCH_REGEX_WORKERS = int(os.getenv("SEARCH_REGEX_WORKERS", 2))
+SEARCH_BATCH_SIZE = int(os.getenv("SEARCH_BATCH_SIZE", 50))             # candidate files per read
+
+
+class SearchTimeout(ValueError):
+    pass
+
+
+# ---------------------------------------
+# OWNERSHIP
+# ---------------------------------------
+@lru_cache(maxsize=4096)
+def _project_owner(project_id: str) -> str | None:
+    p = projects_col.find_one({"_id": ObjectId(project_id)}, {"user_id": 1})
+    return p["user_id"] if p else None
+
+
+@lru_cache(maxsize=4096)
+def _chat_owner(chat_id: str) -> str | None:
+    c = chats_col.find_one({"_id": ObjectId(chat_id)}, {"user_id": 1})
+    return c["user_id"] if c else None
+
+
+# ---------------------------------------
+# TRIGRAMS
+# ---------------------------------------
+def trigrams(text: str) -> set[str]:
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def terms(text: str) -> list[str]:
+    """
+    Distinct words of a message, for the text index.
+    """
+    return sorted({t for t in TERM.findall(text.lower()) if len(t) <= MAX_TERM_LENGTH})
+
+
+def _query_literals(q: str, regex: bool) -> list[str]:
+    """
+    Literal runs every match must contain. For regexes this is conservative:
+    anything inside groups or classes, or made optional by ?, * or {,
+    is not required; alternations give up on pruning.
+    """
+    if not regex:
+        return [q]
+
+    literals = []
+    run = ""
+    depth = 0
+    i = 0
+
+    while i < len(q):
+        ch = q[i]
+
+        if ch == "\\":
+            escaped = q[i + 1:i + 2]
+            if escaped and not escaped.isalnum() and depth == 0:
+                run += escaped                  # \. \( ... are literal characters
+            else:
+                literals.append(run)            # \d \w \b ... are classes
+                run = ""
+            i += 2
+            continue
+
+        if ch == "|":
+            return []
+        if ch in "?*{":
+            run = run[:-1]                      # previous char is optional
+        if ch == "[":
+            i = q.find("]", i + 2) if q.find("]", i + 2) != -1 else len(q)
+        if ch == "{":
+            i = q.find("}", i) if q.find("}", i) != -1 else len(q)
+        if ch == "(":
+            depth += 1
+        if ch == ")":
+            depth = max(depth - 1, 0)
+
+        if ch in ".^$*+?{}[]()":
+            literals.append(run)
+            run = ""
+        elif depth == 0:
+            run += ch
+
+        i += 1
+
+    literals.append(run)
+    return [literal for literal in literals if len(literal) >= 3]
+
+
+def _query_grams(q: str, regex: bool) -> list[str]:
+    grams = set()
+    for literal in _query_literals(q, regex):
+        grams |= trigrams(literal)
+
+    # Spread the picks over the query rather than taking a prefix
+    ordered = sorted(grams)
+    step = max(1, len(ordered) // MAX_QUERY_GRAMS)
+    return ordered[::step][:MAX_QUERY_GRAMS]
+
+
+# ---------------------------------------
+# INDEX MAINTENANCE
+# ---------------------------------------
+def index_files(project_id: str, files: dict):
+    """
+    files: {path: content}. Replaces the trigram entries of those files.
+    """
+    try:
+        user_id = _project_owner(str(project_id))
+        if not user_id or not files:
+            return
+
+        search_code_col.bulk_write([
+            UpdateOne(
+                {"project_id": ObjectId(project_id), "path": path},
+                {"$set": {"user_id": user_id, "grams": sorted(trigrams(content))}},
+                upsert=True
+            )
+            for path, content in files.items()
+        ], ordered=False)
+    except Exception as e:
+        print("❌ Code search indexing failed:", e)
+
+
+def index_messages(batch):
+    """
+    batch: [(chat_id, message doc)] with possibly encoded content.
+    """
+    try:
+        docs = []
+        for chat_id, msg in batch:
+            user_id = _chat_owner(chat_id)
+            if not user_id:
+                continue
+            docs.append({
+                "_id": msg["_id"],
+                "user_id": user_id,
+                "chat_id": chat_id,
+                "role": msg["role"],
+                "agent": msg.get("agent"),
+                "terms": terms(decode_text(msg["content"], msg.get("content_codec"))),
+                "created_at": msg["created_at"]
+            })
+
+        if docs:
+            search_messages_col.bulk_write([
+                UpdateOne({"_id": d["_id"]}, {"$set": d}, upsert=True) for d in docs
+            ], ordered=False)
+    except Exception as e:
+        print("❌ Message search indexing failed:", e)
+
+
+# ---------------------------------------
+# MATCHING
+# ---------------------------------------
+def _matcher(q: str, regex: bool):
+    if regex:
+        return re.compile(q, re.IGNORECASE)
+    return re.compile(re.escape(q), re.IGNORECASE)
+
+
+def _match_files(q: str, regex: bool, docs: list) -> list:
+    """
+    docs: [(key, content)] -> [(key, matches)] for files with a match.
+    """
+    matcher = _matcher(q, regex)
+    out = []
+    for key, content in docs:
+        matches = []
+        for lineno, line in enumerate(content.splitlines(), start=1):
+            if matcher.search(line):
+                matches.append({"line": lineno, "text": line.strip()[:300]})
+                if len(matches) >= MAX_MATCHES_PER_FILE:
+                    break
+        if matches:
+            out.append((key, matches))
+    return out
+
+
+_regex_pool = None
+_regex_pool_lock = threading.Lock()
+
+
+def _get_regex_pool() -> ProcessPoolExecutor:
+    global _regex_pool
+    with _regex_pool_lock:
+        if _regex_pool is None:
+            _regex_pool = ProcessPoolExecutor(
+                max_workers=SEARCH_REGEX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _regex_pool
+
+
+def _kill_regex_pool(pool: ProcessPoolExecutor):
+    """
+    A worker stuck in a backtracking regex cannot be cancelled: kill the
+    pool. Later searches get a fresh one.
+    """
+    global _regex_pool
+    with _regex_pool_lock:
+        if _regex_pool is pool:
+            _regex_pool = None
+    for proc in list((getattr(pool, "_processes", None) or {}).values()):
+        proc.kill()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _match_regex(q: str, docs: list, deadline: float) -> list:
+    # A second try: the pool may be killed for another request's regex
+    for attempt in range(2):
+        pool = _get_regex_pool()
+        try:
+            future = pool.submit(_match_files, q, True, docs)
+            return future.result(timeout=max(deadline - time.monotonic(), 0.01))
+        except FutureTimeout:
+            _kill_regex_pool(pool)
+            raise SearchTimeout(f"Regex search took longer than {SEARCH_REGEX_TIMEOUT:g}s")
+        except (BrokenProcessPool, CancelledError, RuntimeError) as e:
+            # RuntimeError: submitted to a pool that was shut down meanwhile
+            _kill_regex_pool(pool)
+            if attempt or time.monotonic() >= deadline:
+                raise SearchTimeout(f"Regex search was interrupted: {e or type(e).__name__}")
+
+
+def shutdown_search_pool():
+    global _regex_pool
+    with _regex_pool_lock:
+        if _regex_pool is not None:
+            _regex_pool.shutdown(wait=False, cancel_futures=True)
+            _regex_pool = None
+
+
+# ---------------------------------------
+# QUERIES
+# ---------------------------------------
+def _read_candidates(batch: list) -> list:
+    """
+    Contents of a batch of index entries in one query:
+    [((project_id, path), content)] in batch order.
+    """
+    by_project = {}
+    for c in batch:
+        by_project.setdefault(c["project_id"], []).append(c["path"])
+
+    found = {
+        (f["project_id"], f["path"]): decode_text(f.get("content", ""), f.get("content_codec"))
+        for f in files_col.find(
+            {"$or": [{"project_id": pid, "path": {"$in": paths}} for pid, paths in by_project.items()]},
+            {"project_id": 1, "path": 1, "content": 1, "content_codec": 1}
+        )
+    }
+
+    keys = [(c["project_id"], c["path"]) for c in batch]
+    return [(key, found[key]) for key in keys if key in found]
+
+
+def search_code(user_id: str, q: str, regex: bool = False, page: int = 1, page_size: int = 20) -> dict:
+    """
+    Trigram lookup narrows the candidate files; only candidates are read
+    (in batches) and matched. Raises ValueError for queries the index
+    cannot narrow down, re.error for invalid regexes and SearchTimeout
+    when a regex runs too long.
+    """
+    if regex and len(q) > MAX_REGEX_LENGTH:
+        raise ValueError(f"Regex longer than {MAX_REGEX_LENGTH} characters")
+
+    _matcher(q, regex)          # invalid patterns fail here, before any reads
+    grams = _query_grams(q, regex)
+    if len(grams) < MIN_QUERY_GRAMS:
+        raise ValueError("Code search needs at least 3 literal characters")
+
+    candidates = search_code_col.find(
+        {"user_id": user_id, "grams": {"$all": grams}},
+        {"project_id": 1, "path": 1}
+    ).sort([("project_id", 1), ("path", 1)]).batch_size(SEARCH_BATCH_SIZE)
+
+    deadline = time.monotonic() + SEARCH_REGEX_TIMEOUT
+    skip = (page - 1) * page_size
+    results = []
+    has_more = False
+    batch = []
+
+    def consume(batch) -> bool:
+        nonlocal skip, has_more
+        docs = _read_candidates(batch)
+        if regex:
+            matched = _match_regex(q, docs, deadline)
+        else:
+            matched = _match_files(q, False, docs)
+
+        # Files without matches are trigram false positives
+        for (project_id, path), matches in matched:
+            if skip:
+                skip -= 1
+                continue
+            if len(results) == page_size:
+                has_more = True
+                return False
+            results.append({"project_id": str(project_id), "path": path, "matches": matches})
+        return True
+
+    for c in candidates:
+        batch.append(c)
+        if len(batch) >= SEARCH_BATCH_SIZE:
+            if not consume(batch):
+                break
+            batch = []
+    else:
+        if batch:
+            consume(batch)
+
+    return {"page": page, "page_size": page_size, "has_more": has_more, "results": results}
+
+
+def search_messages(user_id: str, q: str, page: int = 1, page_size: int = 20) -> dict:
+    """
+    Ranked full-text search over the user's chat messages.
+    """
+    cursor = search_messages_col.find(
+        {"user_id": user_id, "$text": {"$search": q}},
+        {"score": {"$meta": "textScore"}, "chat_id": 1, "role": 1, "agent": 1, "created_at": 1}
+    ).sort([("score", {"$meta": "textScore"})]).skip((page - 1) * page_size).limit(page_size + 1)
+
+    hits = list(cursor)
+    snippets = _message_snippets([m["_id"] for m in hits[:page_size]])
+
+    results = []
+    for m in hits:
+        results.append({
+            "message_id": str(m["_id"]),
+            "chat_id": m["chat_id"],
+            "role": m["role"],
+            "agent": m.get("agent"),
+            "score": m["score"],
+            "snippet": snippets.get(m["_id"], ""),
+            "created_at": m["created_at"]
+        })
+
+    return {
+        "page": page,
+        "page_size": page_size,
+        "has_more": len(results) > page_size,
+        "results": results[:page_size]
+    }
+
+
+def _message_snippets(ids: list) -> dict:
+    """
+    _id -> snippet for one page of hits: flat messages first, then the
+    buckets holding the rest (one read each way).
+    """
+    if not ids:
+        return {}
+
+    found = {}
+    for m in messages_col.find({"_id": {"$in": ids}}, {"content": 1, "content_codec": 1}):
+        found[m["_id"]] = m
+
+    missing = [i for i in ids if i not in found]
+    if missing:
+        wanted = set(missing)
+        for bucket in message_buckets_col.find({"messages._id": {"$in": missing}}, {"messages": 1}):
+            for m in bucket.get("messages", []):
+                if m["_id"] in wanted:
+                    found[m["_id"]] = m
+
+    return {
+        _id: decode_text(m.get("content", ""), m.get("content_codec"))[:SNIPPET_LENGTH]
+        for _id, m in found.items()
+    }
+
+
+# ---------------------------------------
+# BACKFILL
+# ---------------------------------------
+def _drop_full_text_index():
+    """
+    Older versions indexed (and stored) the full message text.
+    """
+    for name, info in search_messages_col.index_information().items():
+        if "text" in info.get("weights", {}):
+            search_messages_col.drop_index(name)
+            print(f"🧹 Dropped full-text message index {name}")
+    search_messages_col.update_many({"text": {"$exists": True}}, {"$unset": {"text": ""}})
+
+
+def rebuild_search_index():
+    _drop_full_text_index()
+    ensure_indexes()
+
+    projects = 0
+    for p in projects_col.find({}, {"_id": 1}):
+        files = {
+            f["path"]: decode_text(f.get("content", ""), f.get("content_codec"))
+            for f in files_col.find({"project_id": p["_id"]}, {"path": 1, "content": 1, "content_codec": 1})
+        }
+        index_files(str(p["_id"]), files)
+        projects += 1
+
+    batch = []
+    for m in messages_col.find({}):
+        batch.append((m["chat_id"], m))
+        if len(batch) >= 500:
+            index_messages(batch)
+            batch = []
+    index_messages(batch)
+
+    for bucket in message_buckets_col.find({}):
+        index_messages([(bucket["chat_id"], m) for m in bucket.get("messages", [])])
+
+    print(f"✅ Search index rebuilt for {projects} project(s)")
+
+
+if __name__ == "__main__":
+    rebuild_search_index()
@@ -0,0 +1,166 @@
+"""
+Speculative planning (SPECULATIVE_PLANNER=1).
+
+When a message looks like a project request, the planner starts right
+away, concurrently with the title and classifier calls. If the
+classifier agrees, the plan is done or on its way; if not, the
+speculative run is cancelled or its result discarded.
+
+Hit rate and wasted tokens are tracked so SPECULATIVE_THRESHOLD can be
+tuned from /speculation/stats.
+"""
+import contextvars
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+SPECULATIVE_PLANNER = os.getenv("SPECULATIVE_PLANNER", "0") == "1"
+SPECULATIVE_THRESHOLD = float(os.getenv("SPECULATIVE_THRESHOLD", 0.5))
+SPECULATIVE_WORKERS = int(os.getenv("SPECULATIVE_WORKERS", 4))
+
+# (pattern, weight): cheap local signals of a "build me X" message
+PROJECT_SIGNALS = [
+    (re.compile(r"\b(build|create|make|generate|develop|scaffold|implement)\b", re.I), 0.35),
+    (re.compile(r"\b(app|application|website|web ?site|dashboard|platform|tool|clone|portal|page|store|shop|blog|game|portfolio|api|backend|frontend)\b", re.I), 0.3),
+    (re.compile(r"\b(react|fastapi|mongo(db)?|full[- ]?stack|crud|login|auth|todo|e-?commerce|landing page)\b", re.I), 0.2),
+    (re.compile(r"\b(with|that has|featuring|including)\b", re.I), 0.05),
+    (re.compile(r"^\s*(i want|i need|can you|please|let'?s)\b", re.I), 0.1),
+]
+CONVERSATION_SIGNALS = [
+    (re.compile(r"\?\s*$"), 0.25),
+    (re.compile(r"^\s*(what|why|how|where|when|which|who|explain|is|are|does|do|can i)\b", re.I), 0.25),
+    (re.compile(r"\b(change|fix|update|rename|modify|this|it|the code|error|bug)\b", re.I), 0.15),
+]
+
+
+def project_likelihood(message: str) -> float:
+    """
+    Heuristic score in [0, 1] that a message is a new project request.
+    """
+    score = sum(w for pattern, w in PROJECT_SIGNALS if pattern.search(message))
+    score -= sum(w for pattern, w in CONVERSATION_SIGNALS if pattern.search(message))
+    if len(message.split()) < 4:
+        score -= 0.2
+    return min(max(score, 0.0), 1.0)
+
+
+class Speculation:
+    __slots__ = ("future", "planner", "score", "started_at")
+
+    def __init__(self, future, planner, score):
+        self.future = future
+        self.planner = planner
+        self.score = score
+        self.started_at = time.monotonic()
+
+
+class SpeculativePlanner:
+
+    def __init__(self, planner_factory, threshold=SPECULATIVE_THRESHOLD, enabled=SPECULATIVE_PLANNER):
+        self.planner_factory = planner_factory
+        self.threshold = threshold
+        self.enabled = enabled
+        self._executor = None
+        self._lock = threading.Lock()
+
+        self.started = 0
+        self.skipped = 0
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+        self.unspeculated = 0         # projects that scored below the threshold
+        self.wasted_tokens = 0
+        self.saved_seconds = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=SPECULATIVE_WORKERS,
+                    thread_name_prefix="speculative-planner"
+                )
+            return self._executor
+
+    def start(self, message: str) -> Speculation | None:
+        if not self.enabled:
+            return None
+
+        score = project_likelihood(message)
+        if score < self.threshold:
+            with self._lock:
+                self.skipped += 1
+            return None
+
+        planner = self.planner_factory()
+        # Copy the context so the planner's LLM call is queued under the same user
+        ctx = contextvars.copy_context()
+        future = self._get_executor().submit(ctx.run, planner.plan, message)
+
+        with self._lock:
+            self.started += 1
+        print(f"🔮 Speculative planner started (score {score:.2f})")
+        return Speculation(future, planner, score)
+
+    def resolve(self, spec: Speculation | None, is_project: bool) -> dict | None:
+        """
+        The speculative plan when the classifier said "project" (waits for
+        it if still running), otherwise None after cancelling/discarding it.
+        """
+        if spec is None:
+            if self.enabled and is_project:
+                with self._lock:
+                    self.unspeculated += 1
+            return None
+
+        if not is_project:
+            if spec.future.cancel():
+                with self._lock:
+                    self.misses += 1
+                    self.cancelled += 1
+                return None
+
+            # Already running: cannot be interrupted, count its tokens once done
+            spec.future.add_done_callback(lambda _: self._record_waste(spec))
+            with self._lock:
+                self.misses += 1
+            return None
+
+        waited_from = time.monotonic()
+        try:
+            plan = spec.future.result()
+        except Exception as e:
+            print("⚠️ Speculative plan failed, planning again:", e)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            # Upper bound: planner time overlapped with title + classification
+            self.saved_seconds += max(waited_from - spec.started_at, 0.0)
+        return plan
+
+    def _record_waste(self, spec: Speculation):
+        tokens = getattr(spec.planner, "last_token_count", 0) or 0
+        with self._lock:
+            self.wasted_tokens += tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            resolved = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "started": self.started,
+                "skipped": self.skipped,
+                "hits": self.hits,
+                "misses": self.misses,
+                "cancelled_before_start": self.cancelled,
+                "unspeculated_projects": self.unspeculated,
+                "hit_rate": round(self.hits / resolved, 4) if resolved else None,
+                "wasted_tokens": self.wasted_tokens,
+                "saved_seconds": round(self.saved_seconds, 2)
+            }
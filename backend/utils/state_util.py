@@ -0,0 +1,270 @@
+"""
+Shared runtime state for running several workers / hosts.
+
+Everything that more than one worker must agree on (which preview runs
+where, who is building what) lives in the runtime_state collection
+instead of module globals:
+
+- put/get/delete: plain documents with an optional expiry
+- acquire/renew/release: leases, i.e. documents owned by one worker
+  until they expire. A heartbeat thread renews the leases a worker holds;
+  if a worker dies its leases simply run out and others may take over.
+- request_release: ask the current owner to give a lease up; the owner
+  sees it on its next heartbeat and its on_lost callback runs.
+- annotate: any worker may set data fields on a document it does not
+  own (e.g. "last used"); the owner reads them in on_renew.
+- bump/version: a version token per key, for caches that check on read
+  whether another worker changed what they hold. The documents expire
+  (ttl); a recreated one gets a new token, never an old value again.
+
+Document: {_id: key, owner, expires_at, data, release_requested, updated_at, version}
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from utils.database_util import runtime_state_col
+
+
+STATE_LEASE_TTL = float(os.getenv("STATE_LEASE_TTL", 30))              # seconds
+STATE_HEARTBEAT_INTERVAL = float(os.getenv("STATE_HEARTBEAT_INTERVAL", 10))
+
+# Unique per process: several gunicorn workers share host and may share a pid namespace
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def _now():
+    return datetime.utcnow()
+
+
+class StateStore:
+
+    def __init__(self, col, worker_id=WORKER_ID, heartbeat_interval=STATE_HEARTBEAT_INTERVAL):
+        self.col = col
+        self.worker_id = worker_id
+        self.heartbeat_interval = heartbeat_interval
+
+        self._held = {}          # key -> (ttl, on_lost, on_renew)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    # ---------------------------------------
+    # PLAIN STATE
+    # ---------------------------------------
+    def get(self, key: str) -> dict | None:
+        """
+        The document for key, or None when missing or expired.
+        """
+        doc = self.col.find_one({"_id": key})
+        if doc is None:
+            return None
+        if doc.get("expires_at") and doc["expires_at"] < _now():
+            return None
+        return doc
+
+    def data(self, key: str) -> dict | None:
+        doc = self.get(key)
+        return doc.get("data") if doc else None
+
+    def put(self, key: str, data: dict, ttl: float = None):
+        self.col.update_one(
+            {"_id": key},
+            {"$set": {
+                "data": data,
+                "expires_at": _now() + timedelta(seconds=ttl) if ttl else None,
+                "updated_at": _now()
+            }},
+            upsert=True
+        )
+
+    def delete(self, key: str):
+        self.col.delete_one({"_id": key})
+
+    # ---------------------------------------
+    # VERSIONS
+    # ---------------------------------------
+    def bump(self, key: str, ttl: float = None) -> str:
+        """
+        Give key a new version. With ttl the document is cleaned up once
+        nobody bumped it for that long (see the runtime_state TTL index).
+        """
+        version = uuid.uuid4().hex
+        self.col.update_one(
+            {"_id": key},
+            {"$set": {
+                "version": version,
+                "expires_at": _now() + timedelta(seconds=ttl) if ttl else None
+            }},
+            upsert=True
+        )
+        return version
+
+    def version(self, key: str):
+        """
+        Current version of key; 0 when it was never bumped (or expired).
+        """
+        doc = self.col.find_one({"_id": key}, {"version": 1})
+        return doc.get("version", 0) if doc else 0
+
+    # ---------------------------------------
+    # LEASES
+    # ---------------------------------------
+    def acquire(self, key: str, ttl: float = STATE_LEASE_TTL, data: dict = None) -> bool:
+        """
+        Take the lease if it is free, expired or already ours.
+        """
+        now = _now()
+        try:
+            self.col.find_one_and_update(
+                {"_id": key, "$or": [
+                    {"owner": self.worker_id},
+                    {"owner": None},
+                    {"expires_at": {"$lt": now}}
+                ]},
+                {"$set": {
+                    "owner": self.worker_id,
+                    "expires_at": now + timedelta(seconds=ttl),
+                    "data": data or {},
+                    "release_requested": False,
+                    "updated_at": now
+                }},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # Held by someone else: the upsert tried to insert an existing _id
+            return False
+
+    def renew(self, key: str, ttl: float = STATE_LEASE_TTL) -> dict | None:
+        """
+        Extend our lease. Returns the document, or None if it was lost.
+        """
+        return self.col.find_one_and_update(
+            {"_id": key, "owner": self.worker_id},
+            {"$set": {"expires_at": _now() + timedelta(seconds=ttl)}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def update(self, key: str, **fields) -> bool:
+        """
+        Set data fields on a lease we own.
+        """
+        res = self.col.update_one(
+            {"_id": key, "owner": self.worker_id},
+            {"$set": {**{f"data.{k}": v for k, v in fields.items()}, "updated_at": _now()}}
+        )
+        return res.matched_count == 1
+
+    def annotate(self, key: str, **fields):
+        """
+        Set data fields regardless of owner; never creates the document.
+        """
+        self.col.update_one(
+            {"_id": key},
+            {"$set": {f"data.{k}": v for k, v in fields.items()}}
+        )
+
+    def release(self, key: str) -> bool:
+        self.drop(key)
+        res = self.col.delete_one({"_id": key, "owner": self.worker_id})
+        return res.deleted_count == 1
+
+    def owns(self, key: str) -> bool:
+        doc = self.get(key)
+        return bool(doc) and doc.get("owner") == self.worker_id
+
+    def request_release(self, key: str):
+        self.col.update_one({"_id": key}, {"$set": {"release_requested": True}})
+
+    def wait_free(self, key: str, timeout: float, poll: float = 0.25) -> bool:
+        """
+        Wait until nobody (alive) holds key.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            doc = self.get(key)
+            if doc is None or doc.get("owner") is None:
+                return True
+            time.sleep(poll)
+        return False
+
+    # ---------------------------------------
+    # HEARTBEATS
+    # ---------------------------------------
+    def hold(self, key: str, ttl: float = STATE_LEASE_TTL, on_lost=None, on_renew=None):
+        """
+        Keep renewing a lease we own until release()/drop().
+        on_lost(key, reason) runs when it expired under us or another
+        worker asked for it ("lost" / "requested"); on_renew(doc) after
+        every successful renewal.
+        """
+        with self._lock:
+            self._held[key] = (ttl, on_lost, on_renew)
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._heartbeat_loop, name="state-heartbeat", daemon=True)
+                self._thread.start()
+
+    def drop(self, key: str):
+        with self._lock:
+            self._held.pop(key, None)
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._lock:
+                held = list(self._held.items())
+
+            for key, (ttl, on_lost, on_renew) in held:
+                try:
+                    doc = self.renew(key, ttl)
+                except Exception as e:
+                    print(f"⚠️ Heartbeat for {key} failed:", e)
+                    continue
+
+                reason = "lost" if doc is None else ("requested" if doc.get("release_requested") else None)
+                if reason is None:
+                    if on_renew:
+                        try:
+                            on_renew(doc)
+                        except Exception as e:
+                            print(f"❌ on_renew for {key} failed:", e)
+                    continue
+
+                self.drop(key)
+                print(f"⚠️ Lease {key} {reason}")
+                if on_lost:
+                    try:
+                        on_lost(key, reason)
+                    except Exception as e:
+                        print(f"❌ on_lost for {key} failed:", e)
+
+                if reason == "requested":
+                    # Whatever on_lost did, the requester is waiting for the key
+                    self.col.delete_one({"_id": key, "owner": self.worker_id})
+
+    def close(self):
+        """
+        Release every held lease (worker shutdown).
+        """
+        self._stop.set()
+        with self._lock:
+            keys = list(self._held)
+        for key in keys:
+            try:
+                self.release(key)
+            except Exception as e:
+                print(f"⚠️ Could not release {key}:", e)
+        self._thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            held = sorted(self._held)
+        return {"worker_id": self.worker_id, "held": held}
+
+
+state = StateStore(runtime_state_col)
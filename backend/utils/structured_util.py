@@ -0,0 +1,283 @@
+"""
+Structured (JSON) output for agents.
+
+Calls are made with response_mime_type="application/json" and, where the
+schema fits Gemini's response-schema subset, the Pydantic model itself as
+response_schema. The result is validated against the model; failures go
+through a cheap local repair first and then at most STRUCTURED_MAX_REPAIRS
+LLM repair passes that get the validation errors back.
+
+Repairs are local: when the JSON parses, only the objects that hold the
+validation errors are sent (e.g. one file node of a generated project),
+each with an output budget sized to it, and spliced back. Only small
+documents that do not parse at all are re-sent whole.
+"""
+import json
+import os
+import re
+from google.genai import types
+from pydantic import BaseModel, ValidationError
+from utils.ai_client_util import generate, INTERACTIVE
+
+
+STRUCTURED_MAX_REPAIRS = int(os.getenv("STRUCTURED_MAX_REPAIRS", 1))
+STRUCTURED_REPAIR_MODEL = os.getenv("STRUCTURED_REPAIR_MODEL", "gemini-2.5-flash")
+STRUCTURED_REPAIR_MAX_CHARS = int(os.getenv("STRUCTURED_REPAIR_MAX_CHARS", 40000))    # per fragment
+STRUCTURED_REPAIR_MAX_FRAGMENTS = int(os.getenv("STRUCTURED_REPAIR_MAX_FRAGMENTS", 8))
+STRUCTURED_REPAIR_MAX_TOKENS = int(os.getenv("STRUCTURED_REPAIR_MAX_TOKENS", 16000))
+
+PYDANTIC_V2 = hasattr(BaseModel, "model_validate")
+
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+class StructuredOutputError(ValueError):
+    pass
+
+
+# ---------------------------------------
+# PYDANTIC v1 / v2
+# ---------------------------------------
+def validate_model(schema, data):
+    if PYDANTIC_V2:
+        return schema.model_validate(data)
+    return schema.parse_obj(data)
+
+
+def dump_model(obj: BaseModel) -> dict:
+    if PYDANTIC_V2:
+        return obj.model_dump(exclude_none=True)
+    return obj.dict(exclude_none=True)
+
+
+def model_json_schema(schema) -> dict:
+    if PYDANTIC_V2:
+        return schema.model_json_schema()
+    return schema.schema()
+
+
+# ---------------------------------------
+# PARSING
+# ---------------------------------------
+def _candidates(raw: str):
+    """
+    The raw text, then progressively more forgiving cleanups of it.
+    """
+    text = raw.strip()
+    yield text
+
+    text = text.replace("```json", "").replace("```", "").strip()
+    yield text
+
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        text = text[start:end + 1]
+        yield text
+
+    yield TRAILING_COMMA.sub(r"\1", text.replace("\\'", "'"))
+
+
+def load_json(raw: str):
+    """
+    The first cleanup of raw that parses, or None.
+    """
+    for candidate in _candidates(raw or ""):
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def parse_structured(raw: str, schema):
+    """
+    Validated model instance, or StructuredOutputError with the last error.
+    """
+    last_error = None
+    for candidate in _candidates(raw or ""):
+        try:
+            return validate_model(schema, json.loads(candidate))
+        except (json.JSONDecodeError, ValidationError, TypeError) as e:
+            last_error = e
+
+    raise StructuredOutputError(str(last_error))
+
+
+def _truncated(response) -> bool:
+    candidates = getattr(response, "candidates", None) or []
+    reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+    return "MAX_TOKENS" in str(reason)
+
+
+# ---------------------------------------
+# GENERATION
+# ---------------------------------------
+def generate_structured(
+    model: str,
+    contents,
+    schema,
+    lane: str = INTERACTIVE,
+    cost: float = 1.0,
+    send_schema: bool = True,
+    max_repairs: int = STRUCTURED_MAX_REPAIRS,
+    **config
+):
+    """
+    Returns an instance of `schema`. send_schema=False keeps the JSON mime
+    type but validates locally only (e.g. recursive models, which the
+    response-schema subset cannot express). Extra kwargs go to
+    GenerateContentConfig (temperature, max_output_tokens, ...).
+    """
+    generation_config = types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=schema if send_schema else None,
+        **config
+    )
+
+    response = generate(model=model, contents=contents, config=generation_config, lane=lane, cost=cost)
+    raw = getattr(response, "text", None) or ""
+
+    try:
+        return parse_structured(raw, schema)
+    except StructuredOutputError as e:
+        error = e
+
+    # A cut-off answer cannot be repaired, only regenerated by the caller
+    if _truncated(response):
+        raise StructuredOutputError(f"Output truncated at max_output_tokens: {error}")
+
+    for attempt in range(max_repairs):
+        print(f"🔧 Repairing {schema.__name__} output (pass {attempt + 1}/{max_repairs}):", str(error)[:300])
+
+        data = load_json(raw)
+        if data is None:
+            raw = _repair_whole(raw, error, schema, lane, cost)
+        else:
+            raw = json.dumps(_repair_fragments(data, schema, lane, cost))
+
+        try:
+            return parse_structured(raw, schema)
+        except StructuredOutputError as e:
+            error = e
+
+    raise error
+
+
+# ---------------------------------------
+# REPAIR
+# ---------------------------------------
+def _repair_call(prompt: str, size: int, lane: str, cost: float) -> str:
+    response = generate(
+        model=STRUCTURED_REPAIR_MODEL,
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            response_mime_type="application/json",
+            temperature=0,
+            # ~3 characters per token plus headroom, never the caller's full budget
+            max_output_tokens=min(size // 3 + 1024, STRUCTURED_REPAIR_MAX_TOKENS)
+        ),
+        lane=lane,
+        cost=cost
+    )
+    return getattr(response, "text", None) or ""
+
+
+def _repair_whole(raw: str, error, schema, lane: str, cost: float) -> str:
+    """
+    Unparseable JSON cannot be split up: only small documents are re-sent.
+    """
+    if len(raw) > STRUCTURED_REPAIR_MAX_CHARS:
+        raise StructuredOutputError(f"Invalid JSON too large to repair ({len(raw)} chars): {error}")
+
+    prompt = (
+        "The JSON below does not match the required schema.\n"
+        f"Validation errors:\n{error}\n\n"
+        f"JSON schema:\n{json.dumps(model_json_schema(schema))}\n\n"
+        "Return the corrected JSON only, changing as little as possible.\n\n"
+        f"JSON:\n{raw}"
+    )
+    return _repair_call(prompt, len(raw), lane, cost)
+
+
+def _validation_errors(schema, data) -> list:
+    try:
+        validate_model(schema, data)
+        return []
+    except ValidationError as e:
+        return e.errors()
+    except TypeError as e:
+        return [{"loc": (), "msg": str(e)}]
+
+
+def _fragment_path(data, loc) -> tuple:
+    """
+    Path of the innermost object on the way to an error location. Steps
+    that are not keys / indexes of the data (union tags) are skipped.
+    """
+    node, path, best = data, [], ()
+    for step in loc:
+        if isinstance(node, dict) and step in node:
+            node = node[step]
+        elif isinstance(node, list) and isinstance(step, int) and 0 <= step < len(node):
+            node = node[step]
+        else:
+            continue
+        path.append(step)
+        if isinstance(node, dict):
+            best = tuple(path)
+    return best
+
+
+def _get_path(data, path):
+    for step in path:
+        data = data[step]
+    return data
+
+
+def _set_path(data, path, value):
+    if not path:
+        return value
+    _get_path(data, path[:-1])[path[-1]] = value
+    return data
+
+
+def _repair_fragments(data, schema, lane: str, cost: float):
+    """
+    Send each object holding validation errors on its own and splice the
+    corrected objects back into data.
+    """
+    errors = _validation_errors(schema, data)
+
+    fragments = {}
+    for err in errors:
+        path = _fragment_path(data, err.get("loc", ()))
+        fragments.setdefault(path, []).append(err)
+
+    if len(fragments) > STRUCTURED_REPAIR_MAX_FRAGMENTS:
+        raise StructuredOutputError(f"Too many invalid objects to repair ({len(fragments)})")
+
+    # Deepest first: fixing a child must not be undone by its parent's splice
+    for path in sorted(fragments, key=len, reverse=True):
+        fragment = json.dumps(_get_path(data, path))
+        if len(fragment) > STRUCTURED_REPAIR_MAX_CHARS:
+            raise StructuredOutputError(f"Invalid object at {list(path)} too large to repair ({len(fragment)} chars)")
+
+        problems = "\n".join(
+            f"- {'.'.join(str(s) for s in err.get('loc', ())[len(path):]) or '(object)'}: {err.get('msg')}"
+            for err in fragments[path]
+        )
+        prompt = (
+            "One object of a larger JSON document does not match the schema.\n"
+            f"Its location in the document: {list(path) or 'root'}\n"
+            f"Validation errors (relative to the object):\n{problems}\n\n"
+            f"Schema of the whole document:\n{json.dumps(model_json_schema(schema))}\n\n"
+            "Return the corrected object only, changing as little as possible.\n\n"
+            f"Object:\n{fragment}"
+        )
+
+        fixed = load_json(_repair_call(prompt, len(fragment), lane, cost))
+        if fixed is None:
+            raise StructuredOutputError(f"Repair of the object at {list(path)} returned invalid JSON")
+        data = _set_path(data, path, fixed)
+
+    return data
@@ -0,0 +1,485 @@
+"""
+Static validation of generated projects, before any preview is started.
+
+Per file:
+- Python: ast.parse, and local imports resolved against the tree
+  (third-party imports checked against requirements.txt, as warnings)
+- JSON: parse; package.json: pinned versions
+- TS/TSX/JS/JSX: relative / "@/" imports resolved against the tree,
+  bare imports checked against package.json
+Project level: the index.html entry script exists.
+
+Files are checked in a process pool for larger projects. Per-file results
+are cached by content hash (plus the tree they were resolved against),
+so re-validating after a small edit only re-checks what changed.
+
+Diagnostics: {"path", "line", "severity": "error"|"warning", "code", "message"}
+"""
+import ast
+import hashlib
+import json
+import multiprocessing
+import os
+import posixpath
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+VALIDATION_PARALLEL_MIN = int(os.getenv("VALIDATION_PARALLEL_MIN", 24))   # fewer files: check inline
+VALIDATION_CACHE_SIZE = int(os.getenv("VALIDATION_CACHE_SIZE", 20000))
+
+JS_EXTENSIONS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs")
+RESOLVE_SUFFIXES = ("", ".ts", ".tsx", ".js", ".jsx", ".mjs", ".json",
+                    "/index.ts", "/index.tsx", "/index.js", "/index.jsx")
+
+JS_IMPORT = re.compile(
+    r"""(?:^|[\s;])(?:import|export)\s+(?:type\s+)?(?:[\w*{}\s,$]+\s+from\s+)?['"]([^'"]+)['"]"""
+    r"""|\bimport\(\s*['"]([^'"]+)['"]\s*\)"""
+    r"""|\brequire\(\s*['"]([^'"]+)['"]\s*\)""",
+    re.MULTILINE
+)
+HTML_SCRIPT = re.compile(r"""<script[^>]*\bsrc=["']([^"']+)["']""", re.IGNORECASE)
+EXACT_VERSION = re.compile(r"^\d+\.\d+\.\d+([-+][\w.\-+]+)?$")
+
+# import name -> distribution name, where they differ
+PY_DISTRIBUTIONS = {
+    "dotenv": "python-dotenv",
+    "jwt": "pyjwt",
+    "jose": "python-jose",
+    "bson": "pymongo",
+    "multipart": "python-multipart",
+    "yaml": "pyyaml",
+    "sklearn": "scikit-learn",
+    "PIL": "pillow",
+    "google": "google-genai",
+}
+
+NODE_BUILTINS = {"fs", "path", "url", "os", "crypto", "http", "https", "util", "events", "stream", "child_process"}
+
+
+def diagnostic(path, severity, code, message, line=None) -> dict:
+    return {"path": path, "line": line, "severity": severity, "code": code, "message": message}
+
+
+# ---------------------------------------
+# PROJECT CONTEXT (what imports resolve against)
+# ---------------------------------------
+def _package_name(specifier: str) -> str:
+    parts = specifier.split("/")
+    return "/".join(parts[:2]) if specifier.startswith("@") else parts[0]
+
+
+def _normalize_dist(name: str) -> str:
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def build_context(files: dict) -> dict:
+    """
+    Everything a single-file check needs to know about the rest of the
+    project: the path set, npm packages per package.json directory and
+    Python requirements per requirements.txt directory.
+    """
+    packages = {}
+    for path, content in files.items():
+        if posixpath.basename(path) == "package.json":
+            try:
+                data = json.loads(content)
+                deps = {**data.get("dependencies", {}), **data.get("devDependencies", {})}
+                packages[posixpath.dirname(path)] = sorted(deps)
+            except Exception:
+                packages[posixpath.dirname(path)] = None   # reported by the JSON check
+
+    requirements = {}
+    for path, content in files.items():
+        if posixpath.basename(path) == "requirements.txt":
+            names = []
+            for line in content.splitlines():
+                line = line.split("#")[0].strip()
+                if line and not line.startswith("-"):
+                    names.append(_normalize_dist(re.split(r"[<>=!~\[; ]", line, 1)[0]))
+            requirements[posixpath.dirname(path)] = sorted(names)
+
+    return {"paths": sorted(files), "packages": packages, "requirements": requirements}
+
+
+def _context_key(context: dict) -> str:
+    return hashlib.sha256(json.dumps(context, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _nearest(mapping: dict, path: str):
+    """
+    Value for the closest ancestor directory of path present in mapping.
+    """
+    directory = posixpath.dirname(path)
+    while True:
+        if directory in mapping:
+            return directory, mapping[directory]
+        if not directory:
+            return None, None
+        directory = posixpath.dirname(directory)
+
+
+# ---------------------------------------
+# PYTHON
+# ---------------------------------------
+def _py_module_exists(paths: set, base: str, dotted: str) -> bool:
+    rel = dotted.replace(".", "/")
+    target = posixpath.join(base, rel) if base else rel
+    if f"{target}.py" in paths or f"{target}/__init__.py" in paths:
+        return True
+    # namespace package
+    return any(p.startswith(target + "/") for p in paths)
+
+
+def _py_local_roots(paths: set, root: str) -> set:
+    """
+    Top-level module / package names that exist under a Python root.
+    """
+    prefix = f"{root}/" if root else ""
+    names = set()
+    for p in paths:
+        if not p.startswith(prefix) or not p.endswith(".py"):
+            continue
+        first = p[len(prefix):].split("/")[0]
+        names.add(first[:-3] if first.endswith(".py") else first)
+    return names
+
+
+def resolve_python_imports(path: str, tree: ast.AST, paths: set):
+    """
+    Yield (line, module, resolved, is_local) for every import
+    (resolved is None for third-party modules).
+    """
+    root = path.split("/")[0] if "/" in path else ""
+    here = posixpath.dirname(path)
+    local_roots = _py_local_roots(paths, root) | _py_local_roots(paths, here)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [(alias.name, 0) for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            modules = [(node.module or "", node.level)]
+            # from . import x: x may be a submodule
+            if node.level and not node.module:
+                modules = [(alias.name, node.level) for alias in node.names]
+        else:
+            continue
+
+        for module, level in modules:
+            if level:
+                base = here
+                for _ in range(level - 1):
+                    base = posixpath.dirname(base)
+                ok = _py_module_exists(paths, base, module) if module else True
+                yield node.lineno, "." * level + module, ok, True
+                continue
+
+            top = module.split(".")[0]
+            if top not in local_roots:
+                yield node.lineno, module, None, False
+                continue
+
+            ok = any(_py_module_exists(paths, base, module) for base in (root, here))
+            if not ok and isinstance(node, ast.ImportFrom):
+                # from pkg import submodule
+                ok = any(
+                    _py_module_exists(paths, base, f"{module}.{alias.name}")
+                    for alias in node.names for base in (root, here)
+                )
+            yield node.lineno, module, ok, True
+
+
+def _check_python(path: str, content: str, context: dict) -> list:
+    try:
+        tree = ast.parse(content, filename=path)
+    except SyntaxError as e:
+        return [diagnostic(path, "error", "python-syntax", f"{e.msg}", e.lineno)]
+
+    paths = set(context["paths"])
+    req_dir, requirements = _nearest(context["requirements"], path)
+    stdlib = getattr(sys, "stdlib_module_names", set())
+
+    out = []
+    for line, module, ok, is_local in resolve_python_imports(path, tree, paths):
+        if is_local and not ok:
+            out.append(diagnostic(path, "error", "python-import", f"Cannot resolve local import '{module}'", line))
+        elif not is_local and requirements is not None:
+            top = module.split(".")[0]
+            if top in stdlib or top == "__future__":
+                continue
+            dist = _normalize_dist(PY_DISTRIBUTIONS.get(top, top))
+            if dist not in requirements:
+                out.append(diagnostic(
+                    path, "warning", "python-requirement",
+                    f"'{top}' is imported but not listed in {posixpath.join(req_dir, 'requirements.txt')}", line
+                ))
+    return out
+
+
+# ---------------------------------------
+# JS / TS
+# ---------------------------------------
+def _strip_js_comments(content: str) -> str:
+    content = re.sub(r"/\*.*?\*/", lambda m: "\n" * m.group(0).count("\n"), content, flags=re.S)
+    return re.sub(r"(^|[^:\\])//[^\n]*", r"\1", content)
+
+
+def iter_js_imports(content: str):
+    """
+    Yield (line, specifier) for static, dynamic and require imports.
+    """
+    stripped = _strip_js_comments(content)
+    for m in JS_IMPORT.finditer(stripped):
+        specifier = m.group(1) or m.group(2) or m.group(3)
+        yield stripped.count("\n", 0, m.start(m.lastindex)) + 1, specifier
+
+
+def resolve_js_import(path: str, specifier: str, paths: set, package_dir: str = None) -> str | None:
+    """
+    Project path a relative or "@/" specifier points to, or None.
+    """
+    if specifier.startswith("@/"):
+        base = posixpath.join(package_dir or "", "src", specifier[2:])
+    elif specifier.startswith("/"):
+        base = posixpath.join(package_dir or "", specifier.lstrip("/"))
+    else:
+        base = posixpath.normpath(posixpath.join(posixpath.dirname(path), specifier))
+
+    specifier_path = base.split("?")[0]
+    for suffix in RESOLVE_SUFFIXES:
+        candidate = specifier_path + suffix
+        if candidate in paths:
+            return candidate
+    return None
+
+
+def _is_local_specifier(specifier: str) -> bool:
+    return specifier.startswith((".", "/", "@/"))
+
+
+def _check_js(path: str, content: str, context: dict) -> list:
+    paths = set(context["paths"])
+    package_dir, packages = _nearest(context["packages"], path)
+
+    out = []
+    for line, specifier in iter_js_imports(content):
+        if specifier.startswith(("virtual:", "node:", "http:", "https:", "data:")):
+            continue
+
+        if _is_local_specifier(specifier):
+            if resolve_js_import(path, specifier, paths, package_dir) is None:
+                out.append(diagnostic(path, "error", "js-import", f"Cannot resolve import '{specifier}'", line))
+            continue
+
+        name = _package_name(specifier)
+        if packages is not None and name not in packages and name not in NODE_BUILTINS:
+            where = posixpath.join(package_dir, "package.json") if package_dir is not None else "package.json"
+            out.append(diagnostic(path, "error", "js-package", f"Package '{name}' is not in {where}", line))
+    return out
+
+
+# ---------------------------------------
+# JSON / package.json
+# ---------------------------------------
+def _check_json(path: str, content: str) -> list:
+    name = posixpath.basename(path)
+    if name.startswith(("tsconfig", "jsconfig")):
+        return []   # JSONC (comments, trailing commas) is valid there
+
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError as e:
+        return [diagnostic(path, "error", "json-syntax", e.msg, e.lineno)]
+
+    if name != "package.json":
+        return []
+
+    out = []
+    for section in ("dependencies", "devDependencies"):
+        for package, version in (data.get(section) or {}).items():
+            version = str(version).strip()
+            if version in ("", "*", "latest", "x") or version.startswith(("http", "git", "file:")):
+                out.append(diagnostic(path, "error", "npm-unpinned", f"{package}: '{version}' is not a version"))
+            elif not EXACT_VERSION.match(version):
+                out.append(diagnostic(path, "warning", "npm-range", f"{package}: '{version}' is a range, pin an exact version"))
+    return out
+
+
+# ---------------------------------------
+# HTML entry
+# ---------------------------------------
+def _check_html(path: str, content: str, context: dict) -> list:
+    paths = set(context["paths"])
+    base_dir = posixpath.dirname(path)
+    out = []
+    for m in HTML_SCRIPT.finditer(content):
+        src = m.group(1)
+        if src.startswith(("http:", "https:", "//")):
+            continue
+        line = content.count("\n", 0, m.start()) + 1
+        if resolve_js_import(path, src if src.startswith(".") else "/" + src.lstrip("/"), paths, base_dir) is None:
+            out.append(diagnostic(path, "error", "html-entry", f"Script '{src}' does not exist", line))
+    return out
+
+
+# ---------------------------------------
+# DISPATCH
+# ---------------------------------------
+def check_file(path: str, content: str, context: dict) -> list:
+    try:
+        if path.endswith(".py"):
+            return _check_python(path, content, context)
+        if path.endswith(JS_EXTENSIONS):
+            return _check_js(path, content, context)
+        if path.endswith(".json"):
+            return _check_json(path, content)
+        if path.endswith(".html"):
+            return _check_html(path, content, context)
+    except Exception as e:
+        return [diagnostic(path, "warning", "validator-crash", f"Validator failed: {e}")]
+    return []
+
+
+def _check_batch(batch, context) -> list:
+    return [check_file(path, content, context) for path, content in batch]
+
+
+def import_graph(files: dict) -> dict:
+    """
+    {path: [project paths it imports]} for Python and JS/TS files.
+    Unresolvable and third-party imports are left out.
+    """
+    context = build_context(files)
+    paths = set(context["paths"])
+    graph = {}
+
+    for path, content in files.items():
+        targets = set()
+        if path.endswith(".py"):
+            try:
+                tree = ast.parse(content)
+            except SyntaxError:
+                tree = None
+            if tree is not None:
+                root = path.split("/")[0] if "/" in path else ""
+                for node in ast.walk(tree):
+                    if isinstance(node, ast.ImportFrom) and node.level:
+                        base = posixpath.dirname(path)
+                        for _ in range(node.level - 1):
+                            base = posixpath.dirname(base)
+                        names = [node.module] if node.module else [a.name for a in node.names]
+                    elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                        base = root
+                        names = [a.name for a in node.names] if isinstance(node, ast.Import) else [node.module or ""]
+                    else:
+                        continue
+                    for name in names:
+                        rel = posixpath.join(base, name.replace(".", "/")) if base else name.replace(".", "/")
+                        for candidate in (f"{rel}.py", f"{rel}/__init__.py"):
+                            if candidate in paths:
+                                targets.add(candidate)
+        elif path.endswith(JS_EXTENSIONS):
+            package_dir, _ = _nearest(context["packages"], path)
+            for _, specifier in iter_js_imports(content):
+                if _is_local_specifier(specifier):
+                    resolved = resolve_js_import(path, specifier, paths, package_dir)
+                    if resolved:
+                        targets.add(resolved)
+
+        if targets:
+            graph[path] = sorted(targets)
+    return graph
+
+
+_cache = OrderedDict()        # sha256(path, content hash, context) -> diagnostics
+_cache_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=VALIDATION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _file_key(path: str, content_digest: str, context_key: str) -> str:
+    digest = hashlib.sha256()
+    for part in (path, content_digest, context_key):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def validate_files(files: dict, required: set = None, hashes: dict = None) -> dict:
+    """
+    files: {path: content}; hashes: {path: content sha256}, when the
+    caller already has them (ProjectTree, stored files). Returns
+    {"ok", "errors", "warnings", "diagnostics", "files", "checked", "elapsed_ms"}.
+    """
+    start = time.perf_counter()
+    context = build_context(files)
+    context_key = _context_key(context)
+
+    diagnostics = [
+        diagnostic(path, "error", "missing-file", "Required file is missing")
+        for path in sorted((required or set()) - set(files))
+    ]
+
+    hashes = hashes or {}
+    keys = {
+        path: _file_key(path, hashes.get(path) or hashlib.sha256(content.encode("utf-8")).hexdigest(), context_key)
+        for path, content in files.items()
+    }
+    todo = []
+    with _cache_lock:
+        for path in sorted(files):
+            cached = _cache.get(keys[path])
+            if cached is None:
+                todo.append((path, files[path]))
+            else:
+                _cache.move_to_end(keys[path])
+                diagnostics.extend(cached)
+
+    if len(todo) >= VALIDATION_PARALLEL_MIN and VALIDATION_WORKERS > 1:
+        size = max(1, len(todo) // (VALIDATION_WORKERS * 4))
+        batches = [todo[i:i + size] for i in range(0, len(todo), size)]
+        results = [r for batch in _get_pool().map(_check_batch, batches, [context] * len(batches)) for r in batch]
+    else:
+        results = _check_batch(todo, context)
+
+    with _cache_lock:
+        for (path, _), found in zip(todo, results):
+            _cache[keys[path]] = found
+            diagnostics.extend(found)
+        while len(_cache) > VALIDATION_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    errors = sum(1 for d in diagnostics if d["severity"] == "error")
+    return {
+        "ok": errors == 0,
+        "errors": errors,
+        "warnings": len(diagnostics) - errors,
+        "diagnostics": diagnostics,
+        "files": len(files),
+        "checked": len(todo),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+
+
+def shutdown_validation_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,168 @@
+import atexit
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from bson import json_util
+
+
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", 0.5))     # seconds
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", 500))
+WRITE_BEHIND_RETRIES = 3
+WRITE_BEHIND_SPILL_DIR = os.getenv("WRITE_BEHIND_SPILL_DIR", "/tmp/codexa/write_behind")
+
+
+class WriteBehindBuffer:
+    """
+    Collects non-critical inserts and writes them in batches from a
+    background thread. flush() is the read barrier: callers that are
+    about to read call it first and see their own writes. The buffer is
+    per process, so a request that deferred writes flushes them before it
+    responds; other workers then see them too.
+    Whatever cannot be written after retries is spilled to a JSONL file
+    (one per buffer name) and replayed, oldest first, at the start of a
+    later flush. The writer must therefore tolerate documents it already
+    wrote (duplicate _ids).
+    """
+
+    def __init__(self, writer, name: str, interval=WRITE_BEHIND_INTERVAL, max_batch=WRITE_BEHIND_MAX_BATCH):
+        self._writer = writer            # fn(list[(key, doc)]) -> None
+        self.name = name
+        self.interval = interval
+        self.max_batch = max_batch
+        self.spill_path = os.path.join(WRITE_BEHIND_SPILL_DIR, f"{name}.jsonl")
+
+        self._pending = []
+        self._inflight = Counter()       # key -> docs taken out of _pending, not written yet
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()   # one writer at a time keeps batches in order
+        self._wakeup = threading.Event()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, key: str, doc: dict):
+        with self._lock:
+            if not self._closed:
+                self._pending.append((key, doc))
+                full = len(self._pending) >= self.max_batch
+                doc = None
+
+        if doc is not None:
+            # Closed: write now, but after a batch that may still be in flight
+            with self._flush_lock:
+                self._write([(key, doc)])
+            return
+
+        if full:
+            self._wakeup.set()
+
+    def pending(self, key: str = None) -> int:
+        """
+        Buffered writes, including a batch being written right now.
+        """
+        with self._lock:
+            if key is None:
+                return len(self._pending) + sum(self._inflight.values())
+            return sum(1 for k, _ in self._pending if k == key) + self._inflight[key]
+
+    def flush(self, key: str = None):
+        """
+        Write everything buffered so far. With a key, return immediately
+        when nothing for that key is pending or being written; otherwise
+        wait for it to be written.
+        """
+        if key is not None and not self.pending(key):
+            return
+
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                inflight = Counter(k for k, _ in batch)
+                self._inflight += inflight
+
+            try:
+                self._replay_spill()
+                if batch:
+                    self._write(batch)
+            finally:
+                with self._lock:
+                    self._inflight -= inflight
+
+    def _write(self, batch):
+        for attempt in range(WRITE_BEHIND_RETRIES):
+            try:
+                self._writer(batch)
+                return
+            except Exception as e:
+                print(f"❌ Write-behind flush failed (attempt {attempt + 1}/{WRITE_BEHIND_RETRIES}):", e)
+                time.sleep(0.2 * (attempt + 1))
+
+        self._spill(batch)
+
+    def _spill(self, batch):
+        try:
+            os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for key, doc in batch:
+                    f.write(json_util.dumps({"key": key, "doc": doc}) + "\n")
+            print(f"⚠️ Spilled {len(batch)} write(s) to {self.spill_path}")
+        except Exception as e:
+            print("❌ Write-behind spill failed, writes lost:", e)
+
+    def _replay_spill(self):
+        """
+        Write back what earlier flushes spilled. Called under _flush_lock;
+        the rename claims the file, so of several workers sharing it only
+        one replays each spilled write.
+        """
+        if not os.path.exists(self.spill_path):
+            return
+
+        claimed = f"{self.spill_path}.{uuid.uuid4().hex}.replay"
+        try:
+            os.replace(self.spill_path, claimed)
+        except FileNotFoundError:
+            return      # another worker claimed it
+
+        try:
+            with open(claimed, encoding="utf-8") as f:
+                batch = [
+                    (entry["key"], entry["doc"])
+                    for entry in map(json_util.loads, filter(str.strip, f))
+                ]
+        except Exception as e:
+            print(f"❌ Unreadable write-behind spill {claimed}, kept for inspection:", e)
+            return
+
+        try:
+            if batch:
+                self._writer(batch)
+            print(f"✅ Replayed {len(batch)} spilled write(s) from {self.spill_path}")
+        except Exception as e:
+            print("⚠️ Spill replay failed, kept for the next flush:", e)
+            self._spill(batch)
+        os.remove(claimed)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print("❌ Write-behind error:", e)
+
+    def close(self):
+        """
+        Flush and stop. Later add() calls write synchronously.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wakeup.set()
+        self.flush()